@@ -0,0 +1,315 @@
+"""
+Асинхронный режим бота.
+
+Запросы к API ЯндексПрактикум и Telegram выполняются через httpx,
+не блокируя цикл событий. Семафор ограничивает число запросов в полете.
+
+Запуск: SUBSCRIPTIONS_FILE=subscriptions.txt python aio.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+from http import HTTPStatus
+
+import httpx
+
+import breaker
+import commands
+import exceptions as ex
+import history
+import homework
+import httpcache
+import lifecycle
+import metrics
+import recording
+import singleflight
+import state
+import transport
+from homework import logger
+from poller import POLL_ERRORS, collect_messages, report_error
+from scheduler import next_interval
+from subscriptions import SUBSCRIPTIONS_FILE, load_subscriptions
+
+TELEGRAM_API_URL = homework.SETTINGS.telegram_api_url
+MAX_CONCURRENCY = int(os.getenv('MAX_CONCURRENCY', 100))
+REQUEST_TIMEOUT = transport.REQUEST_TIMEOUT
+HEARTBEAT_INTERVAL = 5
+api_flights = singleflight.AsyncGroup()
+
+
+class AsyncBot:
+    """Минимальный асинхронный клиент Bot API для отправки сообщений."""
+
+    def __init__(self, token, client, base_url=TELEGRAM_API_URL):
+        """Конструктор класса."""
+        self.url = f'{base_url}/bot{token}/sendMessage'
+        self.client = client
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        """Отправляет сообщение и возвращает ответ Bot API."""
+        payload = {'chat_id': chat_id, 'text': text}
+        if parse_mode is not None:
+            payload['parse_mode'] = parse_mode
+        try:
+            response = await self.client.post(self.url, json=payload)
+        except httpx.HTTPError as error:
+            raise ex.SendMessageError(f'Telegram не доступен: {error}')
+        if response.status_code != HTTPStatus.OK:
+            raise ex.SendMessageError(f'Код ответа Telegram: '
+                                      f'{response.status_code}')
+        return response.json()['result']
+
+
+async def async_send_message(bot, message):
+    """Отправляет сообщение в Telegram, не блокируя цикл событий."""
+    await async_send_message_to(bot, homework.TELEGRAM_CHAT_ID, message)
+
+
+async def async_send_message_to(bot, chat_id, message, parse_mode=None):
+    """Отправляет сообщение в указанный чат Telegram."""
+    started = time.perf_counter()
+    try:
+        await bot.send_message(chat_id, message, parse_mode=parse_mode)
+        logger.info('Сообщение отправлено: %s', message)
+    except ex.TelegramError as error:
+        metrics.count_error(error)
+        logger.error('Сбой при отправке сообщения: %s', error)
+    except ex.SendMessageError as error:
+        metrics.count_error(error)
+        logger.error('Сбой при отправке сообщения: %s', error)
+    metrics.SEND_LATENCY.observe(time.perf_counter() - started)
+
+
+async def async_get_api_answer(client, current_timestamp):
+    """Делает запрос к API ЯндексПрактикум, не блокируя цикл событий."""
+    return await async_request_api(client, homework.HEADERS,
+                                   current_timestamp)
+
+
+async def async_get_api_answer_for(client, token, current_timestamp,
+                                   semaphore=None):
+    """Делает асинхронный запрос к API с указанным токеном.
+
+    Одновременные запросы с одним токеном объединяются в один
+    (singleflight.py). semaphore ограничивает только запросы
+    в полете: вызовы, ждущие чужой запрос, слот не занимают.
+    """
+    headers = homework.auth_headers(token)
+
+    async def fetch(from_date):
+        if semaphore is None:
+            return await async_request_api(client, headers, from_date)
+        async with semaphore:
+            return await async_request_api(client, headers, from_date)
+
+    return await api_flights.do(token, current_timestamp, fetch)
+
+
+async def async_request_api(client, headers, current_timestamp):
+    """Запрашивает статусы домашних работ через httpx."""
+    circuit = breaker.for_endpoint(homework.ENDPOINT)
+    circuit.before_request()
+    params = homework.api_params(current_timestamp)
+    key = httpcache.cache_key(headers, params)
+    response = await async_send_request(
+        client, circuit, headers, params,
+        httpcache.conditional_headers(key, headers)
+    )
+    data = homework.parse_cached_response(key, response)
+    if data is None:
+        logger.debug('Сохраненного ответа на 304 уже нет, '
+                     'повторяем запрос без условных заголовков')
+        response = await async_send_request(client, circuit, headers,
+                                            params, headers)
+        data = httpcache.store(key, response,
+                               homework.parse_api_response(response))
+    return data
+
+
+async def async_send_request(client, circuit, headers, params,
+                             request_headers):
+    """Отправляет один запрос к API через httpx (homework.send_request)."""
+    started = time.perf_counter()
+    ok = False
+    try:
+        response = await client.get(
+            homework.ENDPOINT, headers=request_headers, params=params
+        )
+        ok = breaker.healthy(response.status_code)
+    except httpx.HTTPError as error:
+        homework.record_exchange(headers, None, started)
+        raise ex.SystemExit(f'Эндпоинт не доступен: {error}')
+    finally:
+        metrics.API_LATENCY.observe(time.perf_counter() - started)
+        circuit.record(ok)
+    homework.record_exchange(headers, response, started)
+    return response
+
+
+class AsyncPoller:
+    """Асинхронный планировщик: опросы подписок перекрываются по времени."""
+
+    def __init__(self, registry, bot, client,
+                 retry_time=homework.RETRY_TIME,
+                 concurrency=MAX_CONCURRENCY):
+        """Конструктор класса."""
+        self.registry = registry
+        self.bot = bot
+        self.client = client
+        self.retry_time = retry_time
+        self.concurrency = concurrency
+        self._semaphore = None
+        self._stopped = None
+        self._notices = set()
+
+    def notify(self, chat_id, message, parse_mode=None):
+        """Отправляет уведомление из синхронного кода в фоновой задаче."""
+        task = asyncio.ensure_future(async_send_message_to(
+            self.bot, chat_id, message, parse_mode
+        ))
+        self._notices.add(task)
+        task.add_done_callback(self._notices.discard)
+
+    @property
+    def semaphore(self):
+        """Семафор создается внутри работающего цикла событий."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    @property
+    def stopped(self):
+        """Событие остановки (создается внутри цикла событий)."""
+        if self._stopped is None:
+            self._stopped = asyncio.Event()
+        return self._stopped
+
+    def stop(self):
+        """Останавливает опрос после текущих запросов и отправок."""
+        self.stopped.set()
+
+    async def pause(self, delay):
+        """Ждет delay секунд; True - опрос остановлен."""
+        try:
+            await asyncio.wait_for(self.stopped.wait(), delay)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def poll(self, subscription):
+        """Опрашивает API для одной подписки и рассылает изменения."""
+        try:
+            response = await async_get_api_answer_for(
+                self.client, subscription.token, subscription.timestamp,
+                self.semaphore
+            )
+        except POLL_ERRORS as error:
+            messages = report_error(subscription, error)
+        else:
+            messages = collect_messages(subscription, response)
+            self.registry.save_cursor(subscription)
+        if not messages or subscription.board.paused:
+            return
+        async with self.semaphore:
+            for message in messages:
+                await async_send_message_to(self.bot, subscription.chat_id,
+                                            message,
+                                            subscription.style.parse_mode)
+
+    async def run_once(self):
+        """Один конкурентный проход по всем подпискам."""
+        await asyncio.gather(*(self.poll(subscription)
+                               for subscription in self.registry))
+
+    async def watch(self, subscription, delay):
+        """Опрашивает одну подписку с начальной задержкой до остановки."""
+        if await self.pause(delay):
+            return
+        while True:
+            await self.poll(subscription)
+            if await self.pause(next_interval(subscription)):
+                return
+
+    async def heartbeat(self):
+        """Отмечает для проб, что цикл событий не заблокирован."""
+        while True:
+            lifecycle.PROCESS.beat(HEARTBEAT_INTERVAL)
+            if await self.pause(HEARTBEAT_INTERVAL):
+                return
+
+    async def run_forever(self):
+        """Опрашивает все подписки, распределяя старты по RETRY_TIME.
+
+        Возвращается после stop(), когда текущие опросы и уведомления
+        завершены.
+        """
+        subscriptions = list(self.registry)
+        slot = self.retry_time / max(len(subscriptions), 1)
+        await asyncio.gather(self.heartbeat(),
+                             *(self.watch(subscription, number * slot)
+                               for number, subscription
+                               in enumerate(subscriptions)))
+        if self._notices:
+            await asyncio.gather(*self._notices)
+
+
+async def run(registry, concurrency=MAX_CONCURRENCY):
+    """Создает клиентов и запускает асинхронный опрос."""
+    httpcache.configure()
+    limits = httpx.Limits(max_connections=concurrency,
+                          max_keepalive_connections=transport.POOL_MAXSIZE)
+    async with httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT,
+                                 http2=transport.http2_available()) as client:
+        bot = AsyncBot(homework.TELEGRAM_TOKEN, client)
+        poller = AsyncPoller(registry, bot, client, concurrency=concurrency)
+        breaker.add_listener(breaker.OutageNotifier.for_registry(
+            registry, poller.notify
+        ))
+        await run_until_stopped(poller)
+
+
+async def run_until_stopped(poller, process=lifecycle.PROCESS):
+    """Опрос до сигнала остановки; затем не дольше shutdown_timeout."""
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(poller.run_forever())
+
+    def stop():
+        poller.stop()
+        loop.call_later(process.shutdown_timeout, task.cancel)
+
+    process.on_stop(lambda: loop.call_soon_threadsafe(stop))
+    process.mark_ready()
+    try:
+        await task
+    except asyncio.CancelledError:
+        logger.warning('Опрос не завершился за %s с', process.shutdown_timeout)
+
+
+def main():
+    """Запускает асинхронный опрос всех подписок из SUBSCRIPTIONS_FILE."""
+    path = sys.argv[1] if len(sys.argv) > 1 else SUBSCRIPTIONS_FILE
+    if not (homework.TELEGRAM_TOKEN and path):
+        logger.critical('Отсутствуют TELEGRAM_TOKEN или SUBSCRIPTIONS_FILE. '
+                        'Программа остановлена!')
+        sys.exit(1)
+    process = lifecycle.PROCESS
+    process.install()
+    store = state.open_store()
+    homework.status_history = history.open_history()
+    homework.api_recorder = recording.open_recorder()
+    cursors = state.open_cursors()
+    registry = load_subscriptions(path, store, cursors)
+    logger.info('Загружено подписок: %s', len(registry))
+    homework.start_metrics(store)
+    runner = commands.start(registry.board, transport.LazyBot(
+        homework.TELEGRAM_TOKEN, base_url=homework.SETTINGS.bot_url
+    ))
+    homework.register_shutdown(store, cursors, runner=runner)
+    asyncio.run(run(registry))
+    process.shutdown()
+
+
+if __name__ == '__main__':
+    main()
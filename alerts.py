@@ -0,0 +1,139 @@
+"""
+Сбор ошибок опроса и сводки по ним.
+
+Ошибки копятся по областям (scope): подписка в poller.py и aio.py,
+основной цикл в homework.py. Битая работа в ответе API дает одну и ту
+же ошибку на каждом опросе, пока ответ не исправят, поэтому уже
+отправленные ошибки (область, класс, работа, текст) помнит LRU
+на ERROR_DEDUP_SIZE ключей. Раньше помнилась одна последняя строка,
+и две чередующиеся ошибки отправлялись заново на каждом опросе.
+
+Новые ошибки области уходят в чат одной сводкой не чаще раза
+в ERROR_DIGEST_WINDOW секунд: первая - сразу, накопленные за окно -
+следующей сводкой. Опрос без ошибок забывает отправленные ошибки
+области, и ошибка, которая появилась снова, снова попадает в сводку.
+
+Пока в ответе есть работы с ошибками, from_date области не сдвигается.
+Чтобы навсегда битая работа не держала его вечно, опросы подряд
+с такими ошибками считаются (held), и после ERROR_SKIP_AFTER опросов
+from_date сдвигается мимо битых работ: они больше не запрашиваются.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+ERROR_DIGEST_WINDOW = float(os.getenv('ERROR_DIGEST_WINDOW', 600))
+ERROR_DEDUP_SIZE = int(os.getenv('ERROR_DEDUP_SIZE', 4096))
+# Через сколько опросов подряд с ошибками в работах from_date сдвигается
+# мимо этих работ.
+ERROR_SKIP_AFTER = int(os.getenv('ERROR_SKIP_AFTER', 3))
+# Строк в сводке; об остальных ошибках пишется только их число.
+DIGEST_LINES = 20
+
+
+class ErrorKey(namedtuple('ErrorKey', 'scope kind homework text')):
+    """Ключ ошибки: область, класс ошибки, работа и текст."""
+
+    __slots__ = ()
+
+
+def homework_label(homework):
+    """Имя (или id) работы, в которой ошибка, или None."""
+    if not isinstance(homework, dict):
+        return None
+    label = homework.get('homework_name')
+    return label if label is not None else homework.get('id')
+
+
+class ErrorAggregator:
+    """Ошибки по областям: LRU отправленных и сводки по окнам."""
+
+    def __init__(self, window=ERROR_DIGEST_WINDOW, capacity=ERROR_DEDUP_SIZE,
+                 clock=time.monotonic):
+        """Конструктор класса."""
+        self.window = window
+        self.capacity = capacity
+        self.clock = clock
+        self._seen = OrderedDict()
+        self._scopes = {}
+        self._pending = {}
+        self._sent_at = {}
+        self._held = {}
+        self._lock = threading.Lock()
+
+    def add(self, scope, error, homework=None):
+        """Учитывает ошибку; True - она новая и попадет в сводку."""
+        key = ErrorKey(scope, type(error).__name__, homework_label(homework),
+                       f'{error}')
+        with self._lock:
+            pending = self._pending.setdefault(scope, {})
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                if key in pending:
+                    pending[key] += 1
+                return False
+            self._seen[key] = scope
+            self._scopes.setdefault(scope, set()).add(key)
+            if len(self._seen) > self.capacity:
+                old, old_scope = self._seen.popitem(last=False)
+                self._scopes[old_scope].discard(old)
+            pending[key] = 1
+            return True
+
+    def held(self, scope):
+        """Ошибки в работах снова не дали сдвинуть from_date области.
+
+        Возвращает число таких опросов подряд.
+        """
+        with self._lock:
+            self._held[scope] = self._held.get(scope, 0) + 1
+            return self._held[scope]
+
+    def resolve(self, scope):
+        """Опрос области прошел без ошибок: отправленные забываются.
+
+        Накопленные, но еще не отправленные ошибки остаются в сводке.
+        """
+        with self._lock:
+            self._held.pop(scope, None)
+            for key in self._scopes.pop(scope, ()):
+                self._seen.pop(key, None)
+
+    def digest(self, scope):
+        """Текст сводки области, если есть новые ошибки и окно прошло."""
+        with self._lock:
+            pending = self._pending.get(scope)
+            if not pending:
+                return None
+            now = self.clock()
+            sent_at = self._sent_at.get(scope)
+            if sent_at is not None and now - sent_at < self.window:
+                return None
+            del self._pending[scope]
+            self._sent_at[scope] = now
+        return render_digest(pending)
+
+    def __len__(self):
+        """Количество запомненных ошибок."""
+        return len(self._seen)
+
+
+def render_digest(pending):
+    """Сводка по ошибкам {ErrorKey: число повторов}.
+
+    Одна ошибка без повторов отправляется своим текстом, как раньше.
+    """
+    if len(pending) == 1 and 1 in pending.values():
+        return next(iter(pending)).text
+    lines = [f'Ошибки при опросе API: {len(pending)}']
+    for key, count in list(pending.items())[:DIGEST_LINES]:
+        repeats = f' (x{count})' if count > 1 else ''
+        lines.append(f'- {key.text}{repeats}')
+    if len(pending) > DIGEST_LINES:
+        lines.append(f'... и еще {len(pending) - DIGEST_LINES}')
+    return '\n'.join(lines)
+
+
+ERRORS = ErrorAggregator()
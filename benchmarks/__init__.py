@@ -0,0 +1 @@
+"""Бенчмарки и фейковые серверы для нагрузочного тестирования бота."""
@@ -0,0 +1,106 @@
+"""
+Бенчмарк пакетного разбора ответа: parse_statuses против цикла.
+
+Ответ из homeworks работ разбирается повторно: без изменений
+и с долей churn работ, сменивших статус. Цикл вызывает parse_homework
+для каждой работы (как раньше main()), пакет - parse_statuses с тем
+же кэшем статусов. Время на работу в микросекундах, лучшее из repeat
+повторов.
+Запуск: python -m benchmarks.bench_batch --homeworks 100000
+"""
+
+import argparse
+import json
+import logging
+import random
+import time
+
+import homework
+import state
+from benchmarks.fake_servers import make_homeworks
+
+STATUSES = ('reviewing', 'rejected', 'approved')
+
+
+def build_response(count):
+    """Работы с разными date_updated."""
+    works = make_homeworks(count)
+    for number, work in enumerate(works):
+        work['date_updated'] = '2022-{:02d}-{:02d}T{:02d}:{:02d}:00Z'.format(
+            1 + number % 12, 1 + number % 28, number % 24, number % 60
+        )
+    return works
+
+
+def by_one(works, cache):
+    """Разбор циклом по работам; возвращает число сообщений."""
+    messages = 0
+    for work in works:
+        message, _ = homework.parse_homework(work, cache)
+        messages += message is not None
+    return messages
+
+
+def in_batch(works, cache):
+    """Разбор пакетом; возвращает число сообщений."""
+    return len(homework.parse_statuses(works, cache).changes)
+
+
+def churn(works, share, rng):
+    """Меняет статус у доли share работ (копии словарей)."""
+    works = list(works)
+    for number in rng.sample(range(len(works)), int(len(works) * share)):
+        work = dict(works[number])
+        work['status'] = STATUSES[(STATUSES.index(work['status']) + 1) % 3]
+        works[number] = work
+    return works
+
+
+def measure(parse, works, cache, share, repeat, seed):
+    """Лучшее время на работу (мкс) и число сообщений за повтор."""
+    rng = random.Random(seed)
+    parse(works, cache)
+    best, messages = float('inf'), 0
+    for _ in range(repeat):
+        if share:
+            works = churn(works, share, rng)
+        started = time.perf_counter()
+        messages = parse(works, cache)
+        best = min(best, time.perf_counter() - started)
+    return round(best / len(works) * 1e6, 3), messages
+
+
+def run(count, shares, repeat, seed=1):
+    """Сравнивает цикл и пакет для каждой доли изменений."""
+    homework.logger.setLevel(logging.WARNING)
+    works = build_response(count)
+    results = {'homeworks': count}
+    for share in shares:
+        loop_us, loop_messages = measure(by_one, works,
+                                         state.ChangeIndex().view('loop'),
+                                         share, repeat, seed)
+        batch_us, batch_messages = measure(in_batch, works,
+                                           state.ChangeIndex().view('batch'),
+                                           share, repeat, seed)
+        assert loop_messages == batch_messages
+        results[f'churn_{share}'] = {
+            'loop_us_per_item': loop_us,
+            'batch_us_per_item': batch_us,
+            'speedup': round(loop_us / batch_us, 1),
+        }
+    return results
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--homeworks', type=int, default=100000)
+    parser.add_argument('--churn', type=float, nargs='+',
+                        default=[0, 0.001, 0.01, 0.1])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.homeworks, args.churn, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Бенчмарк индекса изменений статусов.
+
+Сравнивает прежний кэш статусов (словарь с ключами
+"<подписка>:<имя работы>", state.MemoryStatusStore) с индексом
+state.ChangeIndex: память на одну отслеживаемую работу и время
+parse_homework для работы, которая не изменилась (со словарем
+работа каждый раз проверяется целиком).
+Запуск: python -m benchmarks.bench_change_index --entries 1000000
+"""
+
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+
+import homework
+import state
+from benchmarks.fake_servers import make_homeworks
+from subscriptions import namespace
+
+
+def realistic_homeworks(count):
+    """Работы с именами как в API: "<логин>__<проект>.zip"."""
+    homeworks = make_homeworks(count)
+    for item in homeworks:
+        item['homework_name'] = f'ivanov-ivan__hw{item["id"]:02}_final.zip'
+    return homeworks
+
+
+def make_caches(store, subscriptions):
+    """Кэши статусов подписок в хранилище."""
+    return [store.view(namespace(f'token{number}', 1000000000 + number))
+            for number in range(subscriptions)]
+
+
+def bytes_per_entry(make_store, subscriptions, homeworks, key):
+    """Прирост памяти хранилища на одну отслеживаемую работу.
+
+    Кэши подписок создаются до замера: они есть у подписки при любом
+    хранилище. Статусы записываются напрямую, без разбора работ.
+    """
+    store = make_store()
+    caches = make_caches(store, subscriptions)
+    dates = [homework.homework_date(item) for item in homeworks]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for cache in caches:
+        for item, date in zip(homeworks, dates):
+            cache.record(item[key], item['status'], date)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / (subscriptions * len(homeworks))
+
+
+def unchanged_us(make_store, homeworks, rounds):
+    """Время parse_homework для неизменившейся работы в микросекундах."""
+    cache = make_caches(make_store(), 1)[0]
+    for item in homeworks:
+        homework.parse_homework(item, cache)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for item in homeworks:
+            homework.parse_homework(item, cache)
+    return (time.perf_counter() - started) / (rounds * len(homeworks)) * 1e6
+
+
+def run(entries, per_subscription):
+    """Выполняет замеры для обоих кэшей."""
+    homework.logger.setLevel(logging.WARNING)
+    homeworks = realistic_homeworks(per_subscription)
+    subscriptions = max(entries // per_subscription, 1)
+    stores = {
+        'name_dict': (state.MemoryStatusStore, 'homework_name'),
+        'change_index': (state.ChangeIndex, 'id'),
+    }
+    results = {'entries': subscriptions * per_subscription}
+    for name, (make_store, key) in stores.items():
+        results[name] = {
+            'bytes_per_entry': round(bytes_per_entry(
+                make_store, subscriptions, homeworks, key
+            ), 1),
+            'unchanged_us': round(unchanged_us(make_store, homeworks, 1000),
+                                  2),
+        }
+    results['memory_ratio'] = round(
+        results['name_dict']['bytes_per_entry']
+        / results['change_index']['bytes_per_entry'], 1
+    )
+    return results
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--per-subscription', type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.entries, args.per_subscription), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Бенчмарк колоночной истории статусов.
+
+Дописывает rows строк (работа проходит reviewing и вердикт), затем
+измеряет открытие, выборку часа по времени, выборку одной работы
+и среднее время проверки по когортам. Для агрегации указан пик
+выделенной памяти (tracemalloc): колонки читаются через mmap,
+а не загружаются целиком.
+Запуск: python -m benchmarks.bench_history --rows 1000000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import history
+
+COHORTS = 20
+HOMEWORKS = 50000
+
+
+def fill(store, rows):
+    """Дописывает rows строк: по две на проверку, раз в секунду."""
+    started = 1_600_000_000
+    for number in range(rows // 2):
+        name = f'student{number % HOMEWORKS}__hw.zip'
+        cohort = f'cohort{number % COHORTS}'
+        moment = started + number * 2
+        store.append(name, 'reviewing', moment, moment, cohort)
+        store.append(name, 'approved' if number % 3 else 'rejected',
+                     moment + 1 + number % 600, moment + 1, cohort)
+    return started
+
+
+def timed(function):
+    """Результат вызова и время в миллисекундах."""
+    started = time.perf_counter()
+    result = function()
+    return result, round((time.perf_counter() - started) * 1000, 2)
+
+
+def run(rows, segment_rows):
+    """Возвращает скорость записи и время запросов."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'history')
+        store = history.HistoryStore(path, segment_rows, fsync_every=10000)
+        started = time.perf_counter()
+        first = fill(store, rows)
+        write_seconds = time.perf_counter() - started
+        store.close()
+
+        store, open_ms = timed(lambda: history.HistoryStore(path,
+                                                            segment_rows))
+        middle = first + rows // 2
+        hour, hour_ms = timed(
+            lambda: sum(1 for _ in store.scan(middle, middle + 3600))
+        )
+        one, homework_ms = timed(
+            lambda: sum(1 for _ in store.scan(homework='student7__hw.zip'))
+        )
+        cohorts, review_ms = timed(store.review_times)
+        # Память - отдельным проходом: tracemalloc замедляет код.
+        tracemalloc.start()
+        store.review_times()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        store.close()
+        disk = sum(entry.stat().st_size for entry in os.scandir(path))
+    return {
+        'rows': rows,
+        'segments': -(-rows // segment_rows),
+        'disk_bytes_per_row': round(disk / rows, 1),
+        'writes_per_second': round(rows / write_seconds),
+        'open_ms': open_ms,
+        'hour_scan': {'rows': hour, 'ms': hour_ms},
+        'homework_scan': {'rows': one, 'ms': homework_ms},
+        'review_times': {'cohorts': len(cohorts), 'ms': review_ms,
+                         'peak_alloc_kb': round(peak / 1024)},
+    }
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--segment-rows', type=int,
+                        default=history.SEGMENT_ROWS)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.segment_rows), indent=2))
+
+
+if __name__ == '__main__':
+    main()
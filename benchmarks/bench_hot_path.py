@@ -0,0 +1,208 @@
+"""
+Бенчмарк основного пути бота: опрос --> разбор --> уведомление.
+
+Меряет пропускную способность и задержку (p50/p99) этапов:
+check_response, parse_status, итерации основного цикла homework.main()
+(запрос к фейковому API, разбор, отправка в фейковый Bot API)
+и прохода poller.py по всем подпискам. Доля работ, меняющих статус
+между итерациями, задается --churn. Результаты печатаются в JSON;
+с --baseline к ним добавляется сравнение с прошлым запуском.
+Запуск: python -m benchmarks.bench_hot_path --homeworks 1000 --churn 0.1
+"""
+
+import argparse
+import json
+import logging
+import random
+import time
+
+from telegram import Bot
+
+import homework
+import state
+import transport
+from benchmarks.bench_subscriptions import build_data, build_registry
+from benchmarks.fake_servers import FakePracticum, FakeTelegram, make_homeworks
+from delivery import DeliveryQueue
+from poller import Poller
+
+STATUSES = ('reviewing', 'rejected', 'approved')
+UNLIMITED = 1_000_000
+CHAT_ID = 1
+
+
+def churn(homeworks, rate, rand):
+    """Меняет статус у доли rate работ; возвращает число изменений."""
+    changed = rand.sample(homeworks, int(len(homeworks) * rate))
+    for item in changed:
+        item['status'] = STATUSES[(STATUSES.index(item['status']) + 1)
+                                  % len(STATUSES)]
+    return len(changed)
+
+
+def percentile(ordered, fraction):
+    """Перцентиль отсортированного списка."""
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def summarize(latencies, items_per_call=1):
+    """Пропускная способность и перцентили задержки в миллисекундах."""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        'calls': len(ordered),
+        'items_per_second': round(len(ordered) * items_per_call / total, 1),
+        'p50_ms': round(percentile(ordered, 0.5) * 1000, 4),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 4),
+    }
+
+
+def timed(function, *args):
+    """Вызывает функцию и возвращает время вызова в секундах."""
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def bench_check_response(homeworks, iterations):
+    """Проверка ответа API целиком."""
+    response = {'homeworks': homeworks, 'current_date': 0}
+    latencies = [timed(homework.check_response, response)
+                 for _ in range(iterations)]
+    return summarize(latencies, len(homeworks))
+
+
+def bench_parse_status(homeworks, iterations, rate, rand):
+    """Разбор статуса каждой работы при заданной доле изменений."""
+    homework.homework_status_cache = state.ChangeIndex().view('')
+    for item in homeworks:
+        homework.parse_status(item)
+    latencies = []
+    for _ in range(iterations):
+        churn(homeworks, rate, rand)
+        latencies.extend(timed(homework.parse_status, item)
+                         for item in homeworks)
+    return summarize(latencies)
+
+
+def bench_main_iteration(homeworks, iterations, rate, rand):
+    """Итерация основного цикла вместе с доставкой уведомлений."""
+    homework.homework_status_cache = state.ChangeIndex().view('')
+    cursors = state.MemoryStatusStore()
+    with FakePracticum({None: homeworks}) as practicum, \
+            FakeTelegram() as telegram:
+        homework.ENDPOINT = practicum.url
+        bot = Bot(token='1234:bench', base_url=f'{telegram.base_url}/bot',
+                  request=transport.telegram_request())
+        queue = DeliveryQueue(bot, global_rate=UNLIMITED,
+                              chat_rate=UNLIMITED).start()
+
+        def iteration():
+            homework.poll_iteration(queue, cursors, 0)
+            queue.join()
+
+        iteration()
+        latencies = []
+        for _ in range(iterations):
+            churn(homeworks, rate, rand)
+            latencies.append(timed(iteration))
+        queue.stop()
+        results = summarize(latencies, len(homeworks))
+        results['telegram_requests'] = telegram.requests
+    return results
+
+
+def bench_poller_pass(subscriptions, homeworks, iterations, rate, rand):
+    """Проход poller.py по всем подпискам вместе с доставкой."""
+    data = build_data(subscriptions, homeworks)
+    registry = build_registry(data)
+    with FakePracticum(data) as practicum, FakeTelegram() as telegram:
+        homework.ENDPOINT = practicum.url
+        bot = Bot(token='1234:bench', base_url=f'{telegram.base_url}/bot',
+                  request=transport.telegram_request())
+        queue = DeliveryQueue(bot, global_rate=UNLIMITED,
+                              chat_rate=UNLIMITED).start()
+        poller = Poller(registry, bot, queue=queue)
+
+        def iteration():
+            for subscription in registry:
+                subscription.timestamp = 0
+            poller.run_once()
+            queue.join()
+
+        iteration()
+        latencies = []
+        for _ in range(iterations):
+            for items in data.values():
+                churn(items, rate, rand)
+            latencies.append(timed(iteration))
+        queue.stop()
+        results = summarize(latencies, subscriptions)
+        results['telegram_requests'] = telegram.requests
+    return results
+
+
+def run(homeworks, subscriptions, rate, iterations, seed=0):
+    """Выполняет все этапы и возвращает результаты."""
+    homework.logger.setLevel(logging.WARNING)
+    homework.TELEGRAM_CHAT_ID = CHAT_ID
+    rand = random.Random(seed)
+    transport.configure()
+    try:
+        results = {
+            'homeworks': homeworks,
+            'subscriptions': subscriptions,
+            'churn': rate,
+            'iterations': iterations,
+            'check_response': bench_check_response(
+                make_homeworks(homeworks), iterations
+            ),
+            'parse_status': bench_parse_status(
+                make_homeworks(homeworks), iterations, rate, rand
+            ),
+            'main_iteration': bench_main_iteration(
+                make_homeworks(homeworks), iterations, rate, rand
+            ),
+            'poller_pass': bench_poller_pass(
+                subscriptions, max(1, homeworks // subscriptions),
+                iterations, rate, rand
+            ),
+        }
+    finally:
+        transport.close()
+    return results
+
+
+def compare(results, baseline):
+    """Отношение p50/p99 к прошлому запуску по каждому этапу."""
+    changes = {}
+    for stage, metrics in results.items():
+        before = baseline.get(stage)
+        if not isinstance(metrics, dict) or not isinstance(before, dict):
+            continue
+        changes[stage] = {
+            name: round(metrics[name] / before[name], 3)
+            for name in ('p50_ms', 'p99_ms') if before.get(name)
+        }
+    return changes
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--homeworks', type=int, default=1000)
+    parser.add_argument('--subscriptions', type=int, default=100)
+    parser.add_argument('--churn', type=float, default=0.1)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--baseline', help='JSON прошлого запуска')
+    args = parser.parse_args()
+    results = run(args.homeworks, args.subscriptions, args.churn,
+                  args.iterations)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            results['vs_baseline'] = compare(results, json.load(file))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
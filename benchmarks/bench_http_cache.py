@@ -0,0 +1,76 @@
+"""
+Бенчмарк условных запросов к API Практикума.
+
+Сравнивает объем переданных данных и CPU клиента с кэшем и без него.
+from_date всех подписок зафиксирован, как при сохраненном курсоре.
+Запуск: python -m benchmarks.bench_http_cache --subscriptions 500
+"""
+
+import argparse
+import json
+import logging
+import time
+
+import homework
+import httpcache
+import transport
+from benchmarks.bench_subscriptions import build_data, build_registry
+from benchmarks.fake_servers import FakeBot, FakePracticum
+from poller import Poller
+
+FROM_DATE = 1_600_000_000
+
+
+def poll_pass(poller, registry):
+    """Проход опроса с фиксированным from_date."""
+    for subscription in registry:
+        subscription.timestamp = FROM_DATE
+    poller.run_once()
+
+
+def run(subscriptions, homeworks_per_token, passes, cache):
+    """Выполняет несколько проходов опроса и возвращает результаты."""
+    homework.logger.setLevel(logging.WARNING)
+    data = build_data(subscriptions, homeworks_per_token)
+    registry = build_registry(data)
+    if cache:
+        httpcache.configure()
+    else:
+        httpcache.disable()
+    transport.configure()
+    with FakePracticum(data, validators=True) as server:
+        homework.ENDPOINT = server.url
+        poller = Poller(registry, FakeBot())
+        poll_pass(poller, registry)
+        bytes_before = server.bytes_sent
+        cpu_started = time.thread_time()
+        started = time.perf_counter()
+        for _ in range(passes):
+            poll_pass(poller, registry)
+        results = {
+            'cache': cache,
+            'polls': subscriptions * passes,
+            'seconds': round(time.perf_counter() - started, 3),
+            'client_cpu_seconds': round(time.thread_time() - cpu_started, 3),
+            'body_bytes': server.bytes_sent - bytes_before,
+            'not_modified': server.not_modified,
+        }
+    transport.close()
+    httpcache.disable()
+    return results
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscriptions', type=int, default=500)
+    parser.add_argument('--homeworks', type=int, default=20)
+    parser.add_argument('--passes', type=int, default=3)
+    args = parser.parse_args()
+    results = [run(args.subscriptions, args.homeworks, args.passes, cache)
+               for cache in (False, True)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Бенчмарк логирования в цикле опроса.
+
+Меряет время parse_status для неизменившихся работ (каждый вызов
+пишет DEBUG-запись) при разных настройках логирования: синхронный
+StreamHandler на уровне DEBUG (как было раньше), очередь на уровне
+DEBUG, очередь с прореживанием и уровень INFO по умолчанию.
+Вывод идет в /dev/null, чтобы мерить затраты бота, а не терминала.
+Запуск: python -m benchmarks.bench_logging --homeworks 100000
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import homework
+import logs
+import state
+from benchmarks.fake_servers import make_homeworks
+
+
+def sync_debug(logger, stream):
+    """Прежняя настройка: DEBUG и запись в вызывающем потоке."""
+    logs.stop(logger)
+    logger.setLevel(logging.DEBUG)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(logs.TEXT_FORMAT))
+    logger.addHandler(handler)
+
+
+def configurations():
+    """Настройки логирования: имя --> функция настройки."""
+    return {
+        'sync_debug': sync_debug,
+        'queue_debug': lambda logger, stream: logs.setup(
+            logger, level='DEBUG', sample_every=1, stream=stream
+        ),
+        'queue_debug_sampled': lambda logger, stream: logs.setup(
+            logger, level='DEBUG', sample_every=100, stream=stream
+        ),
+        'info': lambda logger, stream: logs.setup(
+            logger, level='INFO', stream=stream
+        ),
+    }
+
+
+def measure(homeworks):
+    """Время разбора неизменившихся работ в вызывающем потоке."""
+    homework.homework_status_cache = state.ChangeIndex().view('')
+    for item in homeworks:
+        homework.parse_status(item)
+    started = time.perf_counter()
+    for item in homeworks:
+        homework.parse_status(item)
+    return time.perf_counter() - started
+
+
+def run(count):
+    """Выполняет замеры для всех настроек и возвращает результаты."""
+    homeworks = make_homeworks(count)
+    results = {'homeworks': count}
+    with open(os.devnull, 'w') as stream:
+        for name, configure in configurations().items():
+            configure(homework.logger, stream)
+            cpu_started = time.process_time()
+            seconds = measure(homeworks)
+            logs.stop(homework.logger)
+            results[name] = {
+                'us_per_homework': round(seconds / count * 1e6, 3),
+                'process_cpu_seconds': round(
+                    time.process_time() - cpu_started, 3
+                ),
+            }
+    logs.setup(homework.logger)
+    return results
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--homeworks', type=int, default=100_000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.homeworks), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Бенчмарк записи метрик.
+
+Меряет стоимость одного события (inc, observe, count_error)
+в одном потоке и при одновременной записи из нескольких потоков,
+а также время выдачи /metrics.
+Запуск: python -m benchmarks.bench_metrics --events 1000000 --threads 4
+"""
+
+import argparse
+import json
+import threading
+import time
+
+import exceptions as ex
+import metrics
+
+
+def per_event(function, events):
+    """Среднее время одного вызова в наносекундах."""
+    started = time.perf_counter()
+    for _ in range(events):
+        function()
+    return (time.perf_counter() - started) / events * 1e9
+
+
+def in_threads(function, events, threads):
+    """Среднее время события при записи из нескольких потоков."""
+    workers = [threading.Thread(target=per_event, args=(function, events))
+               for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) / (events * threads) * 1e9
+
+
+def run(events, threads):
+    """Выполняет замеры и возвращает результаты."""
+    counter = metrics.ERRORS.labels('BenchError')
+    error = ex.UnknownStatusError('bench')
+    events_before = counter.value
+    cases = {
+        'counter_inc': counter.inc,
+        'histogram_observe': lambda: metrics.API_LATENCY.observe(0.03),
+        'count_error': lambda: metrics.count_error(error),
+        'empty_call': lambda: None,
+    }
+    results = {'events': events, 'threads': threads}
+    for name, function in cases.items():
+        results[name] = {
+            'ns_per_event': round(per_event(function, events), 1),
+            'ns_per_event_threads': round(
+                in_threads(function, events, threads), 1
+            ),
+        }
+    started = time.perf_counter()
+    metrics.render()
+    results['render_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    results['lost_increments'] = (events * (threads + 1)
+                                  - (counter.value - events_before))
+    return results
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+    print(json.dumps(run(args.events, args.threads), indent=2))
+
+
+if __name__ == '__main__':
+    main()
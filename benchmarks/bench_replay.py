@@ -0,0 +1,143 @@
+"""
+Нагрузочный прогон бота на записанном трафике API Практикума.
+
+Запись (RECORD_FILE, recording.py) воспроизводит ReplayPracticum:
+каждая записанная сессия размножается в scale подписок, асинхронный
+опрос (aio.py) делает rounds проходов по всем подпискам. Доли ответов
+500, зависаний и обрезанного JSON, множитель задержки и лимит частоты
+задаются аргументами. Без --recording запись делается на месте: бот
+опрашивает FakePracticum, в котором работы меняют статусы.
+Запуск: python -m benchmarks.bench_replay --scale 100 --errors 0.01
+
+С --serve PORT сервер воспроизведения просто работает на порту, чтобы
+запустить против него бота (PRACTICUM_ENDPOINT).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+
+import aio
+import homework
+import recording
+from benchmarks.bench_singleflight import AsyncFakeBot
+from benchmarks.fake_servers import (FakePracticum, ReplayPracticum,
+                                     make_homeworks)
+from subscriptions import SubscriptionRegistry
+
+STATUSES = ('reviewing', 'rejected', 'reviewing', 'approved')
+
+
+def record(path, sessions, polls):
+    """Записывает polls опросов sessions студентов с заданиями в работе."""
+    data = {
+        f'student{number}': make_homeworks(3, prefix=f'student{number}_hw')
+        for number in range(sessions)
+    }
+    homework.api_recorder = recording.Recorder(path)
+    with FakePracticum(data) as server:
+        homework.ENDPOINT = server.url
+        for poll in range(polls):
+            for number, (token, works) in enumerate(data.items()):
+                work = works[(poll + number) % len(works)]
+                work['status'] = STATUSES[(poll + number) % len(STATUSES)]
+                homework.get_api_answer_for(token, poll + 1)
+    homework.api_recorder.close()
+    homework.api_recorder = None
+    return recording.load(path)
+
+
+async def poll_rounds(registry, bot, rounds, timeout):
+    """Делает rounds конкурентных проходов по всем подпискам."""
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        poller = aio.AsyncPoller(registry, bot, client)
+        for _ in range(rounds):
+            await poller.run_once()
+
+
+def load_test(exchanges, scale, rounds, timeout, **options):
+    """Опрашивает ReplayPracticum и считает исходы запросов."""
+    sessions = len({exchange.session for exchange in exchanges})
+    registry = SubscriptionRegistry()
+    for number in range(sessions * scale):
+        registry.add(f'client{number}', number, timestamp=1)
+    bot = AsyncFakeBot()
+    with ReplayPracticum(exchanges, hang=timeout + 1, **options) as server:
+        homework.ENDPOINT = server.url
+        started = time.perf_counter()
+        asyncio.run(poll_rounds(registry, bot, rounds, timeout))
+        seconds = time.perf_counter() - started
+    return {
+        'recorded_sessions': sessions,
+        'subscriptions': len(registry),
+        'requests': server.requests,
+        'seconds': round(seconds, 3),
+        'requests_per_second': round(server.requests / seconds),
+        'max_in_flight': server.max_in_flight,
+        'outcomes': dict(server.outcomes),
+        'messages': len(bot.sent),
+    }
+
+
+def run(path, sessions, polls, scale, rounds, timeout, **options):
+    """Запись (если не задана) и нагрузочный прогон."""
+    homework.logger.setLevel(logging.CRITICAL)
+    if path:
+        return load_test(recording.load(path), scale, rounds, timeout,
+                         **options)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'recording.jsonl.gz')
+        exchanges = record(path, sessions, polls)
+        results = {'recording_bytes': os.path.getsize(path),
+                   'recorded_exchanges': len(exchanges)}
+    results.update(load_test(exchanges, scale, rounds, timeout, **options))
+    return results
+
+
+def serve(path, port, **options):
+    """Запускает сервер воспроизведения до Ctrl+C."""
+    with ReplayPracticum(recording.load(path), port=port,
+                         **options) as server:
+        print(server.url)
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            pass
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recording')
+    parser.add_argument('--serve', type=int, metavar='PORT')
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--polls', type=int, default=10)
+    parser.add_argument('--scale', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=2.0)
+    parser.add_argument('--latency-scale', type=float, default=1.0)
+    parser.add_argument('--rate', type=float)
+    parser.add_argument('--errors', type=float, default=0)
+    parser.add_argument('--timeouts', type=float, default=0)
+    parser.add_argument('--malformed', type=float, default=0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    options = dict(latency_scale=args.latency_scale, rate=args.rate,
+                   errors=args.errors, timeouts=args.timeouts,
+                   malformed=args.malformed, seed=args.seed)
+    if args.serve is not None:
+        return serve(args.recording, args.serve, **options)
+    print(json.dumps(run(args.recording, args.sessions, args.polls,
+                         args.scale, args.rounds, args.timeout, **options),
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Моделирование числа запросов к API за сутки.
+
+Сравнивает фиксированный интервал RETRY_TIME с адаптивным
+планировщиком на модельном распределении подписок по режимам.
+Запуск: python -m benchmarks.bench_scheduler --subscriptions 10000
+"""
+
+import argparse
+import json
+import random
+
+import homework
+import scheduler
+from subscriptions import Subscription
+
+DAY = 24 * 60 * 60
+
+
+class FakeClock:
+    """Модельное время."""
+
+    def __init__(self):
+        """Конструктор класса."""
+        self.now = 0.0
+
+    def __call__(self):
+        """Текущее модельное время."""
+        return self.now
+
+
+def simulate(subscriptions, active_share, idle_share, error_share, seed):
+    """Возвращает число опросов за сутки по режимам."""
+    rand = random.Random(seed)
+    clock = FakeClock()
+    polls = {'active': 0, 'normal': 0, 'idle': 0, 'error': 0}
+
+    def poll(subscription):
+        value = rand.random()
+        if value < error_share:
+            subscription.failures += 1
+            polls['error'] += 1
+            return
+        subscription.failures = 0
+        if value < error_share + active_share:
+            subscription.mode = scheduler.ACTIVE
+        elif value < error_share + active_share + idle_share:
+            subscription.mode = scheduler.IDLE
+        else:
+            subscription.mode = scheduler.NORMAL
+        polls[subscription.mode] += 1
+
+    timer = scheduler.Scheduler(poll, clock=clock)
+    for number in range(subscriptions):
+        timer.schedule(Subscription(f'token{number}', number),
+                       rand.random() * homework.RETRY_TIME)
+    while True:
+        deadline = timer.next_deadline()
+        if deadline > DAY:
+            break
+        clock.now = deadline
+        timer.run_due()
+    return polls
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscriptions', type=int, default=10000)
+    parser.add_argument('--active-share', type=float, default=0.05)
+    parser.add_argument('--idle-share', type=float, default=0.7)
+    parser.add_argument('--error-share', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    polls = simulate(args.subscriptions, args.active_share, args.idle_share,
+                     args.error_share, args.seed)
+    fixed = args.subscriptions * DAY // homework.RETRY_TIME
+    print(json.dumps({
+        'fixed_interval_polls': fixed,
+        'adaptive_polls': sum(polls.values()),
+        'by_mode': polls,
+        'reduction': round(1 - sum(polls.values()) / fixed, 3),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Бенчмарк объединения одинаковых запросов (singleflight).
+
+subscriptions подписок делят tokens токенов (несколько чатов следят за
+одним студентом). Асинхронный опрос (aio.py) выполняет один проход
+по всем подпискам с объединением запросов и без него; считаются
+запросы к фейковому API и время прохода.
+Запуск: python -m benchmarks.bench_singleflight --subscriptions 300
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+
+import aio
+import homework
+import singleflight
+from benchmarks.fake_servers import FakeBot, FakePracticum, make_homeworks
+from subscriptions import SubscriptionRegistry
+
+
+class AsyncFakeBot(FakeBot):
+    """FakeBot с асинхронным send_message."""
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        """Запоминает сообщение."""
+        super().send_message(chat_id, text)
+
+
+def build_registry(subscriptions, tokens):
+    """Реестр, в котором подписки равномерно делят токены."""
+    registry = SubscriptionRegistry()
+    for number in range(subscriptions):
+        registry.add(f'token{number % tokens}', number, timestamp=1)
+    return registry
+
+
+async def poll_once(registry):
+    """Один конкурентный проход по всем подпискам."""
+    async with httpx.AsyncClient() as client:
+        await aio.AsyncPoller(registry, AsyncFakeBot(), client).run_once()
+
+
+def measure(server, subscriptions, tokens, bucket):
+    """Запросы к API и время прохода при заданной ширине корзины."""
+    aio.api_flights = singleflight.AsyncGroup(bucket)
+    registry = build_registry(subscriptions, tokens)
+    server.requests = 0
+    started = time.perf_counter()
+    asyncio.run(poll_once(registry))
+    return {
+        'upstream_requests': server.requests,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def run(subscriptions, tokens, latency):
+    """Сравнивает проход без объединения и с ним."""
+    homework.logger.setLevel(logging.WARNING)
+    data = {None: make_homeworks(5)}
+    results = {'subscriptions': subscriptions, 'tokens': tokens}
+    with FakePracticum(data, latency=latency) as server:
+        homework.ENDPOINT = server.url
+        results['separate'] = measure(server, subscriptions, tokens, 0)
+        results['coalesced'] = measure(server, subscriptions, tokens,
+                                       singleflight.SINGLEFLIGHT_BUCKET)
+    return results
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscriptions', type=int, default=300)
+    parser.add_argument('--tokens', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+    print(json.dumps(run(args.subscriptions, args.tokens, args.latency),
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Бенчмарк долговременного хранилища статусов.
+
+Заполняет хранилище, сжимает журнал в снимок и измеряет время
+повторного открытия и поиска.
+Запуск: python -m benchmarks.bench_state --entries 1000000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import state
+
+STATUSES = ('reviewing', 'approved', 'rejected')
+
+
+def run(entries, tail):
+    """Возвращает время записи, компакции, открытия и поиска."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'state')
+        store = state.LogStatusStore(path, fsync_every=10000,
+                                     compact_threshold=entries + tail + 1)
+        started = time.perf_counter()
+        for number in range(entries):
+            store[f'chat:{number}:hw{number}.zip'] = STATUSES[number % 3]
+        write_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        store.compact()
+        compact_seconds = time.perf_counter() - started
+        for number in range(tail):
+            store[f'chat:{number}:hw{number}.zip'] = 'approved'
+        store.close()
+
+        started = time.perf_counter()
+        store = state.LogStatusStore(path)
+        open_seconds = time.perf_counter() - started
+        keys = [f'chat:{number}:hw{number}.zip'
+                for number in range(0, entries, max(entries // 10000, 1))]
+        started = time.perf_counter()
+        for key in keys:
+            store.get(key)
+        lookup_seconds = time.perf_counter() - started
+        size = len(store)
+        store.close()
+    return {
+        'entries': size,
+        'log_tail': tail,
+        'writes_per_second': round(entries / write_seconds),
+        'compact_seconds': round(compact_seconds, 3),
+        'open_ms': round(open_seconds * 1000, 2),
+        'lookup_us': round(lookup_seconds / len(keys) * 1e6, 2),
+    }
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--tail', type=int, default=10000,
+                        help='записей в журнале после компакции')
+    args = parser.parse_args()
+    print(json.dumps(run(args.entries, args.tail), indent=2))
+
+
+if __name__ == '__main__':
+    main()
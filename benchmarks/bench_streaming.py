@@ -0,0 +1,89 @@
+"""
+Бенчмарк потокового разбора ответа API Практикума.
+
+Сравнивает пиковую память и время разбора синтетического ответа
+со 100 000 работ: целиком (get_api_answer + check_response)
+и потоково (streaming.HomeworkStream).
+Запуск: python -m benchmarks.bench_streaming --homeworks 100000
+"""
+
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+
+import homework
+import streaming
+from benchmarks.fake_servers import FakePracticum, make_homeworks
+
+TOKEN = 'bench'
+
+
+def consume(homeworks):
+    """Проходит по работам так же, как poller: статус и дата."""
+    latest = 0
+    for item in homeworks:
+        item.get('status')
+        latest = max(latest, homework.homework_date(item) or 0)
+    return latest
+
+
+def parse_whole():
+    """Читает и разбирает ответ целиком."""
+    response = homework.get_api_answer_for(TOKEN, 1)
+    return consume(homework.check_response(response))
+
+
+def parse_stream():
+    """Разбирает ответ по мере чтения из сокета."""
+    stream = streaming.stream_api_answer_for(TOKEN, 1)
+    return consume(streaming.check_stream(stream))
+
+
+def measure(parse):
+    """Возвращает время и пиковую память разбора.
+
+    Время и память меряются в разных прогонах: tracemalloc
+    замедляет разбор в несколько раз.
+    """
+    started = time.perf_counter()
+    parse()
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'seconds': round(seconds, 3),
+        'peak_mb': round(peak / 2 ** 20, 2),
+    }
+
+
+def run(homeworks):
+    """Сравнивает оба способа разбора на одном ответе."""
+    homework.logger.setLevel(logging.WARNING)
+    body = json.dumps({
+        'homeworks': make_homeworks(homeworks),
+        'current_date': 1,
+    }).encode()
+    with FakePracticum(raw_body=body) as server:
+        homework.ENDPOINT = server.url
+        return {
+            'homeworks': homeworks,
+            'body_mb': round(len(body) / 2 ** 20, 2),
+            'whole': measure(parse_whole),
+            'streaming': measure(parse_stream),
+        }
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--homeworks', type=int, default=100_000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.homeworks), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Бенчмарк многопользовательского опроса.
+
+Запуск: python -m benchmarks.bench_subscriptions --subscriptions 10000
+"""
+
+import argparse
+import json
+import logging
+import resource
+import time
+import tracemalloc
+
+import homework
+import transport
+from benchmarks.fake_servers import FakeBot, FakePracticum, make_homeworks
+from poller import Poller
+from subscriptions import SubscriptionRegistry
+
+
+def build_data(count, homeworks_per_token):
+    """Создает данные фейкового API: токен --> работы."""
+    return {
+        f'token{number}': make_homeworks(homeworks_per_token,
+                                         prefix=f'token{number}_hw')
+        for number in range(count)
+    }
+
+
+def build_registry(tokens):
+    """Создает реестр с одной подпиской на каждый токен."""
+    registry = SubscriptionRegistry()
+    for number, token in enumerate(tokens):
+        registry.add(token, str(number))
+    return registry
+
+
+def run(subscriptions, homeworks_per_token, session=True):
+    """Выполняет два прохода опроса и возвращает результаты."""
+    homework.logger.setLevel(logging.WARNING)
+    data = build_data(subscriptions, homeworks_per_token)
+    tracemalloc.start()
+    registry = build_registry(data)
+    registry_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    with FakePracticum(data) as server:
+        homework.ENDPOINT = server.url
+        if session:
+            transport.configure()
+        bot = FakeBot()
+        poller = Poller(registry, bot)
+        results = {'subscriptions': subscriptions}
+        for name in ('first_pass', 'second_pass'):
+            started = time.perf_counter()
+            cpu_started = time.process_time()
+            poller.run_once()
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                'seconds': round(elapsed, 3),
+                'cpu_seconds': round(time.process_time() - cpu_started, 3),
+                'polls_per_second': round(subscriptions / elapsed, 1),
+            }
+        connections = transport.connection_stats()
+    transport.close()
+    results['messages_sent'] = len(bot.sent)
+    results['connections'] = connections
+    results['registry_bytes_per_subscription'] = round(
+        registry_memory / subscriptions
+    )
+    results['max_rss_kb'] = resource.getrusage(
+        resource.RUSAGE_SELF
+    ).ru_maxrss
+    return results
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscriptions', type=int, default=10000)
+    parser.add_argument('--homeworks', type=int, default=1)
+    parser.add_argument('--no-session', action='store_true',
+                        help='новое соединение на каждый запрос')
+    args = parser.parse_args()
+    results = run(args.subscriptions, args.homeworks,
+                  session=not args.no_session)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Бенчмарк шаблонов сообщений.
+
+Рассылает changes изменений статусов в chats чатов (одно изменение -
+всем чатам, как при подписке нескольких чатов на один токен)
+и меряет время подготовки одного сообщения: прежним f-string,
+шаблоном без кэша и шаблоном с LRU-кэшем.
+Запуск: python -m benchmarks.bench_templates --changes 1000 --chats 20
+"""
+
+import argparse
+import json
+import time
+
+import homework
+import templates
+
+STATUSES = templates.STATUSES
+
+
+def f_string(style, name, status, comment):
+    """Прежнее форматирование сообщения в parse_status."""
+    verdict = homework.HOMEWORK_STATUSES[status]
+    return f'Изменился статус проверки работы "{name}". {verdict}'
+
+
+def per_message(render, style, changes, chats):
+    """Среднее время подготовки одного сообщения в микросекундах."""
+    started = time.perf_counter()
+    for number in range(changes):
+        name = f'student__hw{number}_final.zip'
+        status = STATUSES[number % len(STATUSES)]
+        for _ in range(chats):
+            render(style, name, status, 'Хорошая работа.')
+    return (time.perf_counter() - started) / (changes * chats) * 1e6
+
+
+def run(changes, chats):
+    """Выполняет замеры для текстового и HTML-формата."""
+    results = {'changes': changes, 'chats': chats}
+    for fmt in ('text', 'html'):
+        style = templates.make_style('ru', fmt, comments=True)
+        templates.render_change.cache_clear()
+        results[fmt] = {
+            'f_string_us': round(per_message(f_string, style, changes,
+                                             chats), 3),
+            'template_us': round(per_message(
+                templates.render_change.__wrapped__, style, changes, chats
+            ), 3),
+            'cached_us': round(per_message(templates.render_change, style,
+                                           changes, chats), 3),
+        }
+        info = templates.render_change.cache_info()
+        results[fmt]['renders'] = info.misses
+    return results
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--changes', type=int, default=1000)
+    parser.add_argument('--chats', type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.changes, args.chats), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Бенчмарк масштабирования опроса по процессам-воркерам.
+
+Для каждого числа воркеров меряет, сколько опросов в секунду
+(запрос, разбор JSON, проверка статусов) обрабатывает пул.
+Фейковый API отдает заранее сериализованный ответ, поэтому основная
+CPU-нагрузка приходится на воркеры. Эффективность - отношение
+пропускной способности к пропускной способности одного воркера,
+умноженной на число воркеров (1.0 - линейное масштабирование).
+Масштабирование ограничено числом ядер (cpu_count в результатах).
+Запуск: python -m benchmarks.bench_workers --workers 1 2 4 --seconds 10
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import homework
+from benchmarks.fake_servers import FakeBot, FakePracticum, make_homeworks
+from subscriptions import SubscriptionRegistry
+from workers import Coordinator
+
+
+def build_registry(count):
+    """Реестр из count подписок с разными токенами."""
+    registry = SubscriptionRegistry()
+    for number in range(count):
+        registry.add(f'token{number}', number, timestamp=1)
+    return registry
+
+
+def measure(workers, subscriptions, seconds):
+    """Опросов в секунду для заданного числа воркеров."""
+    registry = build_registry(subscriptions)
+    coordinator = Coordinator(registry, FakeBot(), workers,
+                              interval=0).start()
+    try:
+        while coordinator.results < subscriptions:
+            coordinator.step(timeout=0.1)
+        results = coordinator.results
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            coordinator.step(timeout=0.1)
+        elapsed = time.perf_counter() - started
+        return (coordinator.results - results) / elapsed
+    finally:
+        coordinator.stop()
+
+
+def run(counts, subscriptions, homeworks, seconds):
+    """Меряет пропускную способность для каждого числа воркеров."""
+    homework.logger.setLevel(logging.WARNING)
+    body = json.dumps({
+        'homeworks': make_homeworks(homeworks),
+        'current_date': 1,
+    }).encode()
+    results = {
+        'cpu_count': os.cpu_count(),
+        'subscriptions': subscriptions,
+        'homeworks_per_response': homeworks,
+        'seconds': seconds,
+        'workers': {},
+    }
+    with FakePracticum(raw_body=body) as server:
+        homework.ENDPOINT = server.url
+        for count in counts:
+            results['workers'][count] = {
+                'polls_per_second': round(
+                    measure(count, subscriptions, seconds), 1
+                ),
+            }
+    base = results['workers'][counts[0]]['polls_per_second'] / counts[0]
+    for count, data in results['workers'].items():
+        data['efficiency'] = round(data['polls_per_second']
+                                   / (base * count), 2)
+    return results
+
+
+def main():
+    """Разбирает аргументы и печатает результаты в JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4])
+    parser.add_argument('--subscriptions', type=int, default=200)
+    parser.add_argument('--homeworks', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+    print(json.dumps(run(args.workers, args.subscriptions, args.homeworks,
+                         args.seconds), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,450 @@
+"""
+Локальные фейковые серверы для бенчмарков и тестов.
+
+FakePracticum отдает ответы в формате API homework_statuses,
+ReplayPracticum - записанные ответы (recording.py) со сбоями,
+FakeTelegram принимает sendMessage как Bot API.
+"""
+
+import calendar
+import hashlib
+import json
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from email.utils import formatdate
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_PATH = '/api/user_api/homework_statuses/'
+
+
+def make_homeworks(count, status='reviewing', prefix='hw'):
+    """Генерирует список домашних работ."""
+    return [
+        {
+            'id': number,
+            'status': status,
+            'homework_name': f'{prefix}{number}.zip',
+            'reviewer_comment': '',
+            'date_updated': '2022-02-13T14:40:57Z',
+            'lesson_name': 'Итоговый проект',
+        }
+        for number in range(1, count + 1)
+    ]
+
+
+def updated_at(homework):
+    """date_updated работы как timestamp (суффикс Z необязателен)."""
+    date = homework.get('date_updated', '').rstrip('Z').replace(' ', 'T')
+    return calendar.timegm(time.strptime(date, '%Y-%m-%dT%H:%M:%S'))
+
+
+class PracticumHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов фейкового API Практикума."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        """Отдает домашние работы для токена из заголовка."""
+        server = self.server
+        if server.down:
+            self.close_connection = True
+            return None
+        url = urlsplit(self.path)
+        if url.path != API_PATH:
+            return self.send_body(HTTPStatus.NOT_FOUND, b'{}')
+        token = self.headers.get('Authorization', '')[len('OAuth '):]
+        params = parse_qs(url.query)
+        server.count_request(token, params)
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+            if server.failing:
+                return self.send_body(server.failing, b'{}')
+            body = server.body_for(token, params)
+            if not server.validators:
+                return self.send_body(HTTPStatus.OK, body)
+            headers = {
+                'ETag': '"{}"'.format(hashlib.md5(body).hexdigest()),
+                'Last-Modified': server.last_modified,
+            }
+            if self.not_modified(headers):
+                server.not_modified += 1
+                return self.send_body(HTTPStatus.NOT_MODIFIED, b'', headers)
+            self.send_body(HTTPStatus.OK, body, headers)
+        finally:
+            server.finish_request_count()
+
+    def not_modified(self, headers):
+        """Проверяет условные заголовки запроса."""
+        etag = self.headers.get('If-None-Match')
+        if etag is not None:
+            return etag == headers['ETag']
+        return self.headers.get('If-Modified-Since') == headers[
+            'Last-Modified'
+        ]
+
+    def send_body(self, status, body, headers=None):
+        """Отправляет ответ с телом."""
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.server.bytes_sent += len(body)
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Не засоряем вывод бенчмарков."""
+
+
+class FakePracticum(ThreadingHTTPServer):
+    """Фейковый API Практикума в отдельном потоке."""
+
+    daemon_threads = True
+
+    def __init__(self, homeworks=None, latency=0, validators=False,
+                 handler=PracticumHandler, raw_body=None, port=0,
+                 by_date=False):
+        """Конструктор класса.
+
+        homeworks: словарь токен --> список работ; для неизвестных
+        токенов отдается список по ключу None.
+        raw_body: готовое тело ответа для всех токенов (для больших
+        синтетических ответов, которые незачем сериализовать на каждый
+        запрос).
+        latency: задержка ответа в секундах.
+        validators: отдавать ETag/Last-Modified и отвечать 304.
+        port: порт сервера (0 - любой свободный).
+        by_date: как настоящий API - отдавать только работы
+        с date_updated не раньше from_date, а в current_date - текущее
+        время.
+
+        Атрибут failing - код ответа на все запросы (имитация сбоя
+        API); None - API работает. Атрибут down - соединения
+        обрываются без ответа (недоступность эндпоинта).
+        """
+        super().__init__(('127.0.0.1', port), handler)
+        self.homeworks = homeworks if homeworks is not None else {}
+        self.latency = latency
+        self.failing = None
+        self.down = False
+        self.validators = validators
+        self.raw_body = raw_body
+        self.by_date = by_date
+        self.last_modified = formatdate(usegmt=True)
+        self.not_modified = 0
+        self.requests = 0
+        self.last_params = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        """Адрес эндпоинта homework_statuses."""
+        host, port = self.server_address
+        return f'http://{host}:{port}{API_PATH}'
+
+    def homeworks_for(self, token):
+        """Возвращает работы для токена."""
+        return self.homeworks.get(token, self.homeworks.get(None, []))
+
+    def body_for(self, token, params):
+        """Возвращает тело ответа: готовое raw_body или JSON с работами."""
+        if self.raw_body is not None:
+            return self.raw_body
+        from_date = int(params.get('from_date', ['0'])[0])
+        homeworks = self.homeworks_for(token)
+        if not self.by_date:
+            return json.dumps({'homeworks': homeworks,
+                               'current_date': from_date}).encode()
+        return json.dumps({
+            'homeworks': [item for item in homeworks
+                          if updated_at(item) >= from_date],
+            'current_date': int(time.time()),
+        }).encode()
+
+    def count_request(self, token, params):
+        """Учитывает запрос."""
+        with self._lock:
+            self.requests += 1
+            self.last_params = params
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finish_request_count(self):
+        """Учитывает завершение запроса."""
+        with self._lock:
+            self.in_flight -= 1
+
+    def start(self):
+        """Запускает сервер в фоновом потоке."""
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер."""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        """Контекстный менеджер запускает сервер."""
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        """И останавливает его."""
+        self.stop()
+
+
+class ReplayHandler(PracticumHandler):
+    """Обработчик, который отдает записанные ответы API."""
+
+    def do_GET(self):
+        """Отдает следующий ответ сессии или имитирует сбой."""
+        server = self.server
+        if server.down:
+            self.close_connection = True
+            return None
+        url = urlsplit(self.path)
+        if url.path != API_PATH:
+            return self.send_body(HTTPStatus.NOT_FOUND, b'{}')
+        token = self.headers.get('Authorization', '')[len('OAuth '):]
+        server.count_request(token, parse_qs(url.query))
+        try:
+            reply = server.reply_for(token)
+            if reply is None:
+                # Сетевая ошибка: соединение закрывается без ответа.
+                self.close_connection = True
+                return
+            self.send_body(*reply)
+        finally:
+            server.finish_request_count()
+
+
+class ReplayPracticum(FakePracticum):
+    """Фейковый API Практикума, воспроизводящий запись (recording.py).
+
+    Токены клиентов распределяются по записанным сессиям хэшем, поэтому
+    подписок может быть во много раз больше, чем было в записи. Каждый
+    токен получает ответы своей сессии по порядку, по кругу. Ответы 304
+    заменяются последним телом 200 той же сессии: при воспроизведении
+    условные запросы не используются.
+    """
+
+    def __init__(self, exchanges, latency_scale=1.0, rate=None, errors=0,
+                 timeouts=0, malformed=0, hang=35, seed=None, port=0):
+        """Конструктор класса.
+
+        exchanges: список recording.Exchange.
+        latency_scale: множитель записанной задержки (0 - без задержки).
+        rate: не больше rate ответов в секунду, сверх - 429.
+        errors, timeouts, malformed: доли ответов 500, зависаний
+        на hang секунд без ответа и обрезанного JSON.
+        """
+        super().__init__(handler=ReplayHandler, port=port)
+        self.sessions = self.resolve(exchanges)
+        self.names = sorted(self.sessions)
+        self.latency_scale = latency_scale
+        self.rate = rate
+        self.errors = errors
+        self.timeouts = timeouts
+        self.malformed = malformed
+        self.hang = hang
+        self.outcomes = Counter()
+        self._random = random.Random(seed)
+        self._positions = {}
+        self._allowance = rate or 0
+        self._checked = time.monotonic()
+
+    @staticmethod
+    def resolve(exchanges):
+        """Группирует обмены по сессиям и раскрывает ответы 304."""
+        sessions = {}
+        last_bodies = {}
+        for exchange in exchanges:
+            if exchange.status == HTTPStatus.NOT_MODIFIED:
+                body = last_bodies.get(exchange.session)
+                if body is None:
+                    continue
+                exchange = exchange._replace(status=HTTPStatus.OK, body=body)
+            elif exchange.status == HTTPStatus.OK:
+                last_bodies[exchange.session] = exchange.body
+            sessions.setdefault(exchange.session, []).append(exchange)
+        return sessions
+
+    def next_exchange(self, token):
+        """Следующий записанный обмен сессии токена."""
+        name = self.names[zlib.crc32(token.encode()) % len(self.names)]
+        exchanges = self.sessions[name]
+        with self._lock:
+            position = self._positions.get(token, 0)
+            self._positions[token] = position + 1
+        return exchanges[position % len(exchanges)]
+
+    def next_fault(self):
+        """Сбой для очередного запроса по заданным долям или None."""
+        with self._lock:
+            draw = self._random.random()
+        for fault, share in (('error', self.errors),
+                             ('timeout', self.timeouts),
+                             ('malformed', self.malformed)):
+            if draw < share:
+                return fault
+            draw -= share
+        return None
+
+    def admit(self):
+        """Ограничение частоты ответов (token bucket)."""
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(
+                self.rate, self._allowance + (now - self._checked) * self.rate
+            )
+            self._checked = now
+            if self._allowance < 1:
+                return False
+            self._allowance -= 1
+            return True
+
+    def reply_for(self, token):
+        """Код и тело ответа; None - закрыть соединение без ответа."""
+        fault = self.next_fault()
+        if fault == 'timeout':
+            self.outcomes[fault] += 1
+            time.sleep(self.hang)
+            return None
+        if not self.admit():
+            self.outcomes['throttled'] += 1
+            return HTTPStatus.TOO_MANY_REQUESTS, b'{}'
+        exchange = self.next_exchange(token)
+        delay = exchange.latency * self.latency_scale
+        if delay:
+            time.sleep(delay)
+        if fault == 'error':
+            self.outcomes[fault] += 1
+            return HTTPStatus.INTERNAL_SERVER_ERROR, b'{}'
+        if not exchange.status:
+            self.outcomes['dropped'] += 1
+            return None
+        self.outcomes[fault or 'recorded'] += 1
+        if fault == 'malformed':
+            return exchange.status, exchange.body[:len(exchange.body) // 2]
+        return exchange.status, exchange.body
+
+
+class TelegramHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов фейкового Bot API."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        """Принимает вызов метода Bot API."""
+        method = self.path.rsplit('/', 1)[-1]
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length)
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            data = json.loads(raw or b'{}')
+        else:
+            data = {key: values[0]
+                    for key, values in parse_qs(raw.decode()).items()}
+        if method == 'sendMessage' and self.server.latency:
+            time.sleep(self.server.latency)
+        result = self.server.call(method, data)
+        body = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Не засоряем вывод бенчмарков."""
+
+
+class FakeTelegram(FakePracticum):
+    """Фейковый Bot API Telegram, запоминающий отправленные сообщения."""
+
+    def __init__(self, handler=TelegramHandler, latency=0):
+        """Конструктор класса.
+
+        latency: задержка ответа на sendMessage в секундах.
+        """
+        super().__init__(latency=latency, handler=handler)
+        self.sent = []
+        self.updates = []
+        self._new_updates = threading.Condition(self._lock)
+
+    @property
+    def base_url(self):
+        """Базовый адрес Bot API (без токена)."""
+        host, port = self.server_address
+        return f'http://{host}:{port}'
+
+    def call(self, method, data):
+        """Выполняет метод Bot API."""
+        with self._lock:
+            self.requests += 1
+            if method == 'sendMessage':
+                self.sent.append((data.get('chat_id'), data.get('text')))
+                return {'message_id': len(self.sent),
+                        'date': int(time.time()),
+                        'chat': {'id': data.get('chat_id'),
+                                 'type': 'private'},
+                        'text': data.get('text')}
+            if method == 'getMe':
+                return {'id': 1, 'is_bot': True, 'first_name': 'FakeBot',
+                        'username': 'fake_bot'}
+            if method == 'getUpdates':
+                return self.get_updates(int(data.get('offset') or 0),
+                                        float(data.get('timeout') or 0))
+        return True
+
+    def push_update(self, chat_id, text):
+        """Добавляет входящее сообщение пользователя."""
+        with self._lock:
+            update_id = len(self.updates) + 1
+            self.updates.append({
+                'update_id': update_id,
+                'message': {'message_id': update_id,
+                            'date': int(time.time()),
+                            'chat': {'id': chat_id, 'type': 'private'},
+                            'text': text},
+            })
+            self._new_updates.notify_all()
+        return self.updates[-1]
+
+    def get_updates(self, offset, timeout):
+        """Обновления начиная с offset; ждет их до timeout секунд."""
+        self._new_updates.wait_for(
+            lambda: self.updates and self.updates[-1]['update_id'] >= offset,
+            timeout
+        )
+        return [update for update in self.updates
+                if update['update_id'] >= offset]
+
+
+class FakeBot:
+    """Бот, который запоминает сообщения вместо отправки в Telegram."""
+
+    def __init__(self):
+        """Конструктор класса."""
+        self.sent = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Сохраняет сообщение."""
+        self.sent.append((chat_id, text))
@@ -0,0 +1,207 @@
+"""
+Автоматический выключатель (circuit breaker) для эндпоинтов API.
+
+У каждого эндпоинта свой выключатель, общий для всех подписок
+процесса. В состоянии closed запросы идут как обычно; после
+BREAKER_FAILURES неудач подряд (нет соединения, код 5xx или 429)
+выключатель размыкается (open) и запросы не выполняются:
+вызывающий код получает ex.CircuitOpenError. Через
+BREAKER_RESET_TIMEOUT секунд выключатель переходит в half-open и
+пропускает один пробный запрос: успех замыкает его, неудача снова
+размыкает.
+
+Вместо сообщения об ошибке в каждый чат OutageNotifier отправляет
+одно уведомление о недоступности при размыкании и одно
+о восстановлении. Состояние выключателей видно в /metrics.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import exceptions as ex
+import metrics
+import templates
+
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', 60))
+
+# Значения совпадают с показателем homework_circuit_breaker_state.
+CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+STATE_NAMES = {CLOSED: 'closed', OPEN: 'open', HALF_OPEN: 'half-open'}
+ENDPOINT_ERRORS = (ex.CircuitOpenError, ex.SystemExit, ex.EndpointAccessError)
+
+_breakers = {}
+_listeners = []
+_lock = threading.Lock()
+
+logger = logging.getLogger('homework.breaker')
+
+
+def healthy(status_code):
+    """Ответ с этим кодом считается успехом эндпоинта.
+
+    Ошибки клиента (например, неверный токен) касаются одной
+    подписки, а не доступности API.
+    """
+    return status_code < 500 and status_code != 429
+
+
+class CircuitBreaker:
+    """Выключатель одного эндпоинта с состояниями closed/open/half-open."""
+
+    def __init__(self, endpoint, failure_threshold=BREAKER_FAILURES,
+                 reset_timeout=BREAKER_RESET_TIMEOUT, clock=time.monotonic):
+        """Конструктор класса."""
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        """Эндпоинт и состояние выключателя."""
+        return f'<CircuitBreaker {self.endpoint} {STATE_NAMES[self.state]}>'
+
+    def allow(self):
+        """Можно ли выполнить запрос.
+
+        В half-open разрешается только один пробный запрос
+        до его результата.
+        """
+        with self._lock:
+            old = self.state
+            if old == CLOSED:
+                return True
+            if old == OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+            if self.probing:
+                return False
+            self.probing = True
+            new = self.state
+        if old != new:
+            self._changed(old, new)
+        return True
+
+    def before_request(self):
+        """Пропускает запрос или выбрасывает ex.CircuitOpenError."""
+        if not self.allow():
+            metrics.BREAKER_REJECTED.labels(self.endpoint).inc()
+            raise ex.CircuitOpenError(f'Запросы к {self.endpoint} '
+                                      f'приостановлены')
+
+    def record(self, ok):
+        """Учитывает результат разрешенного запроса."""
+        with self._lock:
+            old = self.state
+            self.probing = False
+            if ok:
+                self.failures = 0
+                self.state = CLOSED
+            else:
+                self.failures += 1
+                if (old == HALF_OPEN
+                        or self.failures >= self.failure_threshold):
+                    self.state = OPEN
+                    self.opened_at = self.clock()
+            new = self.state
+        if old != new:
+            self._changed(old, new)
+
+    def mirror(self, new):
+        """Выставляет состояние, известное из другого процесса."""
+        with self._lock:
+            old, self.state = self.state, new
+        if old != new:
+            self._changed(old, new)
+
+    def _changed(self, old, new):
+        """Логирует переход и вызывает подписчиков вне блокировки."""
+        logger.warning('Выключатель %s: %s --> %s', self.endpoint,
+                       STATE_NAMES[old], STATE_NAMES[new])
+        for listener in list(_listeners):
+            try:
+                listener(self, old, new)
+            except Exception as error:
+                logger.error('Ошибка подписчика выключателя: %s', error)
+
+
+def for_endpoint(endpoint):
+    """Выключатель эндпоинта (создается при первом обращении)."""
+    circuit = _breakers.get(endpoint)
+    if circuit is None:
+        with _lock:
+            circuit = _breakers.get(endpoint)
+            if circuit is None:
+                circuit = _breakers[endpoint] = CircuitBreaker(endpoint)
+                metrics.BREAKER_STATE.labels(endpoint).set_function(
+                    lambda: circuit.state
+                )
+    return circuit
+
+
+def add_listener(listener):
+    """Подписывает listener(breaker, old, new) на переходы выключателей."""
+    _listeners.append(listener)
+
+
+def reset():
+    """Забывает выключатели и подписчиков (для тестов)."""
+    with _lock:
+        _breakers.clear()
+        _listeners.clear()
+
+
+def covers(error, endpoint):
+    """Ошибку уже покрывает уведомление о недоступности эндпоинта.
+
+    Пока выключатель не замкнут, ошибки доступа к эндпоинту
+    не рассылаются по чатам.
+    """
+    if isinstance(error, ex.CircuitOpenError):
+        return True
+    return (isinstance(error, ENDPOINT_ERRORS)
+            and for_endpoint(endpoint).state != CLOSED)
+
+
+class OutageNotifier:
+    """Одно уведомление в каждый чат при размыкании и восстановлении."""
+
+    def __init__(self, chats, deliver):
+        """Конструктор класса.
+
+        chats: функция, возвращающая словарь чат --> Style.
+        deliver: функция deliver(chat_id, message, parse_mode).
+        """
+        self.chats = chats
+        self.deliver = deliver
+
+    @classmethod
+    def for_registry(cls, registry, deliver):
+        """Уведомления всем чатам реестра подписок."""
+        return cls.for_subscriptions(registry.__iter__, deliver)
+
+    @classmethod
+    def for_subscriptions(cls, subscriptions, deliver):
+        """Уведомления чатам подписок, которые возвращает subscriptions()."""
+        return cls(lambda: {subscription.chat_id: subscription.style
+                            for subscription in subscriptions()}, deliver)
+
+    def __call__(self, circuit, old, new):
+        """Рассылает уведомление о переходе выключателя."""
+        if old == CLOSED and new == OPEN:
+            key = 'outage'
+        elif new == CLOSED:
+            key = 'recovered'
+        else:
+            return
+        for chat_id, style in self.chats().items():
+            self.deliver(chat_id, templates.render_notice(style, key),
+                         style.parse_mode)
@@ -0,0 +1,487 @@
+"""
+Несколько экземпляров бота с общим состоянием.
+
+Экземпляры (узлы) запускаются с одним файлом подписок и одним
+CLUSTER_STATE - файлом SQLite в режиме WAL, поэтому узлы работают
+на одной машине (или в контейнерах с общим локальным томом).
+Подписки делятся на CLUSTER_PARTITIONS партиций по хэшу префикса
+подписки, каждую партицию опрашивает узел, взявший ее в аренду
+(lease) на LEASE_TTL секунд. Узлы продлевают аренду каждые
+LEASE_TTL / 3 секунд и делят партиции поровну между живыми узлами:
+новый узел забирает свою долю, когда остальные отпускают лишнее,
+а партиции упавшего узла разбирают оставшиеся, как только истечет
+его аренда.
+
+Статусы и водяные знаки from_date хранятся в том же файле, поэтому
+новый владелец партиции продолжает с того места, где остановился
+прежний. Перед отправкой уведомления об изменении узел записывает
+его идентификатор (подписка, работа, статус, date_updated) в общую
+таблицу, и только если партиция все еще за ним: уведомление уходит
+не больше одного раза, даже если прежний владелец «проснулся» после
+истечения аренды. Статус сохраняется только после этой записи: если
+файл занят или недоступен (sqlite3.Error), изменение повторяется
+следующим опросом, а не теряется. Цена - уведомления, записанные
+узлом, который упал до их отправки (например, ждавшие в очереди
+отправки), теряются.
+Записи старше NOTIFICATION_TTL секунд удаляются.
+
+Хранилище - любой объект с интерфейсом SharedState: хранилище статусов
+(state.py), cursors(), partition_of(), renew(), claim() и release().
+Здесь оно одно - SQLite.
+
+Запуск (на каждом узле): CLUSTER_STATE=/shared/bot.db python poller.py
+"""
+
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import state
+from poller import Poller
+
+CLUSTER_STATE = os.getenv('CLUSTER_STATE')
+CLUSTER_NODE = os.getenv('CLUSTER_NODE',
+                         f'{socket.gethostname()}:{os.getpid()}')
+CLUSTER_PARTITIONS = int(os.getenv('CLUSTER_PARTITIONS', 64))
+LEASE_TTL = float(os.getenv('LEASE_TTL', 30))
+NOTIFICATION_TTL = float(os.getenv('NOTIFICATION_TTL', 7 * 24 * 3600))
+BUSY_TIMEOUT = 10
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS nodes (
+    node TEXT PRIMARY KEY, expires REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (
+    partition INTEGER PRIMARY KEY, node TEXT NOT NULL,
+    expires REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS statuses (
+    key TEXT PRIMARY KEY, status TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cursors (
+    key TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS notifications (
+    id TEXT PRIMARY KEY, created REAL NOT NULL) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS notifications_created
+    ON notifications (created);
+'''
+
+# Условие записи: партиция арендована этим узлом и аренда не истекла.
+LEASED = ('EXISTS (SELECT 1 FROM leases '
+          'WHERE partition = ? AND node = ? AND expires > ?)')
+
+logger = logging.getLogger('homework.cluster')
+
+
+def notification_id(namespace, key, status, date):
+    """Идентификатор уведомления: подписка, работа, статус и дата."""
+    text = f'{namespace}:{key}:{status}:{date or 0}'
+    return hashlib.blake2b(text.encode(), digest_size=12).hexdigest()
+
+
+class NoteRecorder(state.IndexView):
+    """Кэш статусов подписки, записывающий уведомления в общий файл.
+
+    Смена статуса сначала записывается как уведомление
+    (SharedState.claim), и только потом попадает в индекс и таблицу
+    статусов. notes - результаты записи в том же порядке, что
+    и сообщения об изменениях (как ChangeRecorder в workers.py):
+    True - отправлять, False - уже отправлено или партиция отдана,
+    None - общий файл недоступен. В последнем случае изменение
+    не сохраняется, и следующий опрос найдет его снова.
+    """
+
+    __slots__ = ('namespace', 'notes')
+
+    def __init__(self, index, prefix, backing):
+        """Конструктор класса."""
+        super().__init__(index, prefix, backing)
+        self.namespace = prefix
+        self.notes = []
+
+    def record(self, key, status, date=0, previous=None):
+        """Записывает уведомление о смене статуса, затем сам статус."""
+        if status != previous:
+            note = notification_id(self.namespace, key, status, date)
+            backing = self.backing
+            try:
+                claimed = backing.store.claim(note, backing.partition)
+            except sqlite3.Error as error:
+                logger.error('Не удалось записать уведомление: %s', error)
+                self.notes.append(None)
+                return
+            self.notes.append(claimed)
+        try:
+            super().record(key, status, date, previous)
+        except sqlite3.Error as error:
+            # Уведомление уже записано: повтор его не отправит.
+            logger.error('Не удалось сохранить статус: %s', error)
+
+
+class LeasedView(state.StoreView):
+    """Статусы подписки в SharedState: запись только под арендой.
+
+    Узел, у которого истекла аренда, не перезапишет статусы нового
+    владельца партиции.
+    """
+
+    __slots__ = ('partition',)
+
+    def __init__(self, store, prefix, partition):
+        """Конструктор класса."""
+        super().__init__(store, prefix)
+        self.partition = partition
+
+    def __setitem__(self, key, value):
+        """Сохраняет статус, если партиция еще за узлом."""
+        self.last_batch = None
+        self.store.put(f'{self.prefix}{key}', value, self.partition)
+
+
+class SharedState:
+    """Общее состояние узлов в файле SQLite.
+
+    Хранилище статусов с интерфейсом state.LogStatusStore: индекс
+    в памяти узла поверх таблицы statuses. Аренда партиций и
+    идентификаторы уведомлений - в том же файле; время аренды -
+    по часам clock (общим для узлов).
+    """
+
+    def __init__(self, path, node=CLUSTER_NODE,
+                 partitions=CLUSTER_PARTITIONS, ttl=LEASE_TTL,
+                 clock=time.time):
+        """Конструктор класса.
+
+        Число партиций задает первый узел, открывший файл: остальные
+        берут его из файла.
+        """
+        self.node = node
+        self.ttl = ttl
+        self.clock = clock
+        self.index = state.ChangeIndex()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+        self._db.execute('INSERT OR IGNORE INTO meta VALUES (?, ?)',
+                         ('partitions', partitions))
+        self.partitions = self._db.execute(
+            'SELECT value FROM meta WHERE name = ?', ('partitions',)
+        ).fetchone()[0]
+
+    def _execute(self, sql, parameters=()):
+        """Выполняет запрос под блокировкой соединения."""
+        with self._lock:
+            return self._db.execute(sql, parameters)
+
+    def _fetchone(self, sql, parameters=()):
+        """Выполняет запрос и читает строку, не отпуская блокировку.
+
+        Соединение общее с потоком метрик (__len__): чтение после
+        снятия блокировки могло бы смешаться с чужим запросом.
+        """
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchone()
+
+    def partition_of(self, namespace):
+        """Партиция подписки по ее префиксу."""
+        return state.key_hash(namespace) % self.partitions
+
+    def renew(self):
+        """Продлевает аренду узла и добирает его долю партиций.
+
+        Доля - партиции поровну на живых узлах (с непросроченной
+        отметкой). Лишние партиции отпускаются сразу, недостающие
+        берутся из свободных и просроченных. Возвращает множество
+        партиций узла.
+        """
+        now = self.clock()
+        expires = now + self.ttl
+        with self._lock:
+            db = self._db
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.execute('INSERT OR REPLACE INTO nodes VALUES (?, ?)',
+                           (self.node, expires))
+                db.execute('DELETE FROM nodes WHERE expires <= ?', (now,))
+                live = db.execute('SELECT COUNT(*) FROM nodes').fetchone()[0]
+                db.execute('UPDATE leases SET expires = ? WHERE node = ?',
+                           (expires, self.node))
+                owned = self._balance(db, -(-self.partitions // live), now,
+                                      expires)
+                db.execute('DELETE FROM notifications WHERE created < ?',
+                           (now - NOTIFICATION_TTL,))
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        return frozenset(owned)
+
+    def _balance(self, db, share, now, expires):
+        """Отпускает партиции сверх доли share или добирает до нее."""
+        owned = [partition for partition, in db.execute(
+            'SELECT partition FROM leases WHERE node = ? ORDER BY partition',
+            (self.node,)
+        )]
+        if len(owned) > share:
+            db.executemany('DELETE FROM leases WHERE partition = ?',
+                           [(partition,) for partition in owned[share:]])
+            return owned[:share]
+        taken = {partition for partition, in db.execute(
+            'SELECT partition FROM leases WHERE expires > ?', (now,)
+        )}
+        free = [partition for partition in range(self.partitions)
+                if partition not in taken][:share - len(owned)]
+        db.executemany('INSERT OR REPLACE INTO leases VALUES (?, ?, ?)',
+                       [(partition, self.node, expires)
+                        for partition in free])
+        return owned + free
+
+    def write_leased(self, sql, values, partition):
+        """Выполняет запись sql с условием {leased} (LEASED).
+
+        Проверка аренды и запись идут одним запросом. Возвращает True,
+        если строка записана.
+        """
+        cursor = self._execute(sql.format(leased=LEASED), values + (
+            partition, self.node, self.clock()
+        ))
+        return cursor.rowcount == 1
+
+    def claim(self, note, partition):
+        """Записывает уведомление note, если партиция еще за узлом.
+
+        True - уведомление можно отправлять: его не было и аренда
+        не истекла.
+        """
+        return self.write_leased(
+            'INSERT OR IGNORE INTO notifications (id, created) '
+            'SELECT ?, ? WHERE {leased}', (note, self.clock()), partition
+        )
+
+    def put(self, key, value, partition):
+        """Сохраняет статус, если партиция еще за узлом."""
+        return self.write_leased(
+            'INSERT OR REPLACE INTO statuses SELECT ?, ? WHERE {leased}',
+            (key, value), partition
+        )
+
+    def release(self):
+        """Отпускает все партиции узла (при остановке)."""
+        with self._lock:
+            self._db.execute('DELETE FROM leases WHERE node = ?',
+                             (self.node,))
+            self._db.execute('DELETE FROM nodes WHERE node = ?',
+                             (self.node,))
+
+    def get(self, key, default=None):
+        """Возвращает статус по ключу."""
+        row = self._fetchone('SELECT status FROM statuses WHERE key = ?',
+                             (key,))
+        return default if row is None else row[0]
+
+    def __setitem__(self, key, value):
+        """Сохраняет статус."""
+        self._execute('INSERT OR REPLACE INTO statuses VALUES (?, ?)',
+                      (key, value))
+
+    def __contains__(self, key):
+        """Проверяет наличие ключа."""
+        return self.get(key) is not None
+
+    def __len__(self):
+        """Количество статусов."""
+        return self._fetchone('SELECT COUNT(*) FROM statuses')[0]
+
+    def view(self, prefix):
+        """Кэш статусов подписки: индекс в памяти поверх таблицы."""
+        return NoteRecorder(self.index, prefix,
+                            LeasedView(self, prefix,
+                                       self.partition_of(prefix)))
+
+    def cursors(self):
+        """Водяные знаки from_date подписок в том же файле."""
+        return SharedCursors(self)
+
+    def flush(self):
+        """Каждая запись фиксируется сразу."""
+
+    def compact(self):
+        """Нечего сжимать."""
+
+    def close(self):
+        """Отпускает партиции и закрывает файл."""
+        self.release()
+        with self._lock:
+            self._db.close()
+
+
+class SharedCursors:
+    """Водяные знаки from_date в SharedState (интерфейс CursorStore).
+
+    Ключ - префикс подписки. Водяной знак записывается только под
+    арендой партиции подписки и только растет: узел, у которого истекла
+    аренда, не сдвинет его за непоказанные изменения и не откатит назад.
+    """
+
+    def __init__(self, shared):
+        """Конструктор класса."""
+        self.shared = shared
+
+    def get(self, key, default=None):
+        """Возвращает водяной знак подписки."""
+        row = self.shared._fetchone('SELECT value FROM cursors WHERE key = ?',
+                                    (key,))
+        return default if row is None else row[0]
+
+    def __setitem__(self, key, value):
+        """Сохраняет водяной знак, если партиция подписки за узлом.
+
+        Если общий файл недоступен, знак запишет следующий опрос.
+        """
+        try:
+            self.shared.write_leased(
+                'INSERT INTO cursors SELECT ?, ? WHERE {leased} '
+                'ON CONFLICT (key) DO UPDATE SET '
+                'value = max(value, excluded.value)', (key, value),
+                self.shared.partition_of(key)
+            )
+        except sqlite3.Error as error:
+            logger.error('Не удалось сохранить from_date %s: %s', key, error)
+
+    def __len__(self):
+        """Количество подписок."""
+        return self.shared._fetchone('SELECT COUNT(*) FROM cursors')[0]
+
+    def flush(self):
+        """Каждая запись фиксируется сразу."""
+
+    def close(self):
+        """Файл закрывает SharedState."""
+
+
+class ClusterPoller(Poller):
+    """Опрос подписок партиций, арендованных узлом.
+
+    Уведомления об изменениях уходят, только если SharedState.claim()
+    записал их идентификаторы; сообщения об ошибках опроса - как
+    в Poller.
+    """
+
+    def __init__(self, registry, bot, shared, queue=None, streaming=False,
+                 renew_interval=None):
+        """Конструктор класса.
+
+        registry: реестр подписок поверх shared (хранилище статусов
+        и shared.cursors()).
+        renew_interval: период продления аренды (по умолчанию треть
+        срока аренды).
+        """
+        super().__init__(registry, bot, queue=queue, streaming=streaming)
+        self.shared = shared
+        self.renew_interval = (renew_interval if renew_interval is not None
+                               else shared.ttl / 3)
+        self.owned = frozenset()
+        self._renewed = None
+
+    def keep_leases(self, force=False):
+        """Продлевает аренду, если пора; возвращает партиции узла.
+
+        Подписки новых партиций продолжают с общего водяного знака
+        (если прежний владелец его записал) и опрашиваются сразу.
+        Если общий файл недоступен, узел считает, что партиций у него
+        нет: отправлять без записи в него нельзя.
+        """
+        now = time.monotonic()
+        if (not force and self._renewed is not None
+                and now - self._renewed < self.renew_interval):
+            return self.owned
+        self._renewed = now
+        try:
+            owned = self.shared.renew()
+        except sqlite3.Error as error:
+            logger.error('Не удалось продлить аренду партиций: %s', error)
+            owned = frozenset()
+        gained = owned - self.owned
+        if owned != self.owned:
+            logger.info('Узел %s: партиций %s (новых %s)', self.shared.node,
+                        len(owned), len(gained))
+        self.owned = owned
+        if gained:
+            self.take_over(gained)
+        return owned
+
+    def take_over(self, partitions):
+        """Ставит на опрос подписки партиций, перешедших к узлу."""
+        cursors = self.registry.cursors
+        for subscription in self.registry:
+            if self.shared.partition_of(subscription.namespace) in partitions:
+                if cursors is not None:
+                    subscription.timestamp = (
+                        cursors.get(subscription.namespace)
+                        or subscription.timestamp
+                    )
+                self.scheduler.schedule(subscription)
+
+    def owned_subscriptions(self):
+        """Подписки партиций узла."""
+        return [subscription for subscription in self.registry
+                if self.shared.partition_of(subscription.namespace)
+                in self.owned]
+
+    def collect(self, subscription):
+        """Опрашивает подписку своей партиции."""
+        self.keep_leases()
+        partition = self.shared.partition_of(subscription.namespace)
+        if partition not in self.owned:
+            return []
+        return super().collect(subscription)
+
+    def fetch(self, subscription):
+        """Запрашивает API и отсеивает уже отправленные уведомления.
+
+        Если часть уведомлений не удалось записать в общий файл,
+        from_date подписки не сдвигается, а тот же ответ разбирается
+        заново: незаписанные изменения не сохранены и будут найдены
+        следующим опросом.
+        """
+        status_cache = subscription.status_cache
+        notes = status_cache.notes
+        notes.clear()
+        timestamp = subscription.timestamp
+        messages = super().fetch(subscription)
+        fresh = [message for claimed, message in zip(notes, messages)
+                 if claimed]
+        if None in notes:
+            logger.warning('%r: изменения будут отправлены при следующем '
+                           'опросе', subscription)
+            subscription.timestamp = timestamp
+            subscription.seen_version = None
+            status_cache.last_batch = None
+        elif len(fresh) < len(notes):
+            logger.info('%r: уже отправлено или партиция отдана: %s',
+                        subscription, len(notes) - len(fresh))
+        return fresh + messages[len(notes):]
+
+    def run_forever(self):
+        """Опрашивает подписки, продлевая аренду между опросами."""
+        self.keep_leases(force=True)
+        self.schedule_all()
+        self.scheduler.run_forever(self.wake, self.renew_interval)
+
+    def wake(self):
+        """Пробуждение планировщика: новый тик и продление аренды."""
+        self.start_tick()
+        self.keep_leases()
+
+
+def open_shared(path=CLUSTER_STATE):
+    """Открывает общее состояние, если задан путь."""
+    if path:
+        return SharedState(path)
+    return None
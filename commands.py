@@ -0,0 +1,208 @@
+"""
+Команды бота: /status, /history, /pause, /resume.
+
+Ответы строятся только из памяти процесса - досок статусов чатов
+(state.StatusBoard), которые пополняет опрос, - без запросов к API.
+Команды принимаются в отдельном потоке и не мешают опросу.
+
+Режим задает COMMANDS_MODE:
+polling - long polling через getUpdates (LONG_POLL_TIMEOUT секунд);
+webhook - HTTP-сервер на WEBHOOK_HOST:WEBHOOK_PORT принимает обновления
+по пути WEBHOOK_PATH и отвечает прямо в ответе на запрос Telegram.
+Запросы без заголовка X-Telegram-Bot-Api-Secret-Token, равного
+WEBHOOK_SECRET, отклоняются (403): иначе любой, кто достучался до порта,
+мог бы ставить чужие чаты на паузу и читать их статусы. Если задан
+WEBHOOK_URL, вебхук регистрируется через setWebhook вместе с секретом.
+Пустое значение - команды выключены.
+"""
+
+import logging
+import os
+import threading
+
+import templates
+
+COMMANDS_MODE = os.getenv('COMMANDS_MODE', '')
+LONG_POLL_TIMEOUT = int(os.getenv('LONG_POLL_TIMEOUT', 30))
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+RETRY_DELAY = 5
+
+logger = logging.getLogger('homework.commands')
+
+
+def verdict(style, status):
+    """Вердикт для статуса на языке чата."""
+    if status in templates.STATUSES:
+        return templates.template(style.locale, status, style.fmt).render()
+    return status
+
+
+def short_date(date):
+    """Дата из date_updated без секунд: 2022-02-13 14:40."""
+    return (date or '')[:16].replace('T', ' ')
+
+
+class CommandHandler:
+    """Отвечает на команды по доскам статусов чатов."""
+
+    COMMANDS = ('status', 'history', 'pause', 'resume', 'help')
+
+    def __init__(self, board):
+        """Конструктор класса.
+
+        board: доски чатов (state.StatusBoard); команды принимаются
+        только от чатов, у которых есть доска.
+        """
+        self.board = board
+
+    def handle(self, update):
+        """Ответ на обновление Bot API: (chat_id, текст, parse_mode).
+
+        None - обновление не является командой.
+        """
+        message = update.get('message') or {}
+        text = message.get('text') or ''
+        chat_id = (message.get('chat') or {}).get('id')
+        if chat_id is None or not text.startswith('/'):
+            return None
+        # /status@имя_бота в группах.
+        command = text.split()[0][1:].split('@')[0]
+        chat = self.board.get(chat_id)
+        if chat is None:
+            style = templates.DEFAULT_STYLE
+            reply = templates.render_notice(style, 'not_subscribed')
+        else:
+            style = chat.style or templates.DEFAULT_STYLE
+            if command not in self.COMMANDS:
+                command = 'help'
+            reply = getattr(self, command)(chat, style)
+        return chat_id, reply, style.parse_mode
+
+    def status(self, chat, style):
+        """Последние известные статусы работ чата."""
+        statuses = dict(chat.statuses)
+        if not statuses:
+            return templates.render_notice(style, 'no_status')
+        return '\n'.join(
+            templates.render_notice(style, 'status_line', name=name,
+                                    verdict=verdict(style, status))
+            for name, (status, _) in statuses.items()
+        )
+
+    def history(self, chat, style):
+        """Последние изменения статусов, от новых к старым."""
+        history = list(chat.history)
+        if not history:
+            return templates.render_notice(style, 'no_history')
+        return '\n'.join(
+            templates.render_notice(style, 'history_line',
+                                    date=short_date(date), name=name,
+                                    verdict=verdict(style, status))
+            for date, name, status in reversed(history)
+        )
+
+    def pause(self, chat, style):
+        """Приостанавливает уведомления чата."""
+        chat.paused = True
+        return templates.render_notice(style, 'paused')
+
+    def resume(self, chat, style):
+        """Возобновляет уведомления чата."""
+        chat.paused = False
+        return templates.render_notice(style, 'resumed')
+
+    def help(self, chat, style):
+        """Список команд."""
+        return templates.render_notice(style, 'help')
+
+
+class LongPoller(threading.Thread):
+    """Получает команды через getUpdates и отвечает на них."""
+
+    def __init__(self, handler, bot, timeout=LONG_POLL_TIMEOUT):
+        """Конструктор класса."""
+        super().__init__(name='commands', daemon=True)
+        self.handler = handler
+        self.bot = bot
+        self.timeout = timeout
+        self.offset = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        """Цикл long polling до остановки."""
+        from telegram import TelegramError
+
+        while not self._stopped.is_set():
+            try:
+                self.poll_once()
+            except TelegramError as error:
+                logger.error('Сбой при получении команд: %s', error)
+                self._stopped.wait(RETRY_DELAY)
+            except Exception:
+                logger.exception('Непредвиденный сбой при обработке команд')
+                self._stopped.wait(RETRY_DELAY)
+
+    def poll_once(self):
+        """Один запрос getUpdates и ответы на полученные команды."""
+        updates = self.bot.get_updates(offset=self.offset,
+                                       timeout=self.timeout,
+                                       allowed_updates=['message'])
+        for update in updates:
+            self.offset = update.update_id + 1
+            answer = self.handler.handle(update.to_dict())
+            if answer is not None:
+                self.reply(*answer)
+
+    def reply(self, chat_id, text, parse_mode):
+        """Отправляет ответ на команду."""
+        from telegram import TelegramError
+
+        try:
+            self.bot.send_message(chat_id, text, parse_mode=parse_mode)
+        except TelegramError as error:
+            logger.error('Сбой при ответе на команду: %s', error)
+
+    def stop(self):
+        """Останавливает цикл после текущего запроса."""
+        self._stopped.set()
+
+
+def start(board, bot, mode=COMMANDS_MODE):
+    """Запускает прием команд в выбранном режиме.
+
+    Возвращает работающий LongPoller или WebhookServer (None, если
+    команды выключены).
+    """
+    handler = CommandHandler(board)
+    if mode == 'polling':
+        bot.delete_webhook()
+        runner = LongPoller(handler, bot)
+        runner.start()
+    elif mode == 'webhook':
+        from httpd import WebhookServer
+
+        if not WEBHOOK_SECRET:
+            raise ValueError('Для режима webhook нужен WEBHOOK_SECRET')
+        runner = WebhookServer(handler, secret=WEBHOOK_SECRET).start()
+        if WEBHOOK_URL:
+            bot.set_webhook(url=WEBHOOK_URL, allowed_updates=['message'],
+                            api_kwargs={'secret_token': WEBHOOK_SECRET})
+    elif not mode:
+        return None
+    else:
+        raise ValueError(f'Неизвестный режим команд "{mode}"')
+    logger.info('Команды принимаются в режиме %s', mode)
+    return runner
+
+
+def __getattr__(name):
+    """Классы вебхука импортируются из httpd.py при обращении."""
+    if name in ('WebhookHandler', 'WebhookServer'):
+        import httpd
+
+        return getattr(httpd, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,359 @@
+"""
+Очередь исходящих сообщений Telegram.
+
+Сообщения для одного чата, накопившиеся в очереди, склеиваются в одно.
+Частота отправки ограничивается двумя token bucket: общим для бота
+и отдельным для каждого чата (лимиты Bot API). При 429 очередь ждет
+retry_after, при сетевых ошибках и 5xx повторяет отправку с растущей
+задержкой, не блокируя остальные чаты.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import groupby
+from operator import itemgetter
+
+import metrics
+
+GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))
+CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', 1))
+MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', 8))
+RETRY_BACKOFF = 1.0
+MAX_RETRY_BACKOFF = 300
+MAX_MESSAGE_LENGTH = 4096
+SEPARATOR = '\n\n'
+
+logger = logging.getLogger('homework.delivery')
+
+
+def is_transient(error):
+    """Ошибка сети или 5xx, которую имеет смысл повторить."""
+    # telegram импортируется при первой отправке, а не при запуске.
+    from telegram.error import (BadRequest, ChatMigrated, NetworkError,
+                                Unauthorized)
+
+    # BadRequest в python-telegram-bot наследует NetworkError, но повтор
+    # отправки ему не поможет.
+    return (isinstance(error, NetworkError) and not isinstance(
+        error, (BadRequest, ChatMigrated, Unauthorized)
+    ))
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        """Конструктор класса."""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        """Начисляет токены за прошедшее время."""
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Сколько секунд ждать до появления токена."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        """Забирает токен, если он есть."""
+        if self.wait_time(now):
+            return False
+        self.tokens -= 1
+        return True
+
+    def is_full(self, now):
+        """Bucket полон - его можно забыть."""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class ChatQueue:
+    """Сообщения одного чата, ожидающие отправки.
+
+    messages - пары (разметка, текст) в порядке постановки.
+    """
+
+    __slots__ = ('messages', 'count', 'enqueued_at', 'attempts',
+                 'not_before')
+
+    def __init__(self, now):
+        """Конструктор класса."""
+        self.messages = []
+        self.count = 0
+        self.enqueued_at = now
+        self.attempts = 0
+        self.not_before = now
+
+
+def coalesce(messages, limit=MAX_MESSAGE_LENGTH):
+    """Склеивает сообщения в тексты не длиннее limit символов."""
+    texts = []
+    current = ''
+    for message in messages:
+        for start in range(0, max(len(message), 1), limit):
+            chunk = message[start:start + limit]
+            if current and len(current) + len(SEPARATOR) + len(chunk) > limit:
+                texts.append(current)
+                current = ''
+            current = f'{current}{SEPARATOR}{chunk}' if current else chunk
+    if current:
+        texts.append(current)
+    return texts
+
+
+def coalesce_by_mode(messages, limit=MAX_MESSAGE_LENGTH):
+    """Склеивает подряд идущие сообщения с одной разметкой.
+
+    messages - пары (parse_mode, текст); возвращает такие же пары.
+    Сообщения с разной разметкой не склеиваются, порядок сохраняется.
+    """
+    return [(parse_mode, text)
+            for parse_mode, run in groupby(messages, key=itemgetter(0))
+            for text in coalesce([message for _, message in run], limit)]
+
+
+class DeliveryQueue:
+    """Очередь отправки с объединением, ограничением частоты и повторами."""
+
+    def __init__(self, bot, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE,
+                 max_retries=MAX_RETRIES, clock=time.monotonic):
+        """Конструктор класса."""
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.max_retries = max_retries
+        self.clock = clock
+        self.global_bucket = TokenBucket(global_rate, global_rate, clock())
+        self.chat_buckets = {}
+        self.pending = OrderedDict()
+        self.depth = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._paused_until = 0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def put(self, chat_id, message, parse_mode=None):
+        """Ставит сообщение в очередь чата.
+
+        Склеиваются только подряд идущие сообщения чата с одной
+        разметкой (parse_mode).
+        """
+        with self._condition:
+            chat = self.pending.get(chat_id)
+            if chat is None:
+                chat = self.pending[chat_id] = ChatQueue(self.clock())
+            chat.messages.append((parse_mode, message))
+            chat.count += 1
+            self.depth += 1
+            self._condition.notify()
+
+    def _chat_bucket(self, chat_id, now):
+        """Bucket чата (создается при первой отправке)."""
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(
+                self.chat_rate, 1, now
+            )
+        return bucket
+
+    def _pick(self, now):
+        """Выбирает готовый к отправке чат или время ожидания."""
+        wait = max(self._paused_until - now,
+                   self.global_bucket.wait_time(now))
+        if wait > 0:
+            return None, wait
+        wait = None
+        for chat_id, chat in self.pending.items():
+            chat_wait = max(chat.not_before - now,
+                            self._chat_bucket(chat_id, now).wait_time(now))
+            if chat_wait <= 0:
+                return chat_id, 0
+            wait = chat_wait if wait is None else min(wait, chat_wait)
+        return None, wait
+
+    def step(self):
+        """Отправляет сообщения одного чата, если лимиты позволяют.
+
+        Возвращает время ожидания до следующей попытки или None,
+        если очередь пуста.
+        """
+        with self._condition:
+            now = self.clock()
+            chat_id, wait = self._pick(now)
+            if wait != 0:
+                return wait
+            chat = self.pending.pop(chat_id)
+            self._in_flight += 1
+            self.global_bucket.take(now)
+            self._chat_bucket(chat_id, now).take(now)
+        self._send(chat_id, chat)
+        self._forget_idle_buckets()
+        return 0
+
+    def _send(self, chat_id, chat):
+        """Отправляет склеенные сообщения чата и обрабатывает ошибки.
+
+        Ошибки вне telegram.error (например, сетевые ошибки requests)
+        повторяются, как временные: поток отправки не должен умирать,
+        иначе join() и stop() ждали бы вечно.
+        """
+        from telegram.error import RetryAfter, TelegramError
+
+        texts = coalesce_by_mode(chat.messages)
+        try:
+            for number, (parse_mode, text) in enumerate(texts):
+                self._send_text(chat_id, text, parse_mode)
+                chat.messages = texts[number + 1:]
+        except RetryAfter as error:
+            metrics.count_error(error)
+            logger.warning('Превышен лимит Telegram, пауза %s с',
+                           error.retry_after)
+            self._paused_until = self.clock() + error.retry_after
+            self._requeue(chat_id, chat, count_attempt=False)
+        except TelegramError as error:
+            metrics.count_error(error)
+            if is_transient(error):
+                self._retry(chat_id, chat, error)
+            else:
+                logger.error('Сообщение для чата %s отброшено: %s',
+                             chat_id, error)
+                self._finish(chat, dropped=True)
+        except Exception as error:
+            metrics.count_error(error)
+            logger.exception('Непредвиденная ошибка отправки в чат %s',
+                             chat_id)
+            self._retry(chat_id, chat, error)
+        else:
+            logger.info('Сообщения отправлены в чат %s: %s',
+                        chat_id, chat.count)
+            self._finish(chat)
+
+    def _send_text(self, chat_id, text, parse_mode=None):
+        """Отправляет один текст, замеряя время отправки."""
+        started = time.perf_counter()
+        try:
+            self.bot.send_message(chat_id, text, parse_mode=parse_mode)
+        finally:
+            metrics.SEND_LATENCY.observe(time.perf_counter() - started)
+
+    def _retry(self, chat_id, chat, error):
+        """Повторяет отправку с растущей задержкой."""
+        self.failed += 1
+        if chat.attempts >= self.max_retries:
+            logger.error('Сообщение для чата %s отброшено после %s '
+                         'попыток: %s', chat_id, chat.attempts + 1, error)
+            self._finish(chat, dropped=True)
+            return
+        delay = min(MAX_RETRY_BACKOFF, RETRY_BACKOFF * 2 ** chat.attempts)
+        logger.warning('Сбой отправки в чат %s: %s. Повтор через %s с',
+                       chat_id, error, delay)
+        chat.not_before = self.clock() + delay
+        self._requeue(chat_id, chat)
+
+    def _requeue(self, chat_id, chat, count_attempt=True):
+        """Возвращает неотправленные сообщения в начало очереди."""
+        if count_attempt:
+            chat.attempts += 1
+        with self._condition:
+            newer = self.pending.pop(chat_id, None)
+            if newer is not None:
+                chat.messages.extend(newer.messages)
+                chat.count += newer.count
+            self.pending[chat_id] = chat
+            self.pending.move_to_end(chat_id, last=False)
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _finish(self, chat, dropped=False):
+        """Учитывает завершение отправки."""
+        latency = self.clock() - chat.enqueued_at
+        with self._condition:
+            self.depth -= chat.count
+            self._in_flight -= 1
+            if dropped:
+                self.dropped += 1
+            else:
+                self.sent += 1
+                self.last_latency = latency
+                self.max_latency = max(self.max_latency, latency)
+            self._condition.notify_all()
+
+    def _forget_idle_buckets(self):
+        """Удаляет полные bucket чатов без ожидающих сообщений."""
+        if len(self.chat_buckets) < 1024:
+            return
+        now = self.clock()
+        with self._condition:
+            for chat_id in list(self.chat_buckets):
+                if (chat_id not in self.pending
+                        and self.chat_buckets[chat_id].is_full(now)):
+                    del self.chat_buckets[chat_id]
+
+    def stats(self):
+        """Глубина очереди и задержка отправки."""
+        return {
+            'depth': self.depth,
+            'chats': len(self.pending),
+            'sent': self.sent,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'last_latency': round(self.last_latency, 3),
+            'max_latency': round(self.max_latency, 3),
+        }
+
+    def run(self):
+        """Цикл отправки в фоновом потоке."""
+        while True:
+            wait = self.step()
+            if wait == 0:
+                continue
+            with self._condition:
+                if self._stopped and not self.pending:
+                    return
+                self._condition.wait(wait)
+
+    def start(self):
+        """Запускает фоновый поток отправки."""
+        self._thread = threading.Thread(target=self.run, daemon=True,
+                                        name='delivery')
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        """Ждет, пока очередь опустеет."""
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._condition:
+            while self.pending or self._in_flight:
+                remaining = (None if deadline is None
+                             else deadline - self.clock())
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stop(self, timeout=None):
+        """Отправляет оставшиеся сообщения и останавливает поток."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.pending
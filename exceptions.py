@@ -2,24 +2,34 @@
 Модуль с кастомнымим ошибками для Телеграм-бота.
 
 Вывод для всех ошибок, включая стандартные: Имя класса --> Сообщение.
-"""
 
-from telegram import TelegramError
+TelegramError создается при первом обращении: импорт telegram
+занимает заметную часть запуска бота.
+"""
 
 # Переопределяем вывод стандартных ошибок
 
 
-class TelegramError(TelegramError):
-    """Переопределяем __str__ метод TelegramError."""
+def __getattr__(name):
+    """Создает TelegramError при первом обращении к нему."""
+    if name != 'TelegramError':
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    from telegram import TelegramError as BaseTelegramError
 
-    def __init__(self, message):
-        """Конструктор класса."""
-        self.message = message
-        super().__init__(self.message)
+    class TelegramError(BaseTelegramError):
+        """Переопределяем __str__ метод TelegramError."""
 
-    def __str__(self):
-        """Форматируем вывод сообщения об ошибке."""
-        return f'{type(self).__name__} --> {self.message}'
+        def __init__(self, message):
+            """Конструктор класса."""
+            self.message = message
+            super().__init__(self.message)
+
+        def __str__(self):
+            """Форматируем вывод сообщения об ошибке."""
+            return f'{type(self).__name__} --> {self.message}'
+
+    # Если класс одновременно создали два потока, оба получат первый.
+    return globals().setdefault(name, TelegramError)
 
 
 class SystemExit(SystemExit):
@@ -113,3 +123,16 @@ class UnknownStatusError(Exception):
     def __str__(self):
         """Форматируем вывод сообщения об ошибке."""
         return f'{type(self).__name__} --> {self.message}'
+
+
+class CircuitOpenError(Exception):
+    """Ошибка: Запросы к эндпоинту приостановлены выключателем."""
+
+    def __init__(self, message):
+        """Конструктор класса."""
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        """Форматируем вывод сообщения об ошибке."""
+        return f'{type(self).__name__} --> {self.message}'
@@ -0,0 +1,512 @@
+"""
+История статусов домашних работ в колоночном хранилище.
+
+Каждое изменение статуса, замеченное parse_status, дописывается
+строкой (работа, статус, date_updated, observed_at, когорта, студент).
+Когорта - lesson_name работы: у API нет других признаков группы, а проект
+(спринт) объединяет работы одного потока. Студент - хэш токена
+(subscriptions.token_digest): работы разных студентов с одним именем
+не смешиваются. Подписки с одним токеном замечают одно и то же
+изменение; строка, повторяющая последний статус и date_updated работы
+студента, не пишется.
+
+Строки пишутся в сегменты по HISTORY_SEGMENT_ROWS строк в каталоге
+HISTORY_DIR. Сегмент - файл фиксированного размера с заголовком
+и колонками (observed_at, date_updated, работа, когорта, статус,
+студент), который открывается через mmap. Коды и даты, которые
+не помещаются в тип колонки, отклоняются с ValueError до записи
+строки. Строки в сегменте идут по observed_at
+(время наблюдения не убывает), а в заголовке хранятся первое
+и последнее observed_at, поэтому выборка по времени пропускает
+сегменты целиком и находит границы бинарным поиском. Заполненный
+сегмент запечатывается: рядом пишется индекс по работам - номера
+строк, отсортированные по коду работы. Строки работ и когорт хранятся
+кодами, словарь дописывается в strings.jsonl.
+
+Запросы читают только нужные колонки нужных сегментов; в памяти
+остаются словарь строк и заголовки сегментов.
+"""
+
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from contextlib import contextmanager
+
+import state
+
+HISTORY_DIR = os.getenv('HISTORY_DIR')
+SEGMENT_ROWS = int(os.getenv('HISTORY_SEGMENT_ROWS', 65536))
+REVIEW_START = 'reviewing'
+REVIEW_END = ('approved', 'rejected')
+
+MAGIC = b'HWHIST02'
+HEADER = struct.Struct('<8sIIII')
+# Колонка: (имя, тип array).
+COLUMNS = (('observed', 'I'), ('date', 'I'), ('homework', 'I'),
+           ('cohort', 'H'), ('status', 'B'), ('user', 'I'))
+KINDS = ('homework', 'cohort', 'status', 'user')
+# Наибольшее значение, которое помещается в колонку.
+LIMITS = {name: (1 << 8 * array(typecode).itemsize) - 1
+          for name, typecode in COLUMNS}
+
+Row = namedtuple('Row', ('homework', 'status', 'date_updated',
+                         'observed_at', 'cohort', 'user'))
+
+
+def column_offsets(capacity):
+    """Смещения колонок в файле сегмента и его размер."""
+    offsets = {}
+    offset = HEADER.size
+    for name, typecode in COLUMNS:
+        offset = state.align(offset)
+        offsets[name] = offset
+        offset += capacity * array(typecode).itemsize
+    return offsets, offset
+
+
+class Segment:
+    """Сегмент истории: заголовок и колонки фиксированной емкости."""
+
+    def __init__(self, path, capacity, rows=0, first=0, last=0):
+        """Конструктор класса."""
+        self.path = path
+        self.capacity = capacity
+        self.rows = rows
+        self.first = first
+        self.last = last
+
+    @property
+    def index_path(self):
+        """Файл индекса по работам запечатанного сегмента."""
+        return f'{self.path}.idx'
+
+    @property
+    def sealed(self):
+        """Сегмент заполнен."""
+        return self.rows >= self.capacity
+
+    @classmethod
+    def create(cls, path, capacity):
+        """Создает пустой сегмент."""
+        _, size = column_offsets(capacity)
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, capacity, 0, 0, 0))
+            file.truncate(size)
+        return cls(path, capacity)
+
+    @classmethod
+    def open(cls, path):
+        """Читает заголовок сегмента (колонки не читаются)."""
+        with open(path, 'rb') as file:
+            magic, capacity, rows, first, last = HEADER.unpack(
+                file.read(HEADER.size)
+            )
+        if magic != MAGIC:
+            raise ValueError(f'{path} не является сегментом истории')
+        return cls(path, capacity, rows, first, last)
+
+    def map(self, writable=False):
+        """Отображает сегмент в память (SegmentMap)."""
+        return SegmentMap(self, writable)
+
+    def time_range(self, columns, start, end):
+        """Номера строк [from, to) с observed_at в [start, end)."""
+        observed = columns['observed'][:self.rows]
+        low = 0 if start is None else bisect_left(observed, start)
+        high = self.rows if end is None else bisect_left(observed, end)
+        return low, high
+
+    def write_index(self, homeworks):
+        """Записывает индекс по работам: коды и номера строк."""
+        order = sorted(range(self.rows), key=homeworks.__getitem__)
+        codes = array('I', (homeworks[row] for row in order))
+        rows = array('I', order)
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            codes.tofile(file)
+            rows.tofile(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def homework_rows(self, code, active_index=None):
+        """Номера строк работы с кодом code (по возрастанию)."""
+        if active_index is not None:
+            return active_index.get(code, ())
+        if not os.path.exists(self.index_path):
+            with self.map() as mapped:
+                self.write_index(mapped.columns['homework'])
+        with open(self.index_path, 'rb') as file:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            view = memoryview(mm)
+            codes = view[:self.rows * 4].cast('I')
+            rows = view[self.rows * 4:self.rows * 8].cast('I')
+            low = bisect_left(codes, code)
+            high = bisect_right(codes, code, low)
+            result = rows[low:high].tolist()
+            codes.release()
+            rows.release()
+            view.release()
+        finally:
+            mm.close()
+        return result
+
+
+class SegmentMap:
+    """Сегмент, отображенный через mmap: заголовок и колонки."""
+
+    def __init__(self, segment, writable=False):
+        """Конструктор класса."""
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        with open(segment.path, 'r+b' if writable else 'rb') as file:
+            self.mm = mmap.mmap(file.fileno(), 0, access=access)
+        self._view = memoryview(self.mm)
+        self.header = self._view[:HEADER.size]
+        offsets, _ = column_offsets(segment.capacity)
+        self.columns = {}
+        for name, typecode in COLUMNS:
+            start = offsets[name]
+            end = start + segment.capacity * array(typecode).itemsize
+            self.columns[name] = self._view[start:end].cast(typecode)
+
+    def close(self):
+        """Освобождает mmap."""
+        for column in self.columns.values():
+            column.release()
+        self.header.release()
+        self._view.release()
+        self.mm.close()
+
+    def __enter__(self):
+        """Вход в контекст."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Выход из контекста: mmap освобождается."""
+        self.close()
+
+
+class HistoryStore:
+    """Колоночное хранилище истории статусов в каталоге path."""
+
+    def __init__(self, path, segment_rows=SEGMENT_ROWS,
+                 fsync_every=state.FSYNC_EVERY,
+                 fsync_interval=state.FSYNC_INTERVAL):
+        """Конструктор класса."""
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.segment_rows = segment_rows
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.strings = {kind: [] for kind in KINDS}
+        self._codes = {kind: {} for kind in KINDS}
+        self._load_strings()
+        self._strings_file = open(self.strings_path, 'a', encoding='utf-8')
+        self.segments = [Segment.open(os.path.join(path, name))
+                         for name in sorted(os.listdir(path))
+                         if name.endswith('.col')]
+        self._active = None
+        self._map = None
+        self._active_index = {}
+        # Последние (статус, date_updated) по (студент, работа).
+        self._last = {}
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+        self._last_observed = max((segment.last for segment in self.segments),
+                                  default=0)
+        if self.segments and not self.segments[-1].sealed:
+            self._open_active(self.segments[-1])
+
+    @property
+    def strings_path(self):
+        """Файл словаря строк."""
+        return os.path.join(self.path, 'strings.jsonl')
+
+    def _load_strings(self):
+        """Читает словарь; оборванная последняя строка отбрасывается."""
+        if not os.path.exists(self.strings_path):
+            return
+        with open(self.strings_path, 'rb') as file:
+            data = file.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            kind, value = json.loads(line)
+            self._codes[kind][value] = len(self.strings[kind])
+            self.strings[kind].append(value)
+        if end != len(data):
+            with open(self.strings_path, 'r+b') as file:
+                file.truncate(end)
+
+    def _code(self, kind, value):
+        """Код строки; новая строка дописывается в словарь."""
+        code = self._codes[kind].get(value)
+        if code is None:
+            code = len(self.strings[kind])
+            if code > LIMITS[kind]:
+                raise ValueError(f'В истории не больше {LIMITS[kind] + 1} '
+                                 f'различных значений "{kind}"')
+            self._codes[kind][value] = code
+            self.strings[kind].append(value)
+            self._strings_file.write(
+                json.dumps([kind, value], ensure_ascii=False) + '\n'
+            )
+            self._strings_file.flush()
+        return code
+
+    def _open_active(self, segment):
+        """Открывает сегмент для записи и строит его индекс по работам."""
+        self._active = segment
+        self._map = segment.map(writable=True)
+        self._active_index = {}
+        columns = self._map.columns
+        rows = zip(columns['homework'][:segment.rows],
+                   columns['user'][:segment.rows],
+                   columns['status'][:segment.rows],
+                   columns['date'][:segment.rows])
+        for row, (code, user, status, date) in enumerate(rows):
+            self._active_index.setdefault(code, array('I')).append(row)
+            self._last[user, code] = (status, date)
+
+    def _close_active(self):
+        """Закрывает сегмент, открытый для записи."""
+        if self._active is not None:
+            self._map.close()
+            self._map = None
+            self._active = None
+            self._active_index = {}
+
+    def _write_header(self):
+        """Записывает число строк и границы observed_at сегмента."""
+        segment = self._active
+        HEADER.pack_into(self._map.header, 0, MAGIC, segment.capacity,
+                         segment.rows, segment.first, segment.last)
+
+    def _new_segment(self):
+        """Начинает новый сегмент."""
+        name = f'segment-{len(self.segments) + 1:06d}.col'
+        segment = Segment.create(os.path.join(self.path, name),
+                                 self.segment_rows)
+        self.segments.append(segment)
+        self._open_active(segment)
+
+    def append(self, homework, status, date_updated=None, observed_at=None,
+               cohort='', user=''):
+        """Дописывает изменение статуса работы студента user.
+
+        date_updated и observed_at - timestamp в секундах; observed_at
+        по умолчанию - текущее время. Время наблюдения не убывает:
+        если часы ушли назад, берется последнее записанное. Повтор
+        последнего статуса и date_updated работы студента не пишется.
+        Возвращает True, если строка записана.
+        """
+        observed = int(time.time() if observed_at is None else observed_at)
+        observed = max(observed, self._last_observed)
+        date = max(int(date_updated or 0), 0)
+        for name, value in (('observed', observed), ('date', date)):
+            if value > LIMITS[name]:
+                raise ValueError(f'Время {value} не помещается в колонку '
+                                 f'"{name}" истории')
+        codes = {'homework': self._code('homework', homework),
+                 'cohort': self._code('cohort', cohort or ''),
+                 'status': self._code('status', status),
+                 'user': self._code('user', user or '')}
+        key = (codes['user'], codes['homework'])
+        if self._last.get(key) == (codes['status'], date):
+            return False
+        self._last[key] = (codes['status'], date)
+        if self._active is None:
+            self._new_segment()
+        segment = self._active
+        self._last_observed = observed
+        row = segment.rows
+        columns = self._map.columns
+        columns['observed'][row] = observed
+        columns['date'][row] = date
+        for name, code in codes.items():
+            columns[name][row] = code
+        self._active_index.setdefault(codes['homework'],
+                                      array('I')).append(row)
+        if not row:
+            segment.first = observed
+        segment.last = observed
+        segment.rows += 1
+        self._write_header()
+        self._pending += 1
+        if segment.sealed:
+            self._seal()
+        elif (self._pending >= self.fsync_every
+                or time.monotonic() - self._last_fsync >= self.fsync_interval):
+            self.flush()
+        return True
+
+    def _seal(self):
+        """Запечатывает заполненный сегмент: пишет индекс по работам."""
+        self.flush()
+        self._active.write_index(self._map.columns['homework'])
+        self._close_active()
+
+    def __len__(self):
+        """Количество строк."""
+        return sum(segment.rows for segment in self.segments)
+
+    def _segments(self, start, end):
+        """Сегменты, в которых могут быть строки из [start, end)."""
+        for segment in self.segments:
+            if not segment.rows:
+                continue
+            if start is not None and segment.last < start:
+                continue
+            if end is not None and segment.first >= end:
+                break
+            yield segment
+
+    @contextmanager
+    def _read(self, segment):
+        """Колонки сегмента для чтения."""
+        if segment is self._active:
+            yield self._map.columns
+        else:
+            with segment.map() as mapped:
+                yield mapped.columns
+
+    def scan(self, start=None, end=None, homework=None, user=None):
+        """Строки с observed_at в [start, end) по времени наблюдения.
+
+        homework - только строки этой работы (по индексу работ),
+        user - только строки этого студента.
+        """
+        code = None
+        if homework is not None:
+            code = self._codes['homework'].get(homework)
+            if code is None:
+                return
+        if user is not None and user not in self._codes['user']:
+            return
+        for segment in self._segments(start, end):
+            with self._read(segment) as columns:
+                low, high = segment.time_range(columns, start, end)
+                if code is None:
+                    rows = range(low, high)
+                else:
+                    active = (self._active_index
+                              if segment is self._active else None)
+                    rows = [row for row in segment.homework_rows(code, active)
+                            if low <= row < high]
+                if user is not None:
+                    wanted = self._codes['user'][user]
+                    rows = [row for row in rows
+                            if columns['user'][row] == wanted]
+                yield from self._rows(columns, rows)
+
+    def _rows(self, columns, rows):
+        """Строки сегмента по номерам."""
+        homeworks = self.strings['homework']
+        statuses = self.strings['status']
+        cohorts = self.strings['cohort']
+        users = self.strings['user']
+        for row in rows:
+            yield Row(homeworks[columns['homework'][row]],
+                      statuses[columns['status'][row]],
+                      columns['date'][row] or None,
+                      columns['observed'][row],
+                      cohorts[columns['cohort'][row]],
+                      users[columns['user'][row]])
+
+    def review_times(self, start=None, end=None):
+        """Среднее время проверки по когортам: {когорта: (число, сек)}.
+
+        Проверка - от статуса reviewing до следующего approved или
+        rejected той же работы, по date_updated (observed_at, если
+        дата неизвестна); учитываются проверки, завершенные
+        в [start, end). Колонки читаются потоком, в памяти - только
+        начатые проверки и суммы по когортам.
+        """
+        statuses = self._codes['status']
+        started_code = statuses.get(REVIEW_START)
+        ended_codes = {statuses[name] for name in REVIEW_END
+                       if name in statuses}
+        started = {}
+        totals = {}
+        for segment in self._segments(None, end):
+            with self._read(segment) as columns:
+                low, high = segment.time_range(columns, None, end)
+                boundary = (low if start is None
+                            else segment.time_range(columns, start, None)[0])
+                count_reviews(columns, low, boundary, high, started_code,
+                              ended_codes, started, totals)
+        names = self.strings['cohort']
+        return {names[code]: (count, seconds / count)
+                for code, (count, seconds) in totals.items()}
+
+    def flush(self):
+        """Сбрасывает колонки и словарь на диск."""
+        if self._pending and self._active is not None:
+            os.fsync(self._strings_file.fileno())
+            self._map.mm.flush()
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+
+    def close(self):
+        """Сбрасывает изменения и закрывает файлы."""
+        self.flush()
+        self._close_active()
+        self._strings_file.close()
+
+
+def count_reviews(columns, low, boundary, high, started_code, ended_codes,
+                  started, totals):
+    """Проходит строки [low, high) сегмента для review_times.
+
+    started - начала проверок по (студент, работа), totals - число
+    и сумма проверок по коду когорты; проверки, завершенные до
+    строки boundary, не учитываются.
+    """
+    rows = zip(range(low, high), columns['status'][low:high],
+               columns['date'][low:high], columns['observed'][low:high],
+               zip(columns['user'][low:high], columns['homework'][low:high]),
+               columns['cohort'][low:high])
+    for row, status, date, observed, work, cohort in rows:
+        if status == started_code:
+            started.setdefault(work, date or observed)
+        elif status in ended_codes:
+            began = started.pop(work, None)
+            if began is not None and row >= boundary:
+                total = totals.setdefault(cohort, [0, 0])
+                total[0] += 1
+                total[1] += (date or observed) - began
+        else:
+            started.pop(work, None)
+
+
+class HistoryBuffer(list):
+    """Строки истории в памяти процесса-воркера (workers.py).
+
+    Координатор дописывает их в свое хранилище: сегменты пишет
+    только один процесс.
+    """
+
+    def append(self, homework, status, date_updated=None, observed_at=None,
+               cohort='', user=''):
+        """Запоминает строку."""
+        observed = int(time.time() if observed_at is None else observed_at)
+        super().append((homework, status, date_updated, observed, cohort,
+                        user))
+
+    def drain(self):
+        """Возвращает накопленные строки и очищает буфер."""
+        rows = self[:]
+        self.clear()
+        return rows
+
+
+def open_history(path=HISTORY_DIR):
+    """Открывает хранилище истории, если задан каталог."""
+    if path:
+        return HistoryStore(path)
+    return None
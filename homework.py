@@ -4,63 +4,177 @@
 Передает в чат информацию о статусе домашней работы ЯндексПрактикум.
 """
 
-import os
 import sys
 import time
 import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
 from json import decoder
 from http import HTTPStatus
+from operator import itemgetter
 
-import requests
-from telegram import Bot
-from dotenv import load_dotenv
-
+import alerts
+import breaker
+import commands
 import exceptions as ex
+import history
+import httpcache
+import lifecycle
+import logs
+import metrics
+import recording
+import settings
+import singleflight
+import state
+import templates
+import transport
+from delivery import DeliveryQueue
 
-load_dotenv()
-
-
-PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
-TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
-TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
-RETRY_TIME = 600
-ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
-HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
-HOMEWORK_STATUSES = {
-    'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
-    'reviewing': 'Работа взята на проверку ревьюером.',
-    'rejected': 'Работа проверена: у ревьюера есть замечания.'
-}
-homework_status_cache = {}
+SETTINGS = settings.load()
+PRACTICUM_TOKEN = SETTINGS.practicum_token
+TELEGRAM_TOKEN = SETTINGS.telegram_token
+TELEGRAM_CHAT_ID = SETTINGS.telegram_chat_id
+RETRY_TIME = SETTINGS.retry_time
+ENDPOINT = SETTINGS.endpoint
+HEADERS = SETTINGS.headers
+HOMEWORK_STATUSES = templates.verdicts('ru')
+homework_status_cache = state.ChangeIndex().view('')
+api_flights = singleflight.Group()
+status_board = state.StatusBoard()
+status_history = None
+api_recorder = None
+# Версия последнего разобранного ответа из кэша (httpcache.py).
+seen_version = None
+EPOCH = datetime(1970, 1, 1)
+SECOND = timedelta(seconds=1)
+CURSOR_KEY = 'main'
+# Ошибки опроса: недоступность эндпоинта (ex.SystemExit) не наследует
+# Exception, но не должна останавливать бота.
+POLL_ERRORS = (Exception, ex.SystemExit)
+# Работ в части ответа, которую parse_statuses сверяет по отпечатку.
+BATCH_CHUNK = 16
 
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-logger.setLevel(logging.DEBUG)
-handler = logging.StreamHandler(stream=sys.stdout)
-formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+logger = logs.setup(logging.getLogger('homework'))
 
 
 def send_message(bot, message):
     """Отправляет сообщение в Telegram."""
+    send_message_to(bot, TELEGRAM_CHAT_ID, message)
+
+
+def send_message_to(bot, chat_id, message, parse_mode=None):
+    """Отправляет сообщение в указанный чат Telegram.
+
+    parse_mode: разметка сообщения (templates.Style.parse_mode).
+    """
+    started = time.perf_counter()
     try:
-        bot.send_message(TELEGRAM_CHAT_ID, message)
-        logger.info(f'Сообщение отправлено: {message}')
+        bot.send_message(chat_id, message, parse_mode=parse_mode)
+        logger.info('Сообщение отправлено: %s', message)
     except ex.TelegramError as error:
-        logger.error(f'Сбой при отправке сообщения: {error}')
+        metrics.count_error(error)
+        logger.error('Сбой при отправке сообщения: %s', error)
     except ex.SendMessageError as error:
-        logger.error(f'Сбой при отправке сообщения: {error}')
+        metrics.count_error(error)
+        logger.error('Сбой при отправке сообщения: %s', error)
+    metrics.SEND_LATENCY.observe(time.perf_counter() - started)
 
 
 def get_api_answer(current_timestamp):
     """Делает запрос к API ЯндексПрактикум."""
-    timestamp = current_timestamp or int(time.time())
-    params = {'from_date': timestamp}
+    return request_api(HEADERS, current_timestamp)
+
+
+def get_api_answer_for(token, current_timestamp):
+    """Делает запрос к API ЯндексПрактикум с указанным токеном.
+
+    Одновременные запросы с одним токеном объединяются
+    (singleflight.py): ответ разбирается один раз для всех подписок.
+    """
+    return api_flights.do(token, current_timestamp, lambda from_date:
+                          request_api(auth_headers(token), from_date))
+
+
+def auth_headers(token):
+    """Возвращает заголовки авторизации для токена."""
+    return {'Authorization': f'OAuth {token}'}
+
+
+def request_api(headers, current_timestamp):
+    """Запрашивает статусы домашних работ с переданными заголовками.
+
+    Если при включенном кэше API ответил 304, возвращает сохраненное
+    тело (httpcache.CachedBody). Если сохраненный ответ уже вытеснен
+    или устарел, запрос один раз повторяется без условных заголовков.
+    Пока выключатель эндпоинта разомкнут (breaker.py), запрос
+    не выполняется: выбрасывается ex.CircuitOpenError.
+    """
+    circuit = breaker.for_endpoint(ENDPOINT)
+    circuit.before_request()
+    params = api_params(current_timestamp)
+    key = httpcache.cache_key(headers, params)
+    response = send_request(
+        circuit, headers, params, httpcache.conditional_headers(key, headers)
+    )
+    data = parse_cached_response(key, response)
+    if data is None:
+        logger.debug('Сохраненного ответа на 304 уже нет, '
+                     'повторяем запрос без условных заголовков')
+        response = send_request(circuit, headers, params, headers)
+        data = httpcache.store(key, response, parse_api_response(response))
+    return data
+
+
+def send_request(circuit, headers, params, request_headers):
+    """Отправляет один запрос к API и учитывает его в метриках."""
+    import requests
+
+    started = time.perf_counter()
+    ok = False
     try:
-        response = requests.get(ENDPOINT, headers=HEADERS, params=params)
+        response = transport.http_get(
+            ENDPOINT, headers=request_headers, params=params
+        )
+        ok = breaker.healthy(response.status_code)
     except requests.exceptions.RequestException as error:
+        record_exchange(headers, None, started)
         raise ex.SystemExit(f'Эндпоинт не доступен: {error}')
+    finally:
+        metrics.API_LATENCY.observe(time.perf_counter() - started)
+        circuit.record(ok)
+    record_exchange(headers, response, started)
+    return response
+
+
+def record_exchange(headers, response, started, body=None):
+    """Записывает ответ API, если включена запись (recording.py)."""
+    if api_recorder is not None:
+        api_recorder.record(headers, response,
+                            time.perf_counter() - started, body)
+
+
+def parse_cached_response(key, response):
+    """Разбирает ответ API с учетом кэша условных запросов.
+
+    None - API ответил 304, а сохраненного ответа уже нет (вытеснен
+    или устарел после того, как по нему собрали условные заголовки).
+    """
+    data = httpcache.cached_body(key, response)
+    if data is not None:
+        logger.debug('Ответ API не изменился')
+        return data
+    if response.status_code == HTTPStatus.NOT_MODIFIED:
+        return None
+    return httpcache.store(key, response, parse_api_response(response))
+
+
+def api_params(current_timestamp):
+    """Возвращает параметры запроса к API."""
+    return {'from_date': current_timestamp or int(time.time())}
+
+
+def parse_api_response(response):
+    """Проверяет код ответа API и преобразует тело в JSON."""
     if response.status_code != HTTPStatus.OK:
         raise ex.EndpointAccessError(f'Проблема с доступом к {ENDPOINT}. '
                                      f'Код ответа: {response.status_code}')
@@ -68,8 +182,9 @@ def get_api_answer(current_timestamp):
         return response.json()
     except decoder.JSONDecodeError as error:
         raise decoder.JSONDecodeError(
-            f'Ответ API не преобразуется в JSON: {error}'
-        )
+            f'Ответ API не преобразуется в JSON: {error.msg}', error.doc,
+            error.pos
+        ) from error
 
 
 def check_response(response):
@@ -88,22 +203,198 @@ def check_response(response):
 
 def parse_status(homework):
     """Получает статус домашней работы."""
-    global homework_status_cache
+    return parse_status_for(homework, homework_status_cache)
+
+
+def parse_status_for(homework, status_cache, style=templates.DEFAULT_STYLE):
+    """Получает статус домашней работы, сверяясь с переданным кэшем."""
+    return parse_homework(homework, status_cache, style)[0]
+
+
+def parse_homework(homework, status_cache, style=templates.DEFAULT_STYLE,
+                   user=''):
+    """Сверяет работу с кэшем статусов.
+
+    Возвращает сообщение об изменении (или None) в стиле чата style
+    и date_updated работы. user - студент (хэш токена) для истории.
+    Работы различаются по id (по имени, если id в ответе нет). Если
+    статус и date_updated совпадают с индексом (state.ChangeIndex),
+    остальные поля работы не проверяются.
+    """
+    key = homework.get('id')
+    homework_status = homework.get('status')
+    date = homework_date(homework)
+    if key is not None and status_cache.unchanged(key, homework_status,
+                                                  date):
+        logger.debug('Работа %s не изменилась', key)
+        return None, date
     homework_name = homework.get('homework_name')
     if homework_name is None:
         raise ex.KeyError('Ответ API не содержит ключа "homework_name"')
-    homework_status = homework.get('status')
     if homework_status is None:
         raise ex.KeyError('Ответ API не содержит ключа "homework_status"')
-    verdict = HOMEWORK_STATUSES.get(homework_status)
-    if verdict is None:
+    if homework_status not in HOMEWORK_STATUSES:
         raise ex.UnknownStatusError(f'Неизвестный статус "{homework_status}" '
                                     f'у работы "{homework_name}"')
-    if homework_status != homework_status_cache.get(homework_name):
-        homework_status_cache[homework_name] = homework_status
-        return (f'Изменился статус проверки работы "{homework_name}". '
-                f'{verdict}')
-    logger.debug(f'Статус работы "{homework_name}" не изменился')
+    if key is None:
+        key = homework_name
+    previous = previous_status(status_cache, key, homework_name)
+    status_cache.record(key, homework_status, date, previous)
+    if homework_status != previous:
+        record_history(homework, homework_status, date, user)
+        comment = (homework.get('reviewer_comment') or ''
+                   if style.comments else '')
+        return templates.render_change(style, homework_name,
+                                       homework_status, comment), date
+    logger.debug('Статус работы "%s" не изменился', homework_name)
+    return None, date
+
+
+class StatusBatch(namedtuple('StatusBatch',
+                             'changes unchanged errors latest')):
+    """Результат parse_statuses.
+
+    changes - пары (работа, сообщение) для работ со сменой статуса,
+    unchanged - остальные разобранные работы, errors - пары (работа,
+    ошибка), latest - самая поздняя date_updated разобранных работ
+    (None, если дат нет).
+    """
+
+    __slots__ = ()
+
+
+def parse_statuses(homeworks, status_cache=None,
+                   style=templates.DEFAULT_STYLE, user=''):
+    """Сверяет все работы ответа с кэшем статусов за один проход.
+
+    Ответ делится на части по BATCH_CHUNK работ. Часть, отпечаток
+    которой совпал с той же частью прошлого ответа (а записей в кэш
+    с тех пор не было), целиком пропускается: ее работы не менялись.
+    Остальные части разбираются по одной работе (parse_homework).
+    Ошибка в работе не прерывает разбор остальных, а попадает в errors.
+    """
+    if status_cache is None:
+        status_cache = homework_status_cache
+    known, known_latest = status_cache.last_batch or ((), ())
+    prints = chunk_fingerprints(homeworks)
+    batch = StatusBatch([], [], [], None)
+    latests = []
+    for number, fingerprint in enumerate(prints):
+        start = number * BATCH_CHUNK
+        chunk = homeworks[start:start + BATCH_CHUNK]
+        if (fingerprint is not None and number < len(known)
+                and known[number] == fingerprint):
+            batch.unchanged.extend(chunk)
+            latests.append(known_latest[number])
+            continue
+        failures = len(batch.errors)
+        latests.append(parse_chunk(chunk, status_cache, style, batch,
+                                   user))
+        if len(batch.errors) > failures:
+            prints[number] = None
+    status_cache.last_batch = (prints, latests)
+    return batch._replace(latest=max(filter(None.__ne__, latests),
+                                     default=None))
+
+
+def chunk_fingerprints(homeworks):
+    """Отпечатки частей ответа по полям, которые сверяет parse_homework.
+
+    Отпечаток - сами значения полей (кортеж кортежей), а не их хэш:
+    части сравниваются по содержимому, и коллизия хэшей не может
+    скрыть смену статуса. None - у части нет отпечатка (не хватает
+    полей), она всегда разбирается по одной работе.
+    """
+    fields = itemgetter('id', 'homework_name', 'status', 'date_updated')
+    prints = []
+    for start in range(0, len(homeworks), BATCH_CHUNK):
+        try:
+            prints.append(tuple(map(
+                fields, homeworks[start:start + BATCH_CHUNK]
+            )))
+        except (KeyError, TypeError):
+            prints.append(None)
+    return prints
+
+
+def parse_chunk(chunk, status_cache, style, batch, user=''):
+    """Разбирает часть ответа по одной работе в batch.
+
+    Возвращает самую позднюю date_updated разобранных работ или None.
+    """
+    latest = None
+    for homework in chunk:
+        try:
+            message, date = parse_homework(homework, status_cache, style,
+                                           user)
+        except Exception as error:
+            batch.errors.append((homework, error))
+            continue
+        if message:
+            batch.changes.append((homework, message))
+        else:
+            batch.unchanged.append(homework)
+        if date is not None and (latest is None or date > latest):
+            latest = date
+    return latest
+
+
+def record_history(homework, status, date, user=''):
+    """Дописывает изменение статуса в историю, если она ведется.
+
+    Когорта - lesson_name работы, user - студент (history.py).
+    Значение, которое не помещается в историю, не мешает уведомлению:
+    ошибка только логируется.
+    """
+    if status_history is None:
+        return
+    try:
+        status_history.append(homework.get('homework_name'), status, date,
+                              cohort=homework.get('lesson_name') or '',
+                              user=user)
+    except ValueError as error:
+        logger.error('Изменение не записано в историю: %s', error)
+
+
+def previous_status(status_cache, key, homework_name):
+    """Последний известный статус работы.
+
+    Статусы, сохраненные до перехода на id, хранятся по имени работы.
+    """
+    status = status_cache.get(key)
+    if status is None and key != homework_name:
+        status = status_cache.get(homework_name)
+    return status
+
+
+def homework_date(homework):
+    """Возвращает date_updated работы как timestamp или None."""
+    date = homework.get('date_updated')
+    if type(date) is not str or not date.endswith('Z'):
+        return None
+    try:
+        return (datetime.fromisoformat(date[:-1]) - EPOCH) // SECOND
+    except (TypeError, ValueError):
+        return None
+
+
+def skip_date(errors, latest, current_date=None):
+    """from_date, с которым следующие опросы не получат работ с ошибками.
+
+    errors - пары (работа, ошибка), latest - самая поздняя date_updated
+    разобранных работ, current_date - время ответа по часам API.
+    from_date включает свою секунду, поэтому берется дата + 1. Если
+    дата битой работы не читается, берется current_date ответа:
+    работы, измененные после ответа, получат дату не раньше него.
+    """
+    dates = [] if latest is None else [latest + 1]
+    for homework, _ in errors:
+        date = homework_date(homework) if isinstance(homework, dict) else None
+        if date is not None:
+            dates.append(date + 1)
+        elif type(current_date) is int:
+            dates.append(current_date)
+    return max(dates, default=0)
 
 
 def check_tokens():
@@ -114,32 +405,149 @@ def check_tokens():
 
 
 def main():
-    """Основная логика работы бота."""
+    """Основная логика работы бота.
+
+    Цикл опроса идет до SIGTERM/SIGINT; после сигнала (или исключения,
+    прервавшего цикл) очередь сообщений досылается, а хранилища
+    сбрасываются на диск (lifecycle.py).
+    """
+    global homework_status_cache, status_history, api_recorder
     if not check_tokens():
         raise logger.critical('Отсутствуют обязательные переменные окружения. '
                               'Программа остановлена!')
-    last_message_cache = ''
-    bot = Bot(token=TELEGRAM_TOKEN)
+    process = lifecycle.PROCESS
+    process.install()
+    store = state.open_store()
+    homework_status_cache = store.view('')
+    status_history = history.open_history()
+    api_recorder = recording.open_recorder()
+    cursors = state.open_cursors()
+    transport.configure()
+    httpcache.configure()
+    start_metrics(store)
+    bot = transport.LazyBot(TELEGRAM_TOKEN, base_url=SETTINGS.bot_url)
     send_message(bot, '--- Бот запущен ---')
-    current_timestamp = int(time.time())
-    while True:
-        try:
-            response = get_api_answer(current_timestamp)
-            homeworks = check_response(response)
-            for homework in homeworks:
-                message = parse_status(homework)
-                if message:
-                    send_message(bot, message)
-            current_timestamp = int(time.time())
-            time.sleep(RETRY_TIME)
-        except Exception as error:
-            message = f'{error}'
-            logger.error(message)
-            if message != last_message_cache:
-                send_message(bot, message)
-                last_message_cache = message
-            time.sleep(RETRY_TIME)
+    queue = DeliveryQueue(bot).start()
+    status_board.chat(TELEGRAM_CHAT_ID).style = templates.DEFAULT_STYLE
+    runner = commands.start(status_board, bot)
+    breaker.add_listener(breaker.OutageNotifier(
+        lambda: {TELEGRAM_CHAT_ID: templates.DEFAULT_STYLE}, queue.put
+    ))
+    register_shutdown(store, cursors, queue, runner)
+    process.mark_ready()
+    current_timestamp = cursors.get(CURSOR_KEY) or int(time.time())
+    try:
+        while not process.stopping.is_set():
+            try:
+                current_timestamp = poll_iteration(queue, cursors,
+                                                   current_timestamp)
+            except POLL_ERRORS as error:
+                report_error(error)
+            send_error_digest(queue)
+            wake_at = time.monotonic() + RETRY_TIME
+            metrics.NEXT_POLL.set_function(
+                lambda: metrics.seconds_until(wake_at)
+            )
+            process.wait(RETRY_TIME)
+    finally:
+        # Очередь досылается и хранилища сбрасываются и тогда, когда
+        # цикл прерван исключением.
+        process.shutdown()
+
+
+def register_shutdown(store, cursors, queue=None, runner=None):
+    """Действия при остановке: дослать очередь, сбросить хранилища.
+
+    Эндпоинт метрик и проб останавливается последним.
+    """
+    process = lifecycle.PROCESS
+    if queue is not None:
+        process.at_shutdown(queue.stop, deadline=True)
+    if runner is not None:
+        process.at_shutdown(runner.stop)
+    process.at_shutdown(cursors.close)
+    process.at_shutdown(store.close)
+    if status_history is not None:
+        process.at_shutdown(status_history.close)
+    if api_recorder is not None:
+        process.at_shutdown(api_recorder.close)
+    process.at_shutdown(metrics.stop)
+
+
+def start_metrics(status_cache):
+    """Поднимает /metrics и регистрирует размеры кэшей."""
+    metrics.start()
+    metrics.CACHE_SIZE.labels('http').set_function(httpcache.size)
+    metrics.CACHE_SIZE.labels('status').set_function(status_cache.__len__)
+
+
+def poll_iteration(queue, cursors, current_timestamp):
+    """Одна итерация основного цикла: запрос, разбор, уведомления.
+
+    Сообщения ставятся в очередь отправки (кроме паузы по /pause).
+    Ошибка в работе не мешает уведомлениям об остальных: ошибки
+    работ копятся в сводку (alerts.py). Возвращает новый from_date.
+    """
+    global seen_version
+    response = get_api_answer(current_timestamp)
+    version = httpcache.version_of(response)
+    if version is not None and version == seen_version:
+        return current_timestamp
+    seen_version = version
+    homeworks = check_response(response)
+    board = status_board.chat(TELEGRAM_CHAT_ID)
+    batch = parse_statuses(homeworks)
+    board.track_unchanged(batch.unchanged)
+    for homework, message in batch.changes:
+        board.track(homework, True)
+        if not board.paused:
+            queue.put(TELEGRAM_CHAT_ID, message,
+                      templates.DEFAULT_STYLE.parse_mode)
+    for homework, error in batch.errors:
+        report_error(error, homework)
+    if batch.errors:
+        # Остальные работы уже разобраны, from_date не сдвигается,
+        # пока битые работы не повторятся ERROR_SKIP_AFTER раз.
+        # Тот же ответ из кэша разбирается снова, чтобы опросы считались.
+        seen_version = None
+        if alerts.ERRORS.held(CURSOR_KEY) < alerts.ERROR_SKIP_AFTER:
+            return current_timestamp
+        current_timestamp = max(current_timestamp, skip_date(
+            batch.errors, batch.latest, response.get('current_date')
+        ))
+        logger.warning('from_date сдвинут мимо работ с ошибками: %s',
+                       current_timestamp)
+        cursors[CURSOR_KEY] = current_timestamp
+        return current_timestamp
+    alerts.ERRORS.resolve(CURSOR_KEY)
+    current_timestamp = max(current_timestamp, batch.latest or 0)
+    cursors[CURSOR_KEY] = current_timestamp
+    return current_timestamp
+
+
+def report_error(error, homework=None):
+    """Логирует ошибку основного цикла и копит ее в сводку (alerts.py).
+
+    Недоступность API покрывает уведомление выключателя.
+    """
+    metrics.count_error(error)
+    logger.error('%s', error)
+    if not breaker.covers(error, ENDPOINT):
+        alerts.ERRORS.add(CURSOR_KEY, error, homework)
+
+
+def send_error_digest(queue):
+    """Ставит в очередь сводку ошибок, если пора."""
+    text = alerts.ERRORS.digest(CURSOR_KEY)
+    if text is not None:
+        style = templates.DEFAULT_STYLE
+        queue.put(TELEGRAM_CHAT_ID, templates.render_text(style, text),
+                  style.parse_mode)
 
 
 if __name__ == '__main__':
-    main()
+    if '--profile-startup' in sys.argv[1:]:
+        import startup
+        print(startup.report('homework'))
+    else:
+        main()
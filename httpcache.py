@@ -0,0 +1,164 @@
+"""
+Кэш ответов API ЯндексПрактикум для условных запросов.
+
+Сохраняет ETag/Last-Modified и разобранное тело последнего ответа
+на каждый ключ (токен, from_date). Повторный запрос отправляется
+с If-None-Match / If-Modified-Since. На ответ 304 возвращается
+сохраненное тело: ключ общий для подписок одного токена, и подписка
+могла еще не видеть ответ, который получила другая. Тело - CachedBody
+с номером версии; подписка, уже разобравшая эту версию, пропускает
+разбор (poller.collect_messages). Записи вытесняются по TTL и по
+принципу LRU.
+"""
+
+import itertools
+import os
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+
+CACHE_MAXSIZE = int(os.getenv('HTTP_CACHE_MAXSIZE', 10000))
+CACHE_TTL = int(os.getenv('HTTP_CACHE_TTL', 24 * 60 * 60))
+
+_cache = None
+_versions = itertools.count(1)
+
+
+class CachedBody(dict):
+    """Разобранный ответ API, сохраненный в кэше, и его версия."""
+
+    __slots__ = ('version',)
+
+
+def version_of(data):
+    """Версия тела ответа из кэша или None (ответ не из кэша)."""
+    return getattr(data, 'version', None)
+
+
+class CachedResponse:
+    """Валидаторы и тело сохраненного ответа."""
+
+    __slots__ = ('etag', 'last_modified', 'body', 'expires_at')
+
+    def __init__(self, etag, last_modified, body, expires_at):
+        """Конструктор класса."""
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.expires_at = expires_at
+
+    def conditional_headers(self):
+        """Заголовки условного запроса."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """In-memory хранилище ответов с TTL и вытеснением LRU."""
+
+    def __init__(self, maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL):
+        """Конструктор класса."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Возвращает свежую запись или None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, etag, last_modified, body):
+        """Сохраняет ответ, вытесняя самую старую запись при переполнении."""
+        self._entries[key] = CachedResponse(
+            etag, last_modified, body, time.monotonic() + self.ttl
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        """Количество записей."""
+        return len(self._entries)
+
+
+def configure(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL):
+    """Включает кэш ответов."""
+    global _cache
+    _cache = ResponseCache(maxsize, ttl)
+    return _cache
+
+
+def disable():
+    """Выключает кэш ответов."""
+    global _cache
+    _cache = None
+
+
+def get_cache():
+    """Возвращает кэш или None, если он выключен."""
+    return _cache
+
+
+def size():
+    """Количество записей в кэше (0, если кэш выключен)."""
+    return len(_cache) if _cache is not None else 0
+
+
+def cache_key(headers, params):
+    """Ключ кэша: токен и from_date."""
+    return (headers.get('Authorization'), params.get('from_date'))
+
+
+def conditional_headers(key, headers):
+    """Добавляет к заголовкам валидаторы сохраненного ответа."""
+    if _cache is None:
+        return headers
+    entry = _cache.get(key)
+    if entry is None:
+        return headers
+    return {**headers, **entry.conditional_headers()}
+
+
+def cached_body(key, response):
+    """Сохраненное тело, если API ответил 304 на условный запрос.
+
+    None - ответ не 304 или сохраненного ответа нет.
+    """
+    if _cache is None or response.status_code != HTTPStatus.NOT_MODIFIED:
+        return None
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    _cache.hits += 1
+    return entry.body
+
+
+def store(key, response, data):
+    """Сохраняет валидаторы и разобранное тело data успешного ответа.
+
+    Возвращает сохраненное тело (CachedBody новой версии) или data,
+    если ответ не сохранен.
+    """
+    if _cache is None:
+        return data
+    _cache.misses += 1
+    headers = response.headers
+    etag = headers.get('ETag')
+    last_modified = headers.get('Last-Modified')
+    if etag or last_modified:
+        data = CachedBody(data)
+        data.version = next(_versions)
+        _cache.put(key, etag, last_modified, data)
+    return data
@@ -0,0 +1,123 @@
+"""
+HTTP-серверы бота: эндпоинт /metrics с пробами и вебхук команд.
+
+Вынесены из metrics.py и commands.py, чтобы http.server (а с ним
+email, socket и ssl) импортировался только при запуске сервера,
+а не при импорте бота.
+"""
+
+import hmac
+import json
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import commands
+import lifecycle
+import metrics
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Отдает метрики по GET /metrics и пробы /healthz, /readyz."""
+
+    def do_GET(self):
+        """Отвечает на запрос метрик или пробы."""
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            self.reply(HTTPStatus.OK, metrics.render(), metrics.CONTENT_TYPE)
+        elif path in ('/healthz', '/readyz'):
+            process = lifecycle.PROCESS
+            ok = (process.alive() if path == '/healthz'
+                  else process.ready)
+            self.reply(HTTPStatus.OK if ok
+                       else HTTPStatus.SERVICE_UNAVAILABLE,
+                       'ok\n' if ok else 'fail\n')
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND)
+
+    def reply(self, status, text, content_type='text/plain; charset=utf-8'):
+        """Отправляет текстовый ответ."""
+        body = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Запросы метрик не пишутся в лог бота."""
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Принимает обновления Bot API и отвечает методом sendMessage."""
+
+    SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+    def do_POST(self):
+        """Обрабатывает обновление."""
+        if self.path.split('?', 1)[0] != self.server.path:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        if not self.authorized():
+            self.send_error(HTTPStatus.FORBIDDEN)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            update = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send_error(HTTPStatus.BAD_REQUEST)
+            return
+        answer = self.server.handler.handle(update)
+        reply = {}
+        if answer is not None:
+            chat_id, text, parse_mode = answer
+            reply = {'method': 'sendMessage', 'chat_id': chat_id,
+                     'text': text}
+            if parse_mode:
+                reply['parse_mode'] = parse_mode
+        body = json.dumps(reply).encode()
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorized(self):
+        """Заголовок с секретом совпадает с секретом сервера.
+
+        Без секрета сервер отклоняет все запросы.
+        """
+        secret = self.server.secret
+        token = self.headers.get(self.SECRET_HEADER)
+        if not secret or token is None:
+            return False
+        return hmac.compare_digest(token.encode(), secret.encode())
+
+    def log_message(self, format, *args):
+        """Запросы Telegram не логируются."""
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """HTTP-сервер вебхука в фоновом потоке."""
+
+    daemon_threads = True
+
+    def __init__(self, handler, host=commands.WEBHOOK_HOST,
+                 port=commands.WEBHOOK_PORT, path=commands.WEBHOOK_PATH,
+                 secret=commands.WEBHOOK_SECRET):
+        """Конструктор класса."""
+        super().__init__((host, port), WebhookHandler)
+        self.handler = handler
+        self.path = path
+        self.secret = secret
+
+    def start(self):
+        """Запускает сервер."""
+        threading.Thread(target=self.serve_forever, name='webhook',
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер."""
+        self.shutdown()
+        self.server_close()
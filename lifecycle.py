@@ -0,0 +1,127 @@
+"""
+Жизненный цикл процесса: остановка по сигналу и пробы состояния.
+
+Обработчик SIGTERM/SIGINT только выставляет событие остановки, поэтому
+сигнал не прерывает отправку или запись на середине. Циклы опроса
+ждут через Lifecycle.wait() (или подписываются на остановку через
+on_stop) и просыпаются сразу, а не через RETRY_TIME. Затем shutdown()
+выполняет зарегистрированные действия: досылает очередь сообщений,
+сбрасывает хранилища на диск. На все отводится SHUTDOWN_TIMEOUT секунд
+с момента сигнала (Heroku ждет 30 секунд, потом шлет SIGKILL).
+Повторный сигнал завершает процесс сразу.
+
+Пробы отдаются на порту метрик (httpd.py): /healthz - цикл опроса
+отмечался вовремя (beat), /readyz - запуск завершен и остановка
+не началась.
+"""
+
+import logging
+import os
+import signal
+import threading
+import time
+
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', 20))
+LIVENESS_GRACE = float(os.getenv('LIVENESS_GRACE', 120))
+SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+logger = logging.getLogger('homework.lifecycle')
+
+
+class Lifecycle:
+    """Остановка процесса и состояние для проб."""
+
+    def __init__(self, shutdown_timeout=SHUTDOWN_TIMEOUT,
+                 grace=LIVENESS_GRACE, clock=time.monotonic):
+        """Конструктор класса."""
+        self.shutdown_timeout = shutdown_timeout
+        self.grace = grace
+        self.clock = clock
+        self.stopping = threading.Event()
+        self.ready = False
+        self._stop_at = None
+        self._deadline = None
+        self._listeners = []
+        self._actions = []
+
+    def install(self, signals=SIGNALS):
+        """Ставит обработчики сигналов (только из главного потока)."""
+        for signum in signals:
+            signal.signal(signum, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        """Первый сигнал - мягкая остановка, повторный - по умолчанию."""
+        signal.signal(signum, signal.SIG_DFL)
+        logger.info('Получен сигнал %s, остановка',
+                    signal.Signals(signum).name)
+        self.stop()
+
+    def on_stop(self, callback):
+        """callback() вызывается при запросе остановки.
+
+        Вызывается из обработчика сигнала: должен только будить
+        ожидающих (Event.set, call_soon_threadsafe).
+        """
+        self._listeners.append(callback)
+
+    def stop(self):
+        """Запрашивает остановку."""
+        if self.stopping.is_set():
+            return
+        self._stop_at = self.clock()
+        self.ready = False
+        self.stopping.set()
+        for callback in self._listeners:
+            callback()
+
+    def wait(self, timeout):
+        """Ждет timeout секунд; True - запрошена остановка."""
+        self.beat(timeout)
+        return self.stopping.wait(timeout)
+
+    def beat(self, next_in=0):
+        """Цикл жив; следующая отметка - через next_in секунд."""
+        self._deadline = self.clock() + next_in + self.grace
+
+    def alive(self):
+        """Цикл отмечался вовремя (или еще не начинал)."""
+        return self._deadline is None or self.clock() <= self._deadline
+
+    def mark_ready(self):
+        """Запуск завершен: процесс готов к работе."""
+        self.ready = not self.stopping.is_set()
+
+    def at_shutdown(self, callback, deadline=False):
+        """Регистрирует действие при остановке.
+
+        Действия выполняются в порядке регистрации. С deadline=True
+        callback получает оставшиеся до срока секунды; False в ответ
+        означает, что действие не успело завершиться.
+        """
+        self._actions.append((callback, deadline))
+
+    def shutdown(self):
+        """Выполняет действия остановки; True - все успели до срока."""
+        started = self._stop_at if self._stop_at is not None else self.clock()
+        deadline = started + self.shutdown_timeout
+        completed = True
+        for callback, timed in self._actions:
+            remaining = max(deadline - self.clock(), 0)
+            try:
+                result = callback(remaining) if timed else callback()
+            except Exception as error:
+                logger.error('Сбой при остановке (%s): %s',
+                             callback.__qualname__, error)
+                completed = False
+                continue
+            if result is False:
+                logger.warning('%s не завершено за %.1f с',
+                               callback.__qualname__, remaining)
+                completed = False
+        self._actions = []
+        logger.info('Остановка завершена за %.2f с',
+                    self.clock() - started)
+        return completed
+
+
+PROCESS = Lifecycle()
@@ -0,0 +1,126 @@
+"""
+Настройка логирования бота.
+
+Записи уходят в очередь и пишутся в поток вывода фоновым потоком
+(QueueHandler/QueueListener), поэтому форматирование и запись
+не занимают цикл опроса. Сообщения логируются %-стилем: аргументы
+подставляются, только если запись действительно выводится.
+
+Настройки окружения:
+LOG_LEVEL - уровень (INFO по умолчанию);
+LOG_FORMAT - text или json (одна JSON-строка на запись);
+LOG_SAMPLE_EVERY - из повторяющихся DEBUG-записей с одним шаблоном
+выводить только каждую N-ю (1 - выводить все).
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY', 1))
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+
+_handlers = []
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись в одну JSON-строку."""
+
+    def format(self, record):
+        """Возвращает JSON с временем, уровнем, логгером и сообщением."""
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает каждую every-ю запись с одним шаблоном сообщения.
+
+    Фильтруются только записи уровня DEBUG и ниже; первая запись
+    с каждым шаблоном выводится всегда.
+    """
+
+    def __init__(self, every=LOG_SAMPLE_EVERY, level=logging.DEBUG):
+        """Конструктор класса."""
+        super().__init__()
+        self.every = every
+        self.level = level
+        self.seen = {}
+
+    def filter(self, record):
+        """Решает, выводить ли запись."""
+        if record.levelno > self.level or self.every <= 1:
+            return True
+        count = self.seen.get(record.msg, 0)
+        self.seen[record.msg] = count + 1
+        return count % self.every == 0
+
+
+class LazyQueueHandler(QueueHandler):
+    """QueueHandler, который не форматирует запись в вызывающем потоке.
+
+    Стандартный prepare() подставляет аргументы сразу; здесь этим
+    занимается QueueListener в своем потоке.
+    """
+
+    def prepare(self, record):
+        """Кладет запись в очередь как есть."""
+        return record
+
+
+def make_formatter(fmt=LOG_FORMAT):
+    """Форматтер для text или json."""
+    if fmt == 'json':
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def setup(logger, level=LOG_LEVEL, fmt=LOG_FORMAT,
+          sample_every=LOG_SAMPLE_EVERY, stream=None):
+    """Настраивает логгер и возвращает его.
+
+    Логгер пишет в очередь, поток QueueListener - в stream
+    (sys.stdout по умолчанию). Записи не передаются родительским
+    логгерам. Повторный вызов заменяет обработчики.
+    """
+    stop(logger)
+    logger.setLevel(level)
+    logger.propagate = False
+    output = logging.StreamHandler(stream=stream or sys.stdout)
+    output.setFormatter(make_formatter(fmt))
+    records = queue.SimpleQueue()
+    handler = LazyQueueHandler(records)
+    handler.addFilter(SamplingFilter(sample_every))
+    logger.addHandler(handler)
+    handler.listener = QueueListener(records, output)
+    handler.listener.start()
+    _handlers.append(handler)
+    return logger
+
+
+def stop(logger):
+    """Дописывает записи логгера из очереди и снимает его обработчики."""
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        if handler in _handlers:
+            _handlers.remove(handler)
+            handler.listener.stop()
+
+
+@atexit.register
+def shutdown():
+    """Дописывает оставшиеся в очередях записи."""
+    while _handlers:
+        _handlers.pop().listener.stop()
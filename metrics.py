@@ -0,0 +1,329 @@
+"""
+Метрики бота в формате Prometheus.
+
+Счетчики и гистограммы пишутся без блокировок: у каждого потока своя
+ячейка (threading.local), при выдаче /metrics ячейки суммируются.
+Запись стоит порядка сотен наносекунд, поэтому инструменты можно
+вызывать прямо в цикле опроса. Эндпоинт /metrics поднимается
+на METRICS_PORT (0 - выключен).
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_metrics = []
+_server = None
+
+
+class Metric:
+    """Общая часть инструментов: имя, описание и метки."""
+
+    kind = None
+
+    def __init__(self, name, description, labelnames=()):
+        """Конструктор класса.
+
+        labelnames: имена меток; значения задаются через labels().
+        """
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._children = {}
+        self._unlabeled = None if labelnames else self.labels()
+        _metrics.append(self)
+
+    def labels(self, *values):
+        """Инструмент для набора значений меток."""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, self._child())
+        return child
+
+    def _child(self):
+        """Создает инструмент для одного набора меток."""
+        raise NotImplementedError
+
+    def _label_text(self, values, extra=()):
+        """Метки в формате {name="value"}."""
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        text = ','.join(f'{name}="{escape(value)}"' for name, value in pairs)
+        return '{' + text + '}'
+
+    def render(self):
+        """Строки метрики в текстовом формате Prometheus."""
+        lines = [f'# HELP {self.name} {self.description}',
+                 f'# TYPE {self.name} {self.kind}']
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Shards:
+    """Ячейки потоков: запись без блокировок, чтение - сумма ячеек.
+
+    Запись обращается к self.local.cell напрямую и вызывает cell()
+    только при первой записи из нового потока.
+    """
+
+    __slots__ = ('size', 'cells', 'local')
+
+    def __init__(self, size):
+        """Конструктор класса."""
+        self.size = size
+        self.cells = []
+        self.local = threading.local()
+
+    def cell(self):
+        """Создает ячейку текущего потока."""
+        cell = self.local.cell = [0] * self.size
+        self.cells.append(cell)
+        return cell
+
+    def total(self):
+        """Поэлементная сумма ячеек всех потоков."""
+        totals = [0] * self.size
+        for cell in list(self.cells):
+            for index, value in enumerate(cell):
+                totals[index] += value
+        return totals
+
+
+class CounterChild(Shards):
+    """Счетчик для одного набора меток."""
+
+    __slots__ = ()
+
+    def __init__(self):
+        """Конструктор класса."""
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        """Увеличивает счетчик."""
+        try:
+            cell = self.local.cell
+        except AttributeError:
+            cell = self.cell()
+        cell[0] += amount
+
+    @property
+    def value(self):
+        """Текущее значение."""
+        return self.total()[0]
+
+
+class Counter(Metric):
+    """Монотонный счетчик."""
+
+    kind = 'counter'
+
+    def _child(self):
+        """Создает счетчик для одного набора меток."""
+        return CounterChild()
+
+    def inc(self, amount=1):
+        """Увеличивает счетчик без меток."""
+        self._unlabeled.inc(amount)
+
+    def _render_child(self, values, child):
+        """Строка значения счетчика."""
+        yield f'{self.name}{self._label_text(values)} {child.value}'
+
+
+class GaugeChild:
+    """Показатель для одного набора меток."""
+
+    __slots__ = ('value_', 'function')
+
+    def __init__(self):
+        """Конструктор класса."""
+        self.value_ = 0.0
+        self.function = None
+
+    def set(self, value):
+        """Устанавливает значение."""
+        self.value_ = value
+
+    def set_function(self, function):
+        """Значение вычисляется функцией при каждом чтении."""
+        self.function = function
+
+    @property
+    def value(self):
+        """Текущее значение или None, если функция его не знает."""
+        if self.function is not None:
+            return self.function()
+        return self.value_
+
+
+class Gauge(Metric):
+    """Показатель, который может расти и убывать."""
+
+    kind = 'gauge'
+
+    def _child(self):
+        """Создает показатель для одного набора меток."""
+        return GaugeChild()
+
+    def set(self, value):
+        """Устанавливает значение показателя без меток."""
+        self._unlabeled.set(value)
+
+    def set_function(self, function):
+        """Вычислять показатель без меток функцией при чтении."""
+        self._unlabeled.set_function(function)
+
+    def _render_child(self, values, child):
+        """Строка значения показателя."""
+        value = child.value
+        if value is not None:
+            yield f'{self.name}{self._label_text(values)} {value}'
+
+
+class HistogramChild(Shards):
+    """Гистограмма для одного набора меток."""
+
+    __slots__ = ('buckets',)
+
+    def __init__(self, buckets):
+        """Конструктор класса."""
+        # Ячейка: счетчики корзин, корзина +Inf и сумма наблюдений.
+        super().__init__(len(buckets) + 2)
+        self.buckets = buckets
+
+    def observe(self, value):
+        """Учитывает наблюдение."""
+        try:
+            cell = self.local.cell
+        except AttributeError:
+            cell = self.cell()
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def snapshot(self):
+        """Накопленные счетчики корзин, общее число и сумма."""
+        totals = self.total()
+        cumulative = []
+        count = 0
+        for value in totals[:-1]:
+            count += value
+            cumulative.append(count)
+        return cumulative, count, totals[-1]
+
+
+class Histogram(Metric):
+    """Распределение значений (например, задержек) по корзинам."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, description, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        """Конструктор класса."""
+        self.buckets = tuple(buckets)
+        super().__init__(name, description, labelnames)
+
+    def _child(self):
+        """Создает гистограмму для одного набора меток."""
+        return HistogramChild(self.buckets)
+
+    def observe(self, value):
+        """Учитывает наблюдение без меток."""
+        self._unlabeled.observe(value)
+
+    def _render_child(self, values, child):
+        """Строки корзин, суммы и количества."""
+        cumulative, count, total = child.snapshot()
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        for bound, value in zip(bounds, cumulative):
+            labels = self._label_text(values, [('le', bound)])
+            yield f'{self.name}_bucket{labels} {value}'
+        labels = self._label_text(values)
+        yield f'{self.name}_sum{labels} {total}'
+        yield f'{self.name}_count{labels} {count}'
+
+
+def escape(value):
+    """Экранирует значение метки."""
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def count_error(error):
+    """Учитывает ошибку по имени ее класса."""
+    ERRORS.labels(type(error).__name__).inc()
+
+
+API_LATENCY = Histogram('homework_api_request_seconds',
+                        'Время запроса к API Практикума')
+SEND_LATENCY = Histogram('homework_send_message_seconds',
+                         'Время отправки сообщения в Telegram')
+ERRORS = Counter('homework_errors_total', 'Ошибки по классам',
+                 labelnames=('error',))
+CACHE_SIZE = Gauge('homework_cache_entries', 'Количество записей в кэше',
+                   labelnames=('cache',))
+NEXT_POLL = Gauge('homework_next_poll_seconds',
+                  'Секунд до следующего опроса API')
+API_COALESCED = Counter('homework_api_coalesced_total',
+                        'Запросы к API, объединенные с одинаковым '
+                        'запросом в полете')
+BREAKER_STATE = Gauge('homework_circuit_breaker_state',
+                      'Состояние выключателя: 0 - closed, 1 - open, '
+                      '2 - half-open', labelnames=('endpoint',))
+BREAKER_REJECTED = Counter('homework_circuit_breaker_rejected_total',
+                           'Запросы, не выполненные из-за выключателя',
+                           labelnames=('endpoint',))
+
+
+def start(port=METRICS_PORT, host=METRICS_HOST):
+    """Поднимает /metrics в фоновом потоке; при port=0 ничего не делает."""
+    global _server
+    if not port or _server is not None:
+        return _server
+    # http.server тянет email, socket и ssl: импорт только при запуске.
+    from httpd import MetricsHandler, ThreadingHTTPServer
+
+    _server = ThreadingHTTPServer((host, port), MetricsHandler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True,
+                     name='metrics').start()
+    return _server
+
+
+def stop():
+    """Останавливает эндпоинт /metrics."""
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+
+
+def __getattr__(name):
+    """Обработчик /metrics импортируется из httpd.py при обращении."""
+    if name == 'MetricsHandler':
+        import httpd
+
+        return httpd.MetricsHandler
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def seconds_until(deadline, clock=time.monotonic):
+    """Секунд до срока deadline (не меньше нуля)."""
+    return max(deadline - clock(), 0.0)
@@ -0,0 +1,398 @@
+"""
+Опрос API ЯндексПрактикум для множества подписок из одного процесса.
+
+Запуск: SUBSCRIPTIONS_FILE=subscriptions.txt python poller.py
+Несколько процессов (workers.py): python poller.py --workers 4
+"""
+
+import argparse
+import sys
+from operator import itemgetter
+
+import alerts
+import breaker
+import commands
+import exceptions as ex
+import history
+import homework
+import httpcache
+import lifecycle
+import metrics
+import recording
+import singleflight
+import state
+import streaming
+import templates
+import transport
+from delivery import DeliveryQueue
+from homework import POLL_ERRORS, logger
+from scheduler import Scheduler, update_mode
+from subscriptions import SUBSCRIPTIONS_FILE, load_subscriptions
+
+
+def collect_messages(subscription, response):
+    """Проверяет ответ API и возвращает сообщения об изменениях.
+
+    Ответ из кэша условных запросов (304 Not Modified), который
+    подписка уже разбирала, пропускается без разбора.
+    """
+    subscription.failures = 0
+    version = httpcache.version_of(response)
+    if version is not None and version == subscription.seen_version:
+        return error_digest(subscription)
+    subscription.seen_version = version
+    try:
+        homeworks = homework.check_response(response)
+    except POLL_ERRORS as error:
+        return report_error(subscription, error)
+    return process_batch(subscription, homeworks, response)
+
+
+def collect_stream_messages(subscription, stream):
+    """То же для потокового ответа (streaming.HomeworkStream)."""
+    subscription.failures = 0
+    return process_homeworks(subscription, streaming.check_stream(stream),
+                             stream.fields)
+
+
+def process_batch(subscription, homeworks, fields=None):
+    """Сверяет весь ответ пакетом (homework.parse_statuses).
+
+    Ошибка в работе не мешает разбору остальных: ошибки всех работ
+    попадают в сводку (alerts.py) после сообщений об изменениях.
+    from_date сдвигается и режим опроса пересчитывается, только если
+    ошибок нет или битые работы повторились ERROR_SKIP_AFTER опросов
+    подряд (hold_or_skip). fields - ключи верхнего уровня ответа
+    (current_date).
+    """
+    batch = homework.parse_statuses(homeworks, subscription.status_cache,
+                                    subscription.style, subscription.user)
+    board = subscription.board
+    board.track_unchanged(batch.unchanged)
+    messages = []
+    for item, message in batch.changes:
+        board.track(item, True)
+        messages.append(message)
+    if batch.errors:
+        hold_or_skip(subscription, batch.errors, batch.latest, fields)
+        return messages + report_errors(subscription, batch.errors)
+    return messages + poll_succeeded(
+        subscription, batch.latest, set(map(itemgetter('status'), homeworks))
+    )
+
+
+def process_homeworks(subscription, homeworks, fields=None):
+    """Проходит по работам потокового ответа и собирает сообщения.
+
+    Ошибка в работе, как и в process_batch, не мешает разбору
+    остальных; ошибка разбора самого потока прерывает проход.
+    Сообщения, собранные до ошибки, не теряются. Статусы попадают
+    на доску чата для команд бота (commands.py).
+    """
+    messages, errors = [], []
+    statuses = set()
+    latest = None
+    board = subscription.board
+    try:
+        for item in homeworks:
+            try:
+                message, date = homework.parse_homework(
+                    item, subscription.status_cache, subscription.style,
+                    subscription.user
+                )
+            except Exception as error:
+                errors.append((item, error))
+                continue
+            if message:
+                messages.append(message)
+            board.track(item, bool(message))
+            statuses.add(item.get('status'))
+            latest = max(latest or 0, date or 0)
+    except POLL_ERRORS as error:
+        errors.append((None, error))
+    if errors:
+        if all(item is not None for item, _ in errors):
+            hold_or_skip(subscription, errors, latest, fields)
+        return messages + report_errors(subscription, errors)
+    return messages + poll_succeeded(subscription, latest, statuses)
+
+
+def hold_or_skip(subscription, errors, latest, fields=None):
+    """Ошибки в работах держат from_date подписки (alerts.py).
+
+    Ответ из кэша условных запросов после этого разбирается снова,
+    чтобы каждый опрос с теми же битыми работами учитывался. После
+    ERROR_SKIP_AFTER таких опросов подряд from_date сдвигается мимо
+    битых работ (homework.skip_date), и они больше не запрашиваются.
+    fields - ключи верхнего уровня ответа (current_date).
+    """
+    subscription.seen_version = None
+    if alerts.ERRORS.held(subscription.namespace) < alerts.ERROR_SKIP_AFTER:
+        return
+    current_date = (fields or {}).get('current_date')
+    subscription.timestamp = max(
+        subscription.timestamp,
+        homework.skip_date(errors, latest, current_date)
+    )
+    logger.warning('%r: from_date сдвинут мимо работ с ошибками',
+                   subscription)
+
+
+def poll_succeeded(subscription, latest, statuses):
+    """Ответ разобран без ошибок.
+
+    from_date сдвигается к самой поздней date_updated, режим опроса
+    пересчитывается, а отправленные ошибки подписки забываются.
+    Возвращает сводку ошибок, накопленных до этого опроса, если пора.
+    """
+    subscription.timestamp = max(subscription.timestamp, latest or 0)
+    update_mode(subscription, statuses)
+    alerts.ERRORS.resolve(subscription.namespace)
+    return error_digest(subscription)
+
+
+def report_error(subscription, error):
+    """Учитывает ошибку подписки; возвращает сводку, если пора."""
+    return report_errors(subscription, [(None, error)])
+
+
+def report_errors(subscription, errors):
+    """Логирует ошибки (пары работа, ошибка) и копит их в сводку.
+
+    Возвращает сводку новых ошибок подписки в формате ее чата, если
+    окно сводки прошло (alerts.py), иначе пустой список.
+
+    Недоступность эндпоинта (ex.SystemExit) не останавливает опрос
+    остальных подписок. Все ошибки, кроме отсутствия новых работ
+    и отказа выключателя, увеличивают интервал до следующего опроса
+    (один раз за опрос). Пока выключатель эндпоинта не замкнут, ошибки
+    доступа к нему не копятся: в чаты уходит одно уведомление
+    (breaker.py).
+    """
+    failed = False
+    for item, error in errors:
+        if isinstance(error, ex.CircuitOpenError):
+            logger.debug('%r: %s', subscription, error)
+            continue
+        failed = failed or not isinstance(error, ex.HomeworksEmptyError)
+        metrics.count_error(error)
+        logger.error('%r: %s', subscription, error)
+        if not breaker.covers(error, homework.ENDPOINT):
+            alerts.ERRORS.add(subscription.namespace, error, item)
+    if failed:
+        subscription.failures += 1
+    return error_digest(subscription)
+
+
+def error_digest(subscription):
+    """Сводка ошибок подписки в формате ее чата или пустой список."""
+    text = alerts.ERRORS.digest(subscription.namespace)
+    if text is None:
+        return []
+    return [templates.render_text(subscription.style, text)]
+
+
+class Poller:
+    """Опрос всех подписок реестра с адаптивным расписанием."""
+
+    def __init__(self, registry, bot, retry_time=homework.RETRY_TIME,
+                 queue=None, streaming=False):
+        """Конструктор класса.
+
+        queue: очередь отправки (delivery.py); без нее сообщения
+        отправляются сразу.
+        streaming: разбирать ответ API потоково (streaming.py).
+        """
+        self.registry = registry
+        self.bot = bot
+        self.queue = queue
+        self.streaming = streaming
+        self.retry_time = retry_time
+        self.scheduler = Scheduler(self.poll)
+        self.tick = None
+
+    def poll(self, subscription):
+        """Опрашивает API для одной подписки и рассылает изменения.
+
+        Чату на паузе (/pause) сообщения не отправляются, но статусы
+        сохраняются.
+        """
+        messages = self.collect(subscription)
+        if subscription.board.paused:
+            return
+        for message in messages:
+            self.deliver(subscription.chat_id, message,
+                         subscription.style.parse_mode)
+
+    def collect(self, subscription):
+        """Опрашивает API и возвращает сообщения для чата подписки."""
+        try:
+            messages = self.fetch(subscription)
+        except POLL_ERRORS as error:
+            return report_error(subscription, error)
+        self.registry.save_cursor(subscription)
+        return messages
+
+    def fetch(self, subscription):
+        """Запрашивает API и возвращает сообщения об изменениях."""
+        if self.streaming:
+            stream = streaming.stream_api_answer_for(subscription.token,
+                                                     subscription.timestamp)
+            return collect_stream_messages(subscription, stream)
+        response = self.answer(subscription.token, subscription.timestamp)
+        return collect_messages(subscription, response)
+
+    def answer(self, token, from_date):
+        """Ответ API для токена, один на тик (singleflight.Tick).
+
+        Вне тика (например, при вызове poll() напрямую) - всегда
+        новый запрос.
+        """
+        if self.tick is None:
+            return homework.get_api_answer_for(token, from_date)
+        return self.tick.do(token, from_date, lambda from_date:
+                            homework.get_api_answer_for(token, from_date))
+
+    def start_tick(self):
+        """Начинает тик: ответы прошлого тика забываются."""
+        self.tick = singleflight.Tick(homework.api_flights.bucket)
+
+    def deliver(self, chat_id, message, parse_mode=None):
+        """Отправляет сообщение через очередь или напрямую."""
+        if self.queue is not None:
+            self.queue.put(chat_id, message, parse_mode)
+        else:
+            homework.send_message_to(self.bot, chat_id, message, parse_mode)
+
+    def run_once(self):
+        """Один проход (тик) по всем подпискам без пауз."""
+        self.start_tick()
+        try:
+            for subscription in self.registry:
+                self.poll(subscription)
+        finally:
+            self.tick = None
+
+    def schedule_all(self):
+        """Ставит все подписки на опрос равномерно по RETRY_TIME.
+
+        Подписки с одним токеном получают один срок: их опрашивает
+        один тик одним запросом.
+        """
+        slots = {}
+        for subscription in self.registry:
+            slots.setdefault(subscription.token, len(slots))
+        slot = self.retry_time / max(len(slots), 1)
+        for subscription in self.registry:
+            self.scheduler.schedule(subscription,
+                                    slots[subscription.token] * slot)
+
+    def run_forever(self):
+        """Опрашивает подписки по адаптивному расписанию.
+
+        Первые опросы равномерно распределяются по RETRY_TIME. Каждое
+        пробуждение планировщика - новый тик.
+        """
+        self.schedule_all()
+        self.scheduler.run_forever(self.start_tick)
+
+
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path', nargs='?', default=SUBSCRIPTIONS_FILE,
+                        help='файл подписок')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='число процессов-воркеров (0 - один процесс)')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='напечатать время импорта модулей и выйти')
+    return parser.parse_args(argv)
+
+
+def main():
+    """Запускает опрос всех подписок из SUBSCRIPTIONS_FILE."""
+    args = parse_args()
+    if args.profile_startup:
+        import startup
+        print(startup.report('poller'))
+        return
+    path = args.path
+    if not (homework.TELEGRAM_TOKEN and path):
+        logger.critical('Отсутствуют TELEGRAM_TOKEN или SUBSCRIPTIONS_FILE. '
+                        'Программа остановлена!')
+        sys.exit(1)
+    process = lifecycle.PROCESS
+    process.install()
+    store, cursors, shared = open_state()
+    homework.status_history = history.open_history()
+    registry = load_subscriptions(path, store, cursors)
+    logger.info('Загружено подписок: %s', len(registry))
+    transport.configure()
+    httpcache.configure()
+    homework.start_metrics(store)
+    bot = transport.LazyBot(homework.TELEGRAM_TOKEN,
+                            base_url=homework.SETTINGS.bot_url)
+    queue = DeliveryQueue(bot).start()
+    runner = commands.start(registry.board, bot)
+    loop = start_loop(args, registry, bot, queue, shared)
+    homework.register_shutdown(store, cursors, queue, runner)
+    process.mark_ready()
+    loop.run_forever()
+    process.shutdown()
+
+
+def open_state():
+    """Хранилища статусов и водяных знаков и общее состояние узлов.
+
+    Если задан CLUSTER_STATE, оба хранилища - в общем состоянии
+    (cluster.py), иначе - в STATE_FILE (или в памяти).
+    """
+    # Импорт здесь: cluster.py сам импортирует этот модуль.
+    from cluster import open_shared
+    shared = open_shared()
+    if shared is None:
+        return state.open_store(), state.open_cursors(), None
+    return shared, shared.cursors(), shared
+
+
+def start_loop(args, registry, bot, queue, shared=None):
+    """Создает цикл опроса: воркеры, узел кластера или один процесс.
+
+    Уведомления о недоступности API получают чаты подписок, которые
+    опрашивает этот процесс.
+    """
+    process = lifecycle.PROCESS
+    subscriptions = registry.__iter__
+    if args.workers:
+        if shared is not None:
+            logger.critical('Режим воркеров с CLUSTER_STATE не '
+                            'поддерживается. Программа остановлена!')
+            sys.exit(1)
+        if recording.RECORD_FILE:
+            logger.warning('Запись ответов API (RECORD_FILE) в режиме '
+                           'воркеров не поддерживается')
+        from workers import Coordinator
+        loop = Coordinator(registry, bot, args.workers, queue=queue).start()
+        process.on_stop(loop.stopped.set)
+        # Последние результаты воркеров попадают в очередь до ее остановки.
+        process.at_shutdown(loop.stop, deadline=True)
+    elif shared is not None:
+        from cluster import ClusterPoller
+        homework.api_recorder = recording.open_recorder()
+        loop = ClusterPoller(registry, bot, shared, queue=queue,
+                             streaming=streaming.STREAMING)
+        subscriptions = loop.owned_subscriptions
+        process.on_stop(loop.scheduler.stop)
+    else:
+        homework.api_recorder = recording.open_recorder()
+        loop = Poller(registry, bot, queue=queue,
+                      streaming=streaming.STREAMING)
+        process.on_stop(loop.scheduler.stop)
+    breaker.add_listener(breaker.OutageNotifier.for_subscriptions(
+        subscriptions, queue.put
+    ))
+    return loop
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Запись ответов API Практикума для воспроизведения под нагрузкой.
+
+Если задан RECORD_FILE, каждый ответ на запрос get_api_answer
+дописывается в сжатый JSONL (gzip). Строки файла:
+
+* {"b": номер, "body": "..."} - тело ответа, при первом появлении;
+* {"t": секунды от начала записи, "k": сессия, "s": код ответа,
+  "l": задержка в мс, "b": номер тела} - один обмен с API.
+
+Одинаковые тела (а ответы без изменений повторяются) хранятся один
+раз. Токен в файл не попадает: сессия - псевдоним из хэша токена,
+по которому ответы одного студента собираются вместе; вхождения токена
+в теле ответа заменяются тем же псевдонимом. Сетевая ошибка
+записывается с кодом 0 и пустым телом.
+
+Сервер воспроизведения - benchmarks.fake_servers.ReplayPracticum.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+RECORD_FILE = os.getenv('RECORD_FILE')
+# Через сколько обменов сбрасывать сжатый поток на диск.
+FLUSH_EVERY = int(os.getenv('RECORD_FLUSH_EVERY', 100))
+
+logger = logging.getLogger('homework.recording')
+
+
+class Exchange(namedtuple('Exchange', 'offset session status latency body')):
+    """Записанный обмен с API: задержка в секундах, тело в байтах."""
+
+    __slots__ = ()
+
+
+def session_alias(token):
+    """Псевдоним токена: по нему нельзя восстановить токен."""
+    return 'session-' + hashlib.sha256(token.encode()).hexdigest()[:12]
+
+
+def token_of(headers):
+    """Токен из заголовка Authorization ('OAuth <токен>')."""
+    return headers.get('Authorization', '').partition(' ')[2]
+
+
+class Recorder:
+    """Пишет обмены с API в сжатый файл; безопасен для потоков."""
+
+    def __init__(self, path, flush_every=FLUSH_EVERY, clock=time.monotonic):
+        """Конструктор класса."""
+        self.path = path
+        self.flush_every = flush_every
+        self.clock = clock
+        self.started = clock()
+        self.exchanges = 0
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def record(self, headers, response, latency, body=None):
+        """Записывает ответ (None - сетевая ошибка) и его задержку.
+
+        body - тело ответа, уже прочитанное потоком (streaming.py);
+        по умолчанию - response.content.
+        """
+        token = token_of(headers)
+        session = session_alias(token)
+        status = 0
+        if response is not None:
+            status = response.status_code
+            if body is None:
+                body = response.content
+        body = body or b''
+        if token:
+            body = body.replace(token.encode(), session.encode())
+        with self._lock:
+            if self._file is None:
+                return
+            self._write({
+                't': round(self.clock() - self.started, 3), 'k': session,
+                's': status, 'l': round(latency * 1000, 1),
+                'b': self._body_number(body),
+            })
+            self.exchanges += 1
+            if self.exchanges % self.flush_every == 0:
+                self._file.flush()
+
+    def _body_number(self, body):
+        """Номер тела; новое тело дописывается в файл."""
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        number = self._bodies.get(digest)
+        if number is None:
+            number = self._bodies[digest] = len(self._bodies)
+            self._write({'b': number,
+                         'body': body.decode('utf-8', 'replace')})
+        return number
+
+    def _write(self, entry):
+        """Дописывает строку JSONL."""
+        self._file.write(json.dumps(entry, ensure_ascii=False,
+                                    separators=(',', ':')) + '\n')
+
+    def close(self):
+        """Дописывает и закрывает файл записи."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+        logger.info('Записано обменов с API: %s (%s)', self.exchanges,
+                    self.path)
+
+
+def load(path):
+    """Читает запись в список Exchange.
+
+    Оборванный файл (процесс убит до закрытия) читается до последнего
+    сброшенного на диск обмена.
+    """
+    bodies = {}
+    exchanges = []
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        try:
+            for line in file:
+                entry = json.loads(line)
+                if 'body' in entry:
+                    bodies[entry['b']] = entry['body'].encode()
+                    continue
+                exchanges.append(Exchange(entry['t'], entry['k'],
+                                          entry['s'], entry['l'] / 1000,
+                                          bodies[entry['b']]))
+        except (EOFError, json.JSONDecodeError):
+            logger.warning('Запись %s оборвана, прочитано обменов: %s',
+                           path, len(exchanges))
+    return exchanges
+
+
+def open_recorder(path=RECORD_FILE):
+    """Включает запись ответов API, если задан файл."""
+    if path:
+        return Recorder(path)
+    return None
@@ -0,0 +1,151 @@
+"""
+Адаптивный планировщик опроса подписок.
+
+Интервал опроса зависит от состояния подписки: пока работа на проверке,
+API опрашивается чаще; когда все работы приняты, подписка уходит
+в режим ожидания; после ошибок интервал растет экспоненциально
+со случайным разбросом. Сроки всех подписок лежат в одной куче,
+которую обслуживает один поток.
+"""
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+import homework
+import lifecycle
+import metrics
+
+ACTIVE_INTERVAL = int(os.getenv('ACTIVE_INTERVAL', 120))
+NORMAL_INTERVAL = int(os.getenv('NORMAL_INTERVAL', homework.RETRY_TIME))
+IDLE_INTERVAL = int(os.getenv('IDLE_INTERVAL', 3600))
+ERROR_BACKOFF = int(os.getenv('ERROR_BACKOFF', 60))
+MAX_BACKOFF = int(os.getenv('MAX_BACKOFF', 3600))
+JITTER = 0.1
+
+ACTIVE = 'active'
+NORMAL = 'normal'
+IDLE = 'idle'
+
+ACTIVE_STATUSES = {'reviewing'}
+TERMINAL_STATUSES = {'approved'}
+
+
+def update_mode(subscription, statuses):
+    """Определяет режим опроса по множеству статусов из ответа API."""
+    if statuses & ACTIVE_STATUSES:
+        subscription.mode = ACTIVE
+    elif statuses and statuses <= TERMINAL_STATUSES:
+        subscription.mode = IDLE
+    else:
+        subscription.mode = NORMAL
+
+
+def next_interval(subscription, rand=random.random):
+    """Интервал до следующего опроса подписки в секундах."""
+    if subscription.failures:
+        backoff = min(MAX_BACKOFF,
+                      ERROR_BACKOFF * 2 ** (subscription.failures - 1))
+        return backoff / 2 + backoff / 2 * rand()
+    interval = {
+        ACTIVE: ACTIVE_INTERVAL,
+        IDLE: IDLE_INTERVAL,
+    }.get(subscription.mode, NORMAL_INTERVAL)
+    return interval * (1 - JITTER + 2 * JITTER * rand())
+
+
+class Scheduler:
+    """Куча сроков опроса, обслуживаемая одним потоком."""
+
+    def __init__(self, poll, interval=next_interval,
+                 clock=time.monotonic):
+        """Конструктор класса.
+
+        poll: функция, опрашивающая одну подписку.
+        interval: функция подписка --> секунды до следующего опроса.
+        """
+        self.poll = poll
+        self.interval = interval
+        self.clock = clock
+        self.stopped = threading.Event()
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+
+    def schedule(self, subscription, delay=0):
+        """Ставит (или переставляет) опрос подписки через delay секунд."""
+        self.unschedule(subscription)
+        entry = [self.clock() + delay, next(self._counter), subscription]
+        self._entries[subscription.key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def unschedule(self, subscription):
+        """Снимает подписку с расписания."""
+        entry = self._entries.pop(subscription.key, None)
+        if entry is not None:
+            entry[-1] = None
+
+    def next_deadline(self):
+        """Ближайший срок опроса или None, если расписание пусто."""
+        while self._heap and self._heap[0][-1] is None:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def run_due(self):
+        """Опрашивает все подписки, чей срок наступил к началу прохода.
+
+        Следующий срок отсчитывается от начала прохода, поэтому
+        подписки с одним сроком и интервалом (с одним токеном, см.
+        Poller.schedule_all) и дальше опрашиваются в одном проходе.
+        """
+        polled = 0
+        now = self.clock()
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                return polled
+            subscription = heapq.heappop(self._heap)[-1]
+            del self._entries[subscription.key]
+            self.poll(subscription)
+            self.schedule(subscription, self.interval(subscription)
+                          - (self.clock() - now))
+            polled += 1
+
+    def seconds_until_next(self):
+        """Секунд до ближайшего опроса (для метрик из другого потока)."""
+        try:
+            deadline = self._heap[0][0]
+        except IndexError:
+            return None
+        return metrics.seconds_until(deadline, self.clock)
+
+    def run_forever(self, on_wake=None, max_wait=None):
+        """Ждет ближайший срок и опрашивает подписки до остановки.
+
+        on_wake() вызывается при каждом пробуждении, max_wait - самое
+        долгое ожидание в секундах (например, для продления аренды
+        в cluster.py).
+        """
+        metrics.NEXT_POLL.set_function(self.seconds_until_next)
+        while not self.stopped.is_set():
+            if on_wake is not None:
+                on_wake()
+            self.run_due()
+            deadline = self.next_deadline()
+            timeout = (homework.RETRY_TIME if deadline is None
+                       else max(deadline - self.clock(), 0))
+            if max_wait is not None:
+                timeout = min(timeout, max_wait)
+            lifecycle.PROCESS.beat(timeout)
+            self.stopped.wait(timeout)
+
+    def stop(self):
+        """Останавливает run_forever."""
+        self.stopped.set()
+
+    def __len__(self):
+        """Количество подписок в расписании."""
+        return len(self._entries)
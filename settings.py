@@ -0,0 +1,53 @@
+"""
+Настройки бота, разобранные один раз при запуске.
+
+load() читает .env и переменные окружения при первом вызове и
+возвращает неизменяемый Settings; повторные вызовы возвращают тот же
+объект. Настройки отдельных модулей (размеры пулов, тайм-ауты и т.п.)
+по-прежнему задаются их собственными переменными окружения.
+"""
+
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+DEFAULT_ENDPOINT = (
+    'https://practicum.yandex.ru/api/user_api/homework_statuses/'
+)
+DEFAULT_TELEGRAM_API_URL = 'https://api.telegram.org'
+
+
+class Settings(namedtuple('Settings', (
+    'practicum_token', 'telegram_token', 'telegram_chat_id',
+    'retry_time', 'endpoint', 'telegram_api_url',
+))):
+    """Основные настройки бота."""
+
+    __slots__ = ()
+
+    @property
+    def headers(self):
+        """Заголовки запроса к API Практикума."""
+        return {'Authorization': f'OAuth {self.practicum_token}'}
+
+    @property
+    def bot_url(self):
+        """Базовый адрес методов Bot API для telegram.Bot."""
+        return f'{self.telegram_api_url}/bot'
+
+
+@lru_cache(maxsize=None)
+def load():
+    """Читает .env и окружение; результат кэшируется."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return Settings(
+        practicum_token=os.getenv('PRACTICUM_TOKEN'),
+        telegram_token=os.getenv('TELEGRAM_TOKEN'),
+        telegram_chat_id=os.getenv('TELEGRAM_CHAT_ID'),
+        retry_time=int(os.getenv('RETRY_TIME', 600)),
+        endpoint=os.getenv('PRACTICUM_ENDPOINT', DEFAULT_ENDPOINT),
+        telegram_api_url=os.getenv('TELEGRAM_API_URL',
+                                   DEFAULT_TELEGRAM_API_URL),
+    )
@@ -0,0 +1,167 @@
+"""
+Объединение одновременных одинаковых запросов к API (singleflight).
+
+Если несколько подписок с одним токеном (например, групповой и личный
+чат одного студента) запрашивают API одновременно, выполняется один
+запрос, а его разобранный ответ (или ошибка) достается всем.
+Ключ - токен и корзина from_date шириной SINGLEFLIGHT_BUCKET секунд.
+Вызов присоединяется к запросу в полете, только если его from_date
+не раньше from_date этого запроса: ответ API за более длинный период
+включает все работы, которые вернул бы запрос вызова. Иначе
+выполняется отдельный запрос. SINGLEFLIGHT_BUCKET=0 выключает
+объединение.
+
+Group - для потоков, AsyncGroup - для asyncio (aio.py). В синхронном
+Poller подписки опрашиваются по очереди одним потоком, и запросы
+никогда не оказываются в полете одновременно: там ответ хранит Tick
+до конца прохода планировщика (тика), и подписки с тем же токеном,
+опрошенные в этом тике, получают его без нового запроса.
+"""
+
+import os
+import threading
+
+import metrics
+
+SINGLEFLIGHT_BUCKET = int(os.getenv('SINGLEFLIGHT_BUCKET', 60))
+
+
+class Flight:
+    """Запрос в полете: его from_date и результат для ожидающих."""
+
+    __slots__ = ('from_date', 'done', 'result', 'error')
+
+    def __init__(self, from_date, done):
+        """Конструктор класса."""
+        self.from_date = from_date
+        self.done = done
+        self.result = None
+        self.error = None
+
+
+class BaseGroup:
+    """Общая часть: поиск запроса в полете и его регистрация."""
+
+    def __init__(self, bucket=SINGLEFLIGHT_BUCKET):
+        """Конструктор класса."""
+        self.bucket = bucket
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, token, from_date):
+        """Возвращает (ключ, запрос, ведущий ли вызов).
+
+        Запрос None - вызов не объединяется с другими.
+        """
+        if not self.bucket:
+            return None, None, True
+        key = (token, (from_date or 0) // self.bucket)
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight(from_date,
+                                                     self._event())
+                return key, flight, True
+        if (from_date or 0) >= (flight.from_date or 0):
+            metrics.API_COALESCED.inc()
+            return key, flight, False
+        return None, None, True
+
+    def _land(self, key):
+        """Снимает запрос с учета: новые вызовы пойдут в API."""
+        with self._lock:
+            del self._flights[key]
+
+    def __len__(self):
+        """Количество запросов в полете."""
+        return len(self._flights)
+
+
+class Group(BaseGroup):
+    """Объединение одновременных запросов из разных потоков."""
+
+    _event = threading.Event
+
+    def do(self, token, from_date, fetch):
+        """Результат fetch(from_date), общий для одновременных вызовов."""
+        key, flight, leader = self._join(token, from_date)
+        if flight is None:
+            return fetch(from_date)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fetch(from_date)
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            self._land(key)
+            flight.done.set()
+        return flight.result
+
+
+class AsyncGroup(BaseGroup):
+    """Объединение одновременных запросов корутин одного цикла событий."""
+
+    @staticmethod
+    def _event():
+        """Future текущего цикла событий."""
+        import asyncio
+
+        return asyncio.get_running_loop().create_future()
+
+    async def do(self, token, from_date, fetch):
+        """То же, что Group.do, для корутины fetch(from_date)."""
+        # asyncio нужен только асинхронному режиму (aio.py).
+        import asyncio
+
+        key, flight, leader = self._join(token, from_date)
+        if flight is None:
+            return await fetch(from_date)
+        if not leader:
+            return await asyncio.shield(flight.done)
+        try:
+            result = await fetch(from_date)
+        except asyncio.CancelledError:
+            flight.done.cancel()
+            raise
+        except BaseException as error:
+            flight.done.set_exception(error)
+            # Ошибку получат ожидающие; без них она не считается
+            # необработанной.
+            flight.done.exception()
+            raise
+        else:
+            flight.done.set_result(result)
+        finally:
+            self._land(key)
+        return result
+
+
+class Tick(BaseGroup):
+    """Ответы одного тика последовательного опроса (один поток).
+
+    Ответ (или ошибка) остается в силе до конца тика: следующий вызов
+    с тем же ключом получает его по тем же правилам, что и Group.
+    """
+
+    _event = threading.Event
+
+    def do(self, token, from_date, fetch):
+        """Результат fetch(from_date), общий для вызовов тика."""
+        key, flight, leader = self._join(token, from_date)
+        if flight is None:
+            return fetch(from_date)
+        if not leader:
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fetch(from_date)
+        except BaseException as error:
+            flight.error = error
+            raise
+        return flight.result
@@ -0,0 +1,74 @@
+"""
+Профиль времени запуска: сколько стоит импорт модуля и его зависимостей.
+
+Модуль импортируется в отдельном интерпретаторе с -X importtime (в
+текущем процессе все уже импортировано), вывод разбирается: итоговое
+время импорта и прямые зависимости модуля по убыванию накопленного
+времени. Печатается по флагу --profile-startup у homework.py и
+poller.py.
+"""
+
+import subprocess
+import sys
+from collections import namedtuple
+
+TOP = 15
+
+Entry = namedtuple('Entry', ('name', 'depth', 'self_us', 'cumulative_us'))
+
+
+def parse_importtime(output):
+    """Строки вывода -X importtime в список Entry (в порядке вывода)."""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            # Строка заголовка.
+            continue
+        stripped = name.lstrip(' ')
+        depth = (len(name) - len(stripped) - 1) // 2
+        entries.append(Entry(stripped.rstrip(), depth,
+                             int(self_us), int(cumulative)))
+    return entries
+
+
+def breakdown(entries, module):
+    """Итог импорта module и его прямые зависимости.
+
+    Возвращает (накопленное время модуля в мкс, список Entry прямых
+    зависимостей по убыванию накопленного времени).
+    """
+    for index in range(len(entries) - 1, -1, -1):
+        if entries[index].depth == 0 and entries[index].name == module:
+            break
+    else:
+        raise LookupError(f'Импорт {module} не найден в выводе')
+    children = []
+    for entry in reversed(entries[:index]):
+        if entry.depth == 0:
+            break
+        if entry.depth == 1:
+            children.append(entry)
+    children.sort(key=lambda entry: entry.cumulative_us, reverse=True)
+    return entries[index].cumulative_us, children
+
+
+def profile(module):
+    """Импортирует module в новом интерпретаторе и разбирает профиль."""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True,
+    )
+    return breakdown(parse_importtime(completed.stderr), module)
+
+
+def report(module, top=TOP):
+    """Текстовый отчет о времени импорта module."""
+    total, children = profile(module)
+    lines = [f'Импорт {module}: {total / 1000:.1f} мс']
+    for entry in children[:top]:
+        lines.append(f'  {entry.name:<24} {entry.cumulative_us / 1000:8.1f} '
+                     f'мс {entry.cumulative_us / total:6.1%}')
+    return '\n'.join(lines)
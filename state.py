@@ -0,0 +1,666 @@
+"""
+Хранилища статусов домашних работ.
+
+ChangeIndex - компактный индекс изменений в памяти (по умолчанию):
+статус и date_updated по ключу (подписка, id работы), 24 байта на слот.
+MemoryStatusStore - обычный словарь в памяти.
+CursorStore - водяные знаки from_date подписок в JSON-файле.
+StatusBoard - последние статусы работ и история изменений по чатам
+для команд бота (commands.py).
+LogStatusStore - долговременное хранилище: снимок с хэш-таблицей,
+который открывается через mmap без чтения в память, и журнал изменений
+с пакетным fsync. При старте проигрывается только журнал, поэтому
+запуск не зависит от числа записей в снимке. Когда журнал вырастает,
+он сливается в новый снимок (компакция).
+
+Ключи хранятся в виде 64-битного хэша blake2b: вероятность коллизии
+для миллиона записей порядка 1e-8.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+from collections import deque
+from itertools import compress
+from operator import itemgetter, not_
+
+STATE_FILE = os.getenv('STATE_FILE')
+FSYNC_EVERY = int(os.getenv('STATE_FSYNC_EVERY', 100))
+FSYNC_INTERVAL = float(os.getenv('STATE_FSYNC_INTERVAL', 1.0))
+COMPACT_THRESHOLD = int(os.getenv('STATE_COMPACT_THRESHOLD', 100000))
+CURSOR_FLUSH_INTERVAL = float(os.getenv('CURSOR_FLUSH_INTERVAL', 5.0))
+HISTORY_SIZE = int(os.getenv('STATUS_HISTORY_SIZE', 10))
+
+MAGIC = b'HWSTATE1'
+HEADER = struct.Struct('<8sQQQ')
+RECORD = struct.Struct('<QH')
+EMPTY = 0
+INDEX_MIN_CAPACITY = 8
+INDEX_MAX_LOAD = 0.9
+INDEX_GROWTH = 1.2
+INDEX_HASH_MASK = (1 << 56) - 1
+INDEX_CHECK_MASK = (1 << 64) - 1
+
+
+def key_hash(key):
+    """Стабильный между запусками 64-битный хэш ключа (никогда не 0)."""
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+class StoreView:
+    """Представление хранилища с префиксом ключей (одна подписка).
+
+    Пустой префикс - ключи без префикса (однопользовательский режим).
+    last_batch - отпечатки частей последнего ответа, сверенного
+    homework.parse_statuses; любая запись их сбрасывает.
+    """
+
+    __slots__ = ('store', 'prefix', 'last_batch')
+
+    def __init__(self, store, prefix):
+        """Конструктор класса."""
+        self.store = store
+        self.prefix = f'{prefix}:' if prefix else ''
+        self.last_batch = None
+
+    def get(self, key, default=None):
+        """Возвращает значение по ключу."""
+        return self.store.get(f'{self.prefix}{key}', default)
+
+    def __setitem__(self, key, value):
+        """Сохраняет значение."""
+        self.last_batch = None
+        self.store[f'{self.prefix}{key}'] = value
+
+    def __contains__(self, key):
+        """Проверяет наличие ключа."""
+        return self.get(key) is not None
+
+    def unchanged(self, key, status, date):
+        """Даты здесь не хранятся: работа всегда проверяется целиком."""
+        return False
+
+    def record(self, key, status, date=0, previous=None):
+        """Сохраняет статус, если он изменился."""
+        if status != previous:
+            self[key] = status
+
+
+class ChangeIndex:
+    """Компактный индекс изменений: ключ работы --> статус и date_updated.
+
+    Хэш-таблица с открытой адресацией на трех массивах: в keys -
+    56 бит хэша ключа и 8 бит кода статуса, в checks - второй,
+    независимый 64-битный хэш ключа, в dates - date_updated
+    в секундах (0 - неизвестна). Слот совпадает с ключом, только если
+    совпали оба хэша, поэтому коллизия 56-битного хэша не выдает
+    одну работу за другую. Слот занимает 24 байта, таблица
+    заполняется до 90% и растет в 1.2 раза. Индекс живет только
+    в памяти процесса, поэтому ключи хэшируются встроенным hash().
+    """
+
+    def __init__(self, capacity=INDEX_MIN_CAPACITY):
+        """Конструктор класса."""
+        self.statuses = [None]
+        self._codes = {}
+        self._count = 0
+        self._allocate(max(capacity, INDEX_MIN_CAPACITY))
+
+    def _allocate(self, capacity):
+        """Создает пустые массивы заданной емкости."""
+        self._keys = array('Q', [EMPTY]) * capacity
+        self._checks = array('Q', [0]) * capacity
+        self._dates = array('q', [0]) * capacity
+        self._capacity = capacity
+        self._limit = int(capacity * INDEX_MAX_LOAD)
+
+    def _slot(self, hashed, check):
+        """Слот, занятый ключом, или первый свободный слот."""
+        keys, checks = self._keys, self._checks
+        capacity = self._capacity
+        slot = hashed % capacity
+        while True:
+            word = keys[slot]
+            if word == EMPTY or (word >> 8 == hashed
+                                 and checks[slot] == check):
+                return slot
+            slot += 1
+            if slot == capacity:
+                slot = 0
+
+    def _code(self, status):
+        """Код статуса (1-255)."""
+        code = self._codes.get(status)
+        if code is None:
+            code = len(self.statuses)
+            if code > 0xFF:
+                raise ValueError('Слишком много различных статусов')
+            self._codes[status] = code
+            self.statuses.append(status)
+        return code
+
+    def _grow(self):
+        """Переносит ключи в таблицу большей емкости."""
+        keys, checks, dates = self._keys, self._checks, self._dates
+        self._allocate(max(int(self._capacity * INDEX_GROWTH),
+                           self._capacity + INDEX_MIN_CAPACITY))
+        for word, check, date in zip(keys, checks, dates):
+            if word != EMPTY:
+                slot = self._slot(word >> 8, check)
+                self._keys[slot] = word
+                self._checks[slot] = check
+                self._dates[slot] = date
+
+    def matches(self, hashed, check, status, date):
+        """Проверяет, что по хэшам ключа сохранены этот статус и дата.
+
+        Путь каждого опроса для неизменившихся работ: поиск слота
+        встроен, чтобы не тратить на него отдельный вызов.
+        """
+        keys = self._keys
+        capacity = self._capacity
+        slot = hashed % capacity
+        word = keys[slot]
+        while word != EMPTY:
+            if word >> 8 == hashed and self._checks[slot] == check:
+                return (self._dates[slot] == date
+                        and self.statuses[word & 0xFF] == status)
+            slot = slot + 1 if slot + 1 < capacity else 0
+            word = keys[slot]
+        return False
+
+    def lookup(self, hashed, check):
+        """Возвращает (статус, date_updated) по хэшам ключа или None."""
+        slot = self._slot(hashed, check)
+        word = self._keys[slot]
+        if word == EMPTY:
+            return None
+        return self.statuses[word & 0xFF], self._dates[slot]
+
+    def set(self, hashed, check, status, date=0):
+        """Сохраняет статус и date_updated (секунды, 0 - неизвестна)."""
+        code = self._code(status)
+        slot = self._slot(hashed, check)
+        if self._keys[slot] == EMPTY:
+            if self._count >= self._limit:
+                self._grow()
+                slot = self._slot(hashed, check)
+            self._count += 1
+        self._keys[slot] = hashed << 8 | code
+        self._checks[slot] = check
+        self._dates[slot] = date if date and date > 0 else 0
+
+    def __len__(self):
+        """Количество ключей."""
+        return self._count
+
+    @property
+    def nbytes(self):
+        """Размер массивов таблицы в байтах."""
+        return sum(len(column) * column.itemsize
+                   for column in (self._keys, self._checks, self._dates))
+
+    def view(self, prefix, backing=None):
+        """Представление с префиксом ключей."""
+        return IndexView(self, prefix, backing)
+
+    def flush(self):
+        """Нечего сбрасывать на диск."""
+
+    def compact(self):
+        """Нечего сжимать."""
+
+    def close(self):
+        """Нечего закрывать."""
+
+
+class IndexView:
+    """Кэш статусов подписки поверх ChangeIndex.
+
+    backing - представление долговременного хранилища (StoreView):
+    в него пишутся только изменения статусов, а статусы, которых еще
+    нет в индексе (например, после перезапуска), читаются из него.
+    last_batch - как у StoreView.
+    """
+
+    __slots__ = ('index', 'backing', 'last_batch', '_salt')
+
+    def __init__(self, index, prefix, backing=None):
+        """Конструктор класса."""
+        self.index = index
+        self.backing = backing
+        self.last_batch = None
+        self._salt = hash(prefix)
+
+    def _hash(self, key):
+        """Хэши пары (подписка, ключ работы) для индекса.
+
+        56-битный (никогда не 0) выбирает слот, независимый 64-битный
+        проверяет, что в слоте именно этот ключ.
+        """
+        return (hash((self._salt, key)) & INDEX_HASH_MASK or 1,
+                hash((key, self._salt)) & INDEX_CHECK_MASK)
+
+    def unchanged(self, key, status, date):
+        """Проверяет, что статус и date_updated работы уже в индексе."""
+        salt = self._salt
+        return self.index.matches(
+            hash((salt, key)) & INDEX_HASH_MASK or 1,
+            hash((key, salt)) & INDEX_CHECK_MASK, status, date or 0
+        )
+
+    def get(self, key, default=None):
+        """Возвращает статус по ключу."""
+        entry = self.index.lookup(*self._hash(key))
+        if entry is not None:
+            return entry[0]
+        if self.backing is not None:
+            return self.backing.get(key, default)
+        return default
+
+    def record(self, key, status, date=0, previous=None):
+        """Сохраняет статус и дату; в backing - только смену статуса."""
+        self.last_batch = None
+        self.index.set(*self._hash(key), status, date)
+        if self.backing is not None and status != previous:
+            self.backing[key] = status
+
+    def __setitem__(self, key, status):
+        """Сохраняет статус."""
+        self.record(key, status)
+
+    def __contains__(self, key):
+        """Проверяет наличие ключа."""
+        return self.get(key) is not None
+
+
+class MemoryStatusStore(dict):
+    """Хранилище статусов в памяти; теряется при перезапуске."""
+
+    def view(self, prefix):
+        """Представление с префиксом ключей."""
+        return StoreView(self, prefix)
+
+    def flush(self):
+        """Нечего сбрасывать на диск."""
+
+    def compact(self):
+        """Нечего сжимать."""
+
+    def close(self):
+        """Нечего закрывать."""
+
+
+class ChatBoard:
+    """Статусы работ чата по имени, история изменений и пауза.
+
+    В отличие от ChangeIndex хранит имена работ, поэтому команды
+    /status и /history отвечают без запроса к API.
+    """
+
+    __slots__ = ('statuses', 'history', 'paused', 'style')
+
+    def __init__(self, history_size=HISTORY_SIZE, style=None):
+        """Конструктор класса."""
+        self.statuses = {}
+        self.history = deque(maxlen=history_size)
+        self.paused = False
+        self.style = style
+
+    def update(self, name, status, date, changed=True):
+        """Сохраняет статус; изменение попадает в историю."""
+        previous = self.statuses.get(name)
+        self.statuses[name] = (status, date)
+        if changed and (previous is None or previous[0] != status):
+            self.history.append((date, name, status))
+
+    def track(self, homework, changed):
+        """Учитывает работу из ответа API.
+
+        Неизменившаяся работа записывается, только если ее еще нет
+        (например, после перезапуска с долговременным хранилищем).
+        """
+        name = homework.get('homework_name')
+        if changed or name not in self.statuses:
+            self.update(name, homework.get('status'),
+                        homework.get('date_updated'), changed)
+
+    def track_unchanged(self, homeworks):
+        """Учитывает разобранные работы без смены статуса.
+
+        Проверка, есть ли работа на доске, идет внутри map(): в ответе
+        почти все работы уже известны.
+        """
+        names = map(itemgetter('homework_name'), homeworks)
+        known = map(self.statuses.__contains__, names)
+        for homework in compress(homeworks, map(not_, known)):
+            self.track(homework, False)
+
+
+class StatusBoard:
+    """Доски чатов (ChatBoard) по идентификатору чата."""
+
+    def __init__(self, history_size=HISTORY_SIZE):
+        """Конструктор класса."""
+        self.history_size = history_size
+        self._chats = {}
+
+    def chat(self, chat_id):
+        """Доска чата (создается при первом обращении)."""
+        key = str(chat_id)
+        board = self._chats.get(key)
+        if board is None:
+            board = self._chats.setdefault(key,
+                                           ChatBoard(self.history_size))
+        return board
+
+    def get(self, chat_id):
+        """Доска чата или None, если чат неизвестен."""
+        return self._chats.get(str(chat_id))
+
+    def __len__(self):
+        """Количество чатов."""
+        return len(self._chats)
+
+
+class Snapshot:
+    """Неизменяемая хэш-таблица с открытой адресацией в файле.
+
+    Формат: заголовок, JSON-список значений, массив хэшей ключей (Q)
+    и массив номеров значений (H) одинаковой длины.
+    """
+
+    def __init__(self, hashes, codes, values, count, mm=None):
+        """Конструктор класса."""
+        self.hashes = hashes
+        self.codes = codes
+        self.values = values
+        self.count = count
+        self.mask = len(hashes) - 1
+        self._mm = mm
+
+    @classmethod
+    def empty(cls):
+        """Пустой снимок."""
+        return cls(array('Q', [EMPTY]), array('H', [0]), [], 0)
+
+    @classmethod
+    def open(cls, path):
+        """Открывает снимок через mmap, не читая таблицу в память."""
+        with open(path, 'rb') as file:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, capacity, count, values_size = HEADER.unpack_from(mm)
+        if magic != MAGIC:
+            mm.close()
+            raise ValueError(f'{path} не является снимком статусов')
+        offset = HEADER.size
+        values = json.loads(mm[offset:offset + values_size])
+        offset = align(offset + values_size)
+        view = memoryview(mm)
+        hashes = view[offset:offset + capacity * 8].cast('Q')
+        offset += capacity * 8
+        codes = view[offset:offset + capacity * 2].cast('H')
+        return cls(hashes, codes, values, count, mm)
+
+    @staticmethod
+    def write(path, items, count):
+        """Записывает снимок из пар (хэш, значение) атомарно."""
+        capacity = 2
+        while capacity < count * 2:
+            capacity *= 2
+        mask = capacity - 1
+        hashes = array('Q', [EMPTY]) * capacity
+        codes = array('H', [0]) * capacity
+        values = []
+        value_codes = {}
+        for hashed, value in items:
+            code = value_codes.get(value)
+            if code is None:
+                code = value_codes[value] = len(values)
+                values.append(value)
+            slot = hashed & mask
+            while hashes[slot] != EMPTY and hashes[slot] != hashed:
+                slot = (slot + 1) & mask
+            hashes[slot] = hashed
+            codes[slot] = code
+        encoded = json.dumps(values).encode()
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, capacity, count, len(encoded)))
+            file.write(encoded)
+            file.write(b'\0' * (align(file.tell()) - file.tell()))
+            hashes.tofile(file)
+            codes.tofile(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        fsync_dir(path)
+
+    def get(self, hashed):
+        """Возвращает значение по хэшу ключа или None."""
+        hashes = self.hashes
+        slot = hashed & self.mask
+        while True:
+            current = hashes[slot]
+            if current == hashed:
+                return self.values[self.codes[slot]]
+            if current == EMPTY:
+                return None
+            slot = (slot + 1) & self.mask
+
+    def items(self):
+        """Перебирает пары (хэш, значение)."""
+        values = self.values
+        for slot, hashed in enumerate(self.hashes):
+            if hashed != EMPTY:
+                yield hashed, values[self.codes[slot]]
+
+    def close(self):
+        """Освобождает mmap."""
+        if self._mm is not None:
+            self.hashes.release()
+            self.codes.release()
+            self._mm.close()
+            self._mm = None
+
+
+class LogStatusStore:
+    """Долговременное хранилище статусов: снимок и журнал изменений.
+
+    Каждая запись сразу уходит в ОС, поэтому перезапуск процесса ничего
+    не теряет; fsync выполняется пачками для защиты от сбоя питания.
+    """
+
+    def __init__(self, path, fsync_every=FSYNC_EVERY,
+                 fsync_interval=FSYNC_INTERVAL,
+                 compact_threshold=COMPACT_THRESHOLD):
+        """Конструктор класса."""
+        self.snapshot_path = f'{path}.snapshot'
+        self.log_path = f'{path}.log'
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_threshold = compact_threshold
+        self._snapshot = (Snapshot.open(self.snapshot_path)
+                          if os.path.exists(self.snapshot_path)
+                          else Snapshot.empty())
+        self._overlay = {}
+        self._count = self._snapshot.count
+        self.index = ChangeIndex()
+        self._replay()
+        self._log = open(self.log_path, 'ab', buffering=0)
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+
+    def _replay(self):
+        """Проигрывает журнал; оборванная последняя запись отбрасывается."""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as file:
+            data = file.read()
+        offset = 0
+        while offset + RECORD.size <= len(data):
+            hashed, size = RECORD.unpack_from(data, offset)
+            end = offset + RECORD.size + size
+            if end > len(data):
+                break
+            self._apply(hashed, data[offset + RECORD.size:end].decode())
+            offset = end
+        if offset != len(data):
+            with open(self.log_path, 'r+b') as file:
+                file.truncate(offset)
+
+    def _apply(self, hashed, value):
+        """Применяет изменение к памяти."""
+        if hashed not in self._overlay and self._snapshot.get(hashed) is None:
+            self._count += 1
+        self._overlay[hashed] = value
+
+    def get(self, key, default=None):
+        """Возвращает статус по ключу."""
+        hashed = key_hash(key)
+        value = self._overlay.get(hashed)
+        if value is None:
+            value = self._snapshot.get(hashed)
+        return default if value is None else value
+
+    def __setitem__(self, key, value):
+        """Сохраняет статус и дописывает изменение в журнал."""
+        hashed = key_hash(key)
+        encoded = value.encode()
+        self._log.write(RECORD.pack(hashed, len(encoded)) + encoded)
+        self._apply(hashed, value)
+        self._pending += 1
+        if (self._pending >= self.fsync_every
+                or time.monotonic() - self._last_fsync >= self.fsync_interval):
+            self.flush()
+        if len(self._overlay) >= self.compact_threshold:
+            self.compact()
+
+    def __contains__(self, key):
+        """Проверяет наличие ключа."""
+        return self.get(key) is not None
+
+    def __len__(self):
+        """Количество ключей."""
+        return self._count
+
+    def view(self, prefix):
+        """Кэш статусов подписки: индекс в памяти поверх хранилища."""
+        return self.index.view(prefix, StoreView(self, prefix))
+
+    def flush(self):
+        """Сбрасывает журнал на диск."""
+        if self._pending:
+            os.fsync(self._log.fileno())
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+
+    def compact(self):
+        """Сливает журнал в новый снимок и очищает журнал."""
+        self.flush()
+        overlay = self._overlay
+        items = [(hashed, value) for hashed, value in self._snapshot.items()
+                 if hashed not in overlay]
+        items.extend(overlay.items())
+        Snapshot.write(self.snapshot_path, items, len(items))
+        self._snapshot.close()
+        self._snapshot = Snapshot.open(self.snapshot_path)
+        self._overlay = {}
+        self._log.close()
+        self._log = open(self.log_path, 'wb', buffering=0)
+        os.fsync(self._log.fileno())
+        self._log.close()
+        self._log = open(self.log_path, 'ab', buffering=0)
+
+    def close(self):
+        """Сбрасывает журнал и закрывает файлы."""
+        self.flush()
+        self._log.close()
+        self._snapshot.close()
+
+
+class CursorStore:
+    """Водяные знаки from_date подписок.
+
+    Файл перезаписывается атомарно не чаще раза в flush_interval секунд.
+    Если процесс упадет раньше, водяной знак откатится назад, и работы
+    запросятся повторно: повторных уведомлений не будет, их отсекает
+    хранилище статусов.
+    """
+
+    def __init__(self, path, flush_interval=CURSOR_FLUSH_INTERVAL):
+        """Конструктор класса."""
+        self.path = path
+        self.flush_interval = flush_interval
+        self._cursors = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                self._cursors = json.load(file)
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+    def get(self, key, default=None):
+        """Возвращает водяной знак подписки."""
+        return self._cursors.get(key, default)
+
+    def __setitem__(self, key, value):
+        """Сохраняет водяной знак."""
+        if self._cursors.get(key) == value:
+            return
+        self._cursors[key] = value
+        self._dirty = True
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def __len__(self):
+        """Количество подписок."""
+        return len(self._cursors)
+
+    def flush(self):
+        """Атомарно записывает файл, если были изменения."""
+        if self._dirty:
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self._cursors, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """Сбрасывает изменения на диск."""
+        self.flush()
+
+
+def align(offset, size=8):
+    """Выравнивает смещение."""
+    return (offset + size - 1) // size * size
+
+
+def fsync_dir(path):
+    """Фиксирует переименование файла в каталоге."""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def open_store(path=STATE_FILE):
+    """Открывает долговременное хранилище, если задан путь."""
+    if path:
+        return LogStatusStore(path)
+    return ChangeIndex()
+
+
+def open_cursors(path=STATE_FILE):
+    """Открывает хранилище водяных знаков рядом с хранилищем статусов."""
+    if path:
+        return CursorStore(f'{path}.cursors')
+    return MemoryStatusStore()
@@ -0,0 +1,210 @@
+"""
+Потоковый разбор ответа API ЯндексПрактикум.
+
+Домашние работы из массива "homeworks" выдаются по одной по мере чтения
+ответа из сокета, поэтому пиковая память не зависит от размера ответа.
+Остальные ключи верхнего уровня (current_date) доступны после разбора
+в HomeworkStream.fields.
+"""
+
+import codecs
+import json
+import os
+import re
+import time
+from http import HTTPStatus
+
+import breaker
+import exceptions as ex
+import homework
+import metrics
+import transport
+
+STREAMING = os.getenv('STREAMING', '') == '1'
+CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 64 * 1024))
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class HomeworkStream:
+    """Итератор по работам из потока байтов с JSON-ответом API."""
+
+    def __init__(self, chunks, close=None):
+        """Конструктор класса.
+
+        chunks: итерируемый объект с кусками тела ответа (bytes).
+        close: функция, освобождающая соединение после разбора.
+        """
+        self.fields = {}
+        self.found = False
+        self._chunks = iter(chunks)
+        self._close = close
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _more(self):
+        """Дочитывает следующий кусок; False, если поток закончился."""
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            text = self._text.decode(b'', final=True)
+        else:
+            text = self._text.decode(chunk)
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return True
+
+    def _error(self, message):
+        """Ошибка разбора в текущей позиции."""
+        return json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def _peek(self):
+        """Пропускает пробелы и возвращает следующий символ."""
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._more():
+                raise self._error('Неожиданный конец ответа API')
+
+    def _expect(self, *chars):
+        """Читает один из ожидаемых символов-разделителей."""
+        char = self._peek()
+        if char not in chars:
+            raise self._error(f'Ожидался один из символов {chars}')
+        self._pos += 1
+        return char
+
+    def _value(self):
+        """Читает одно JSON-значение целиком."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._more():
+                    raise
+                continue
+            # Число в конце буфера может продолжиться в следующем куске.
+            if end == len(self._buffer) and self._more():
+                continue
+            self._pos = end
+            return value
+
+    def _homeworks(self):
+        """Выдает элементы массива homeworks."""
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(',', ']') == ']':
+                return
+
+    def __iter__(self):
+        """Разбирает объект верхнего уровня, выдавая работы по одной."""
+        try:
+            self._expect('{')
+            if self._peek() == '}':
+                return
+            while True:
+                key = self._value()
+                self._expect(':')
+                if key == 'homeworks' and self._peek() == '[':
+                    self.found = True
+                    yield from self._homeworks()
+                else:
+                    self.fields[key] = self._value()
+                if self._expect(',', '}') == '}':
+                    return
+        finally:
+            self.close()
+
+    def close(self):
+        """Освобождает соединение."""
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+
+def check_stream(stream):
+    """Потоковый аналог check_response: проверяет и выдает работы."""
+    count = 0
+    for item in stream:
+        count += 1
+        yield item
+    if 'homeworks' in stream.fields:
+        raise ex.HomeworksTypeError('Ключ "homeworks" не является словарем')
+    if not stream.found:
+        raise ex.KeyError('Ответ API не содержит ключа "homeworks"')
+    if count == 0:
+        raise ex.HomeworksEmptyError('В настоящее время на проверке нет '
+                                     'ни одной домашней работы.')
+
+
+def stream_api_answer_for(token, current_timestamp, chunk_size=CHUNK_SIZE):
+    """Запрашивает статусы и возвращает HomeworkStream без чтения тела.
+
+    Задержка в метриках - время до заголовков ответа. Если включена
+    запись ответов (recording.py), успешный ответ записывается при
+    закрытии потока.
+    """
+    import requests
+
+    circuit = breaker.for_endpoint(homework.ENDPOINT)
+    circuit.before_request()
+    headers = homework.auth_headers(token)
+    started = time.perf_counter()
+    ok = False
+    try:
+        response = transport.http_get(
+            homework.ENDPOINT, headers=headers,
+            params=homework.api_params(current_timestamp), stream=True
+        )
+        ok = breaker.healthy(response.status_code)
+    except requests.exceptions.RequestException as error:
+        homework.record_exchange(headers, None, started)
+        raise ex.SystemExit(f'Эндпоинт не доступен: {error}')
+    finally:
+        metrics.API_LATENCY.observe(time.perf_counter() - started)
+        circuit.record(ok)
+    if response.status_code != HTTPStatus.OK:
+        homework.record_exchange(headers, response, started)
+        response.close()
+        raise ex.EndpointAccessError(f'Проблема с доступом к '
+                                     f'{homework.ENDPOINT}. Код ответа: '
+                                     f'{response.status_code}')
+    chunks = response.iter_content(chunk_size)
+    if homework.api_recorder is None:
+        return HomeworkStream(chunks, response.close)
+    return HomeworkStream(*recorded(chunks, headers, response, started))
+
+
+def recorded(chunks, headers, response, started):
+    """Куски тела и закрытие, которое записывает ответ целиком.
+
+    HomeworkStream перестает читать после конца JSON, поэтому закрытие
+    дочитывает остаток тела. Тело на время чтения копится в памяти:
+    только при включенной записи.
+    """
+    body = []
+
+    def tee():
+        for chunk in chunks:
+            body.append(chunk)
+            yield chunk
+
+    stream = tee()
+
+    def close():
+        for _ in stream:
+            pass
+        homework.record_exchange(headers, response, started, b''.join(body))
+        response.close()
+
+    return stream, close
@@ -0,0 +1,188 @@
+"""
+Реестр подписок бота.
+
+Подписка связывает токен ЯндексПрактикум с чатом Telegram.
+Один процесс обслуживает сколько угодно подписок.
+"""
+
+import hashlib
+import os
+import time
+
+import state
+import templates
+
+
+SUBSCRIPTIONS_FILE = os.getenv('SUBSCRIPTIONS_FILE')
+
+
+class Subscription:
+    """Подписка: токен Практикума, чат Telegram и состояние опроса."""
+
+    __slots__ = ('token', 'chat_id', 'timestamp', 'status_cache',
+                 'mode', 'failures', 'style', 'board', 'seen_version')
+
+    def __init__(self, token, chat_id, timestamp=0, status_cache=None,
+                 style=templates.DEFAULT_STYLE, board=None):
+        """Конструктор класса.
+
+        style: язык и формат сообщений чата (templates.Style).
+        board: статусы и пауза чата для команд (state.ChatBoard).
+        """
+        self.token = token
+        self.chat_id = chat_id
+        self.timestamp = timestamp
+        self.style = style
+        self.status_cache = (status_cache if status_cache is not None
+                             else state.ChangeIndex().view(self.namespace))
+        self.board = board if board is not None else state.ChatBoard()
+        self.mode = None
+        self.failures = 0
+        # Версия последнего разобранного ответа из кэша (httpcache.py).
+        self.seen_version = None
+
+    @property
+    def key(self):
+        """Уникальный ключ подписки."""
+        return (self.token, self.chat_id)
+
+    @property
+    def namespace(self):
+        """Префикс ключей подписки в хранилище (без самого токена)."""
+        return namespace(self.token, self.chat_id)
+
+    @property
+    def user(self):
+        """Студент подписки в истории статусов: хэш токена."""
+        return token_digest(self.token)
+
+    def __repr__(self):
+        """Не выводим токен целиком."""
+        return f'Subscription({self.token[:4]}..., {self.chat_id})'
+
+
+class SubscriptionRegistry:
+    """Реестр подписок: токен --> чаты.
+
+    Кэши статусов подписок хранятся под префиксом подписки в общем
+    хранилище статусов (state.py); по умолчанию - в одном индексе
+    state.ChangeIndex в памяти. Если передано хранилище водяных
+    знаков, from_date подписок переживает перезапуск. Подписки одного
+    чата делят доску статусов чата (board) для команд бота.
+    """
+
+    def __init__(self, store=None, cursors=None):
+        """Конструктор класса."""
+        self.store = store if store is not None else state.ChangeIndex()
+        self.cursors = cursors
+        self.board = state.StatusBoard()
+        self._subscriptions = {}
+
+    def add(self, token, chat_id, timestamp=0, style=None):
+        """Добавляет подписку, если ее еще нет, и возвращает ее.
+
+        Новая подписка без сохраненного водяного знака начинает
+        с текущего момента. Переданный style заменяет стиль сообщений
+        и у уже существующей подписки.
+        """
+        key = (token, chat_id)
+        subscription = self._subscriptions.get(key)
+        if subscription is None:
+            prefix = namespace(token, chat_id)
+            status_cache = self.store.view(prefix)
+            if self.cursors is not None:
+                timestamp = (self.cursors.get(prefix) or timestamp
+                             or int(time.time()))
+                self.cursors[prefix] = timestamp
+            subscription = Subscription(token, chat_id, timestamp,
+                                        status_cache,
+                                        board=self.board.chat(chat_id))
+            self._subscriptions[key] = subscription
+        if style is not None:
+            subscription.style = style
+        subscription.board.style = subscription.style
+        return subscription
+
+    def save_cursor(self, subscription):
+        """Сохраняет водяной знак from_date подписки."""
+        if self.cursors is not None:
+            self.cursors[subscription.namespace] = subscription.timestamp
+
+    def remove(self, token, chat_id):
+        """Удаляет подписку."""
+        self._subscriptions.pop((token, chat_id), None)
+
+    def get(self, token, chat_id):
+        """Возвращает подписку или None."""
+        return self._subscriptions.get((token, chat_id))
+
+    def chats(self, token):
+        """Возвращает чаты, подписанные на токен."""
+        return [subscription.chat_id
+                for subscription in self._subscriptions.values()
+                if subscription.token == token]
+
+    def __iter__(self):
+        """Перебирает подписки в порядке добавления."""
+        return iter(list(self._subscriptions.values()))
+
+    def __len__(self):
+        """Количество подписок."""
+        return len(self._subscriptions)
+
+    def __contains__(self, key):
+        """Проверяет наличие подписки по ключу (токен, чат)."""
+        return key in self._subscriptions
+
+
+def token_digest(token):
+    """Хэш токена: различает студентов, не раскрывая токен."""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def namespace(token, chat_id):
+    """Префикс ключей подписки: чат и хэш токена."""
+    return f'{chat_id}:{token_digest(token)}'
+
+
+def parse_subscriptions(lines, registry=None):
+    """Заполняет реестр строками вида "<токен> <chat_id> [опции]".
+
+    Опции задают сообщения чата: locale=en, format=html|markdown,
+    comments=1 (по умолчанию - настройки окружения, см. templates.py).
+    Пустые строки и строки, начинающиеся с #, пропускаются.
+    """
+    registry = registry if registry is not None else SubscriptionRegistry()
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            token, chat_id, *options = line.split()
+            style = parse_style(options)
+        except ValueError as error:
+            raise ValueError(f'Строка {number}: ожидается '
+                             f'"<токен> <chat_id> [опции]" ({error})')
+        registry.add(token, chat_id, style=style)
+    return registry
+
+
+def parse_style(options):
+    """Стиль сообщений из опций вида "ключ=значение"."""
+    settings = {'locale': templates.MESSAGE_LOCALE,
+                'format': templates.MESSAGE_FORMAT,
+                'comments': '1' if templates.MESSAGE_COMMENTS else '0'}
+    for option in options:
+        name, _, value = option.partition('=')
+        if name not in settings or not value:
+            raise ValueError(f'неизвестная опция "{option}"')
+        settings[name] = value
+    return templates.make_style(settings['locale'], settings['format'],
+                                settings['comments'] == '1')
+
+
+def load_subscriptions(path=SUBSCRIPTIONS_FILE, store=None, cursors=None):
+    """Загружает реестр подписок из файла."""
+    with open(path, encoding='utf-8') as file:
+        return parse_subscriptions(file,
+                                   SubscriptionRegistry(store, cursors))
@@ -0,0 +1,195 @@
+"""
+Шаблоны сообщений об изменении статуса.
+
+Каждому статусу соответствует шаблон на каждом языке. Шаблон
+компилируется один раз для пары (язык, формат): литералы сразу
+экранируются для разметки, поля подставляются при выводе. Формат -
+text, markdown (MarkdownV2 Telegram) или html. В шаблоне поле можно
+выделить: {name:b} - жирным, {comment:i} - курсивом.
+
+Готовые сообщения кэшируются (LRU): одно изменение, разосланное
+нескольким чатам с одинаковыми настройками, форматируется один раз.
+
+Настройки окружения (по умолчанию для всех чатов):
+MESSAGE_LOCALE - язык (ru, en);
+MESSAGE_FORMAT - text, markdown или html;
+MESSAGE_COMMENTS - 1, чтобы добавлять комментарий ревьюера;
+RENDER_CACHE_SIZE - размер кэша готовых сообщений.
+"""
+
+import functools
+import html
+import os
+import re
+from collections import namedtuple
+from string import Formatter
+
+MESSAGE_LOCALE = os.getenv('MESSAGE_LOCALE', 'ru')
+MESSAGE_FORMAT = os.getenv('MESSAGE_FORMAT', 'text')
+MESSAGE_COMMENTS = os.getenv('MESSAGE_COMMENTS', '') == '1'
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', 4096))
+
+STATUSES = ('approved', 'reviewing', 'rejected')
+LOCALES = {
+    'ru': {
+        'changed': ('Изменился статус проверки работы "{name:b}". '
+                    '{verdict}{comment}'),
+        'comment': '\nКомментарий ревьюера: {comment:i}',
+        'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
+        'reviewing': 'Работа взята на проверку ревьюером.',
+        'rejected': 'Работа проверена: у ревьюера есть замечания.',
+        'outage': ('API Практикума недоступно, проверка статусов '
+                   'приостановлена. Сообщу, когда оно восстановится.'),
+        'recovered': ('API Практикума снова доступно, проверка статусов '
+                      'возобновлена.'),
+        'status_line': '{name:b}: {verdict}',
+        'no_status': 'Пока нет данных о работах.',
+        'history_line': '{date} {name:b}: {verdict}',
+        'no_history': 'Статусы работ пока не менялись.',
+        'paused': 'Уведомления приостановлены. /resume - возобновить.',
+        'resumed': 'Уведомления возобновлены.',
+        'not_subscribed': 'Этот чат не подписан на уведомления.',
+        'help': ('Команды: /status - статусы работ, /history - последние '
+                 'изменения, /pause и /resume - приостановить '
+                 'и возобновить уведомления.'),
+    },
+    'en': {
+        'changed': ('Review status of "{name:b}" has changed. '
+                    '{verdict}{comment}'),
+        'comment': '\nReviewer comment: {comment:i}',
+        'approved': 'The work is reviewed: the reviewer liked it. Hooray!',
+        'reviewing': 'The work is being reviewed.',
+        'rejected': 'The work is reviewed: the reviewer has remarks.',
+        'outage': ('The Practicum API is unavailable, status checks are '
+                   'paused. I will let you know when it recovers.'),
+        'recovered': ('The Practicum API is available again, status checks '
+                      'are resumed.'),
+        'status_line': '{name:b}: {verdict}',
+        'no_status': 'No homework data yet.',
+        'history_line': '{date} {name:b}: {verdict}',
+        'no_history': 'No status changes yet.',
+        'paused': 'Notifications are paused. /resume to resume them.',
+        'resumed': 'Notifications are resumed.',
+        'not_subscribed': 'This chat is not subscribed to notifications.',
+        'help': ('Commands: /status - homework statuses, /history - recent '
+                 'changes, /pause and /resume - pause and resume '
+                 'notifications.'),
+    },
+}
+PARSE_MODES = {'text': None, 'markdown': 'MarkdownV2', 'html': 'HTML'}
+MARKUP = {
+    'text': {},
+    'markdown': {'b': '*{}*', 'i': '_{}_'},
+    'html': {'b': '<b>{}</b>', 'i': '<i>{}</i>'},
+}
+MARKDOWN_SPECIAL = re.compile(r'([_*\[\]()~`>#+\-=|{}.!\\])')
+
+
+class Markup(str):
+    """Уже отформатированный текст: повторно не экранируется."""
+
+    __slots__ = ()
+
+
+def escape(text, fmt):
+    """Экранирует текст для разметки формата fmt."""
+    if isinstance(text, Markup) or fmt == 'text':
+        return text
+    if fmt == 'html':
+        return html.escape(text, quote=False)
+    return MARKDOWN_SPECIAL.sub(r'\\\1', text)
+
+
+class Style(namedtuple('Style', ('locale', 'fmt', 'comments'))):
+    """Настройки сообщений чата: язык, формат, комментарий ревьюера."""
+
+    __slots__ = ()
+
+    @property
+    def parse_mode(self):
+        """parse_mode для Bot API (None - обычный текст)."""
+        return PARSE_MODES[self.fmt]
+
+
+def make_style(locale=MESSAGE_LOCALE, fmt=MESSAGE_FORMAT,
+               comments=MESSAGE_COMMENTS):
+    """Проверяет настройки и возвращает Style."""
+    if locale not in LOCALES:
+        raise ValueError(f'Неизвестный язык "{locale}"')
+    if fmt not in PARSE_MODES:
+        raise ValueError(f'Неизвестный формат "{fmt}"')
+    return Style(locale, fmt, bool(comments))
+
+
+DEFAULT_STYLE = make_style()
+
+
+class Template:
+    """Скомпилированный шаблон: экранированные литералы и поля."""
+
+    __slots__ = ('fmt', 'parts')
+
+    def __init__(self, source, fmt):
+        """Разбирает шаблон один раз."""
+        self.fmt = fmt
+        parts = []
+        for literal, field, spec, _ in Formatter().parse(source):
+            if literal:
+                parts.append(escape(literal, fmt))
+            if field is not None:
+                parts.append((field, MARKUP[fmt].get(spec)))
+        self.parts = tuple(parts)
+
+    def render(self, **fields):
+        """Подставляет экранированные значения полей."""
+        chunks = []
+        for part in self.parts:
+            if type(part) is str:
+                chunks.append(part)
+                continue
+            field, markup = part
+            value = fields[field]
+            value = escape(value if isinstance(value, str) else str(value),
+                           self.fmt)
+            chunks.append(markup.format(value) if markup and value
+                          else value)
+        return Markup(''.join(chunks))
+
+
+@functools.lru_cache(maxsize=None)
+def template(locale, key, fmt):
+    """Скомпилированный шаблон (компилируется при первом обращении)."""
+    return Template(LOCALES[locale][key], fmt)
+
+
+@functools.lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_change(style, name, status, comment=''):
+    """Сообщение об изменении статуса работы в стиле чата.
+
+    Комментарий добавляется, только если он включен в стиле.
+    """
+    if style.comments and comment:
+        comment = template(style.locale, 'comment', style.fmt).render(
+            comment=comment
+        )
+    else:
+        comment = ''
+    verdict = template(style.locale, status, style.fmt).render()
+    return str(template(style.locale, 'changed', style.fmt).render(
+        name=name, verdict=verdict, comment=Markup(comment)
+    ))
+
+
+def render_notice(style, key, **fields):
+    """Служебное сообщение (уведомление, ответ на команду) по ключу."""
+    return str(template(style.locale, key, style.fmt).render(**fields))
+
+
+def render_text(style, text):
+    """Произвольный текст (например, ошибка) в формате чата."""
+    return escape(text, style.fmt)
+
+
+def verdicts(locale='ru'):
+    """Вердикты по статусам на заданном языке."""
+    return {status: LOCALES[locale][status] for status in STATUSES}
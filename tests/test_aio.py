@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import httpx
+
+import aio
+import homework
+from benchmarks.fake_servers import FakePracticum, FakeTelegram, make_homeworks
+from subscriptions import SubscriptionRegistry
+
+
+class TestAsyncPoller:
+
+    def test_async_get_api_answer(self, monkeypatch, current_timestamp):
+        async def fetch():
+            async with httpx.AsyncClient() as client:
+                return await aio.async_get_api_answer(client,
+                                                      int(current_timestamp))
+
+        with FakePracticum({None: make_homeworks(2)}) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            result = asyncio.run(fetch())
+        assert len(result['homeworks']) == 2, (
+            'Проверьте, что `async_get_api_answer` возвращает ответ API'
+        )
+        assert homework.check_response(result), (
+            'Проверьте, что ответ `async_get_api_answer` совместим '
+            'с `check_response`'
+        )
+
+    def test_bounded_concurrency(self, monkeypatch):
+        registry = SubscriptionRegistry()
+        for number in range(20):
+            registry.add(f'token{number}', number)
+        data = {None: make_homeworks(1, status='approved')}
+
+        async def poll_all(telegram):
+            async with httpx.AsyncClient() as client:
+                bot = aio.AsyncBot('1234:abc', client,
+                                   base_url=telegram.base_url)
+                poller = aio.AsyncPoller(registry, bot, client,
+                                         concurrency=5)
+                await poller.run_once()
+
+        with FakePracticum(data, latency=0.1) as server, \
+                FakeTelegram() as telegram:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            started = time.monotonic()
+            asyncio.run(poll_all(telegram))
+            elapsed = time.monotonic() - started
+        assert server.max_in_flight <= 5, (
+            'Проверьте, что семафор ограничивает число запросов в полете'
+        )
+        assert elapsed < 20 * 0.1, (
+            'Проверьте, что запросы разных подписок перекрываются по времени'
+        )
+        assert len(telegram.sent) == 20, (
+            'Проверьте, что сообщения отправляются через `AsyncBot`'
+        )
@@ -0,0 +1,115 @@
+import pytest
+
+import alerts
+import exceptions as ex
+import homework
+import httpcache
+from benchmarks.fake_servers import FakeBot, FakePracticum, make_homeworks
+from poller import Poller
+from subscriptions import SubscriptionRegistry
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def fresh_errors(monkeypatch):
+    monkeypatch.setattr(alerts, 'ERRORS', alerts.ErrorAggregator())
+
+
+class TestAlerts:
+
+    def test_lru_dedup_and_digest_window(self):
+        clock = FakeClock()
+        errors = alerts.ErrorAggregator(window=60, capacity=2, clock=clock)
+        first = ex.UnknownStatusError('Неизвестный статус "lost"')
+        assert errors.add('chat', first, {'homework_name': 'hw1'})
+        assert errors.digest('chat') == f'{first}', (
+            'Проверьте, что первая ошибка уходит сразу своим текстом'
+        )
+        assert not errors.add('chat', first, {'homework_name': 'hw1'}), (
+            'Проверьте, что отправленная ошибка не повторяется'
+        )
+        errors.add('chat', ex.KeyError('Нет ключа'), {'id': 2})
+        errors.add('chat', ex.KeyError('Нет ключа'), {'id': 2})
+        errors.add('chat', ex.HomeworksEmptyError('Нет работ'))
+        assert errors.digest('chat') is None, (
+            'Проверьте, что сводка отправляется не чаще раза в окно'
+        )
+        clock.now = 60
+        digest = errors.digest('chat')
+        assert digest.splitlines() == [
+            'Ошибки при опросе API: 2', f'- {ex.KeyError("Нет ключа")} (x2)',
+            '- Нет работ',
+        ], 'Проверьте текст сводки ошибок за окно'
+        assert len(errors) == 2 and errors.add(
+            'chat', first, {'homework_name': 'hw1'}
+        ), 'Проверьте, что LRU ограничен и вытесняет старые ошибки'
+        errors.resolve('chat')
+        assert len(errors) == 0 and errors.add('chat', ex.KeyError('Нет ключа'),
+                                               {'id': 2}), (
+            'Проверьте, что после опроса без ошибок ошибка снова новая'
+        )
+
+    def test_bad_homeworks_reported_once_per_digest(self, monkeypatch):
+        registry = SubscriptionRegistry()
+        subscription = registry.add('token1', 1, timestamp=1)
+        works = make_homeworks(4, status='approved')
+        works[1]['status'] = 'lost'
+        del works[2]['homework_name']
+        bot = FakeBot()
+        with FakePracticum({'token1': works}) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            poller = Poller(registry, bot)
+            poller.poll(subscription)
+            poller.poll(subscription)
+        texts = [text for _, text in bot.sent]
+        assert len(texts) == 3, (
+            'Проверьте, что валидные работы уведомляются, а ошибки двух '
+            'работ уходят одной сводкой один раз'
+        )
+        assert texts[-1].startswith('Ошибки при опросе API: 2')
+
+    def test_bad_homework_skipped_after_repeated_polls(self, monkeypatch):
+        monkeypatch.setattr(alerts, 'ERROR_SKIP_AFTER', 3)
+        registry = SubscriptionRegistry()
+        subscription = registry.add('token1', 1, timestamp=1)
+        works = make_homeworks(2, status='approved')
+        works[1].update(status='lost', date_updated='2022-02-13T14:50:00Z')
+        bot = FakeBot()
+        with FakePracticum({'token1': works}, validators=True,
+                           by_date=True) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            httpcache.configure()
+            try:
+                poller = Poller(registry, bot)
+                for _ in range(2):
+                    poller.poll(subscription)
+                assert subscription.timestamp == 1, (
+                    'Проверьте, что работа с ошибкой держит from_date'
+                )
+                poller.poll(subscription)
+                returned = homework.get_api_answer_for(
+                    'token1', subscription.timestamp
+                )['homeworks']
+            finally:
+                httpcache.disable()
+        assert server.not_modified == 2
+        assert all(item['id'] != 2 for item in returned), (
+            'Проверьте, что после ERROR_SKIP_AFTER опросов подряд from_date '
+            'сдвигается мимо работы с ошибкой и она больше не приходит'
+        )
+        undated = {'homework_name': 'hw3.zip', 'status': 'lost',
+                   'date_updated': 'вчера'}
+        skipped = homework.skip_date([(undated, ex.KeyError('x'))], 100,
+                                     current_date=200)
+        assert skipped == 200, (
+            'Проверьте, что работа без читаемой даты пропускается '
+            'до current_date ответа, а не до текущего времени'
+        )
@@ -0,0 +1,120 @@
+from http import HTTPStatus
+
+import pytest
+
+import breaker
+import homework
+import metrics
+import templates
+from benchmarks.fake_servers import FakePracticum, make_homeworks
+from poller import Poller
+from subscriptions import parse_subscriptions
+
+
+class RecordingBot:
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((chat_id, text))
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers():
+    breaker.reset()
+    yield
+    breaker.reset()
+
+
+def state_metric(endpoint):
+    return f'homework_circuit_breaker_state{{endpoint="{endpoint}"}} '
+
+
+class TestBreaker:
+
+    def test_half_open_lets_one_probe(self):
+        clock = Clock()
+        circuit = breaker.CircuitBreaker('api', failure_threshold=2,
+                                         reset_timeout=10, clock=clock)
+        circuit.record(False)
+        assert circuit.allow() and circuit.state == breaker.CLOSED
+        circuit.record(False)
+        assert circuit.state == breaker.OPEN
+        assert not circuit.allow(), (
+            'Проверьте, что разомкнутый выключатель не пропускает запросы'
+        )
+        clock.now = 10
+        assert circuit.allow() and circuit.state == breaker.HALF_OPEN
+        assert not circuit.allow(), (
+            'Проверьте, что в half-open пропускается один пробный запрос'
+        )
+        circuit.record(False)
+        assert circuit.state == breaker.OPEN and not circuit.allow(), (
+            'Проверьте, что неудачная проба снова размыкает выключатель'
+        )
+        clock.now = 20
+        assert circuit.allow()
+        circuit.record(True)
+        assert circuit.state == breaker.CLOSED and circuit.allow()
+
+    def test_outage_is_announced_once(self, monkeypatch):
+        registry = parse_subscriptions(['token1 1', 'token2 1', 'token3 2'])
+        bot = RecordingBot()
+        clock = Clock()
+        data = {None: make_homeworks(1, status='approved')}
+        with FakePracticum(data) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            circuit = breaker.for_endpoint(server.url)
+            circuit.failure_threshold = 2
+            circuit.clock = clock
+            poller = Poller(registry, bot)
+            breaker.add_listener(
+                breaker.OutageNotifier.for_registry(registry, poller.deliver)
+            )
+            server.failing = HTTPStatus.SERVICE_UNAVAILABLE
+            for _ in range(3):
+                poller.run_once()
+            assert server.requests == 2, (
+                'Проверьте, что разомкнутый выключатель подавляет запросы'
+            )
+            assert state_metric(server.url) + '1' in metrics.render(), (
+                'Проверьте, что состояние выключателя видно в /metrics'
+            )
+            outage = templates.render_notice(templates.DEFAULT_STYLE,
+                                             'outage')
+            notices = [chat for chat, text in bot.sent if text == outage]
+            assert sorted(notices) == ['1', '2'], (
+                'Проверьте, что в каждый чат уходит одно уведомление '
+                'о недоступности'
+            )
+            assert len(bot.sent) == 3, (
+                'Проверьте, что после размыкания ошибки не рассылаются'
+            )
+            clock.now = breaker.BREAKER_RESET_TIMEOUT
+            poller.run_once()
+            assert server.requests == 3 and len(bot.sent) == 3, (
+                'Проверьте, что в half-open выполняется один пробный запрос'
+            )
+            server.failing = None
+            clock.now *= 2
+            poller.run_once()
+        recovered = templates.render_notice(templates.DEFAULT_STYLE,
+                                            'recovered')
+        assert [chat for chat, text in bot.sent
+                if text == recovered] == ['1', '2'], (
+            'Проверьте, что о восстановлении сообщается один раз в чат'
+        )
+        assert server.requests == 6, (
+            'Проверьте, что после удачной пробы опрос возобновляется'
+        )
+        assert state_metric(server.url) + '0' in metrics.render()
@@ -0,0 +1,226 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import alerts
+import cluster
+import homework
+from benchmarks.fake_servers import FakeBot, FakePracticum, make_homeworks
+from subscriptions import SubscriptionRegistry, parse_subscriptions
+
+TTL = 30
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Узел в отдельном процессе: несколько секунд продлевает аренду
+# и записывает уведомления своих партиций, затем печатает итог.
+COMPETING_NODE = '''
+import json, sys, time
+import cluster
+
+shared = cluster.SharedState(sys.argv[1], node=sys.argv[2], partitions=8,
+                             ttl=2)
+claimed, seen, deadline = 0, set(), time.time() + 3
+while time.time() < deadline:
+    owned = shared.renew()
+    seen |= owned
+    for number in range(200):
+        if number % 8 in owned:
+            claimed += shared.claim(f'note{number}', number % 8)
+shared.close()
+print(json.dumps({'claimed': claimed, 'seen': sorted(seen)}))
+'''
+
+
+class FakeClock:
+
+    def __init__(self, now=1000):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def fresh_errors(monkeypatch):
+    monkeypatch.setattr(alerts, 'ERRORS', alerts.ErrorAggregator())
+
+
+def start_node(path, name, clock, lines):
+    """Узел: свое соединение с общим файлом, свой реестр и бот."""
+    shared = cluster.SharedState(path, node=name, partitions=8, ttl=TTL,
+                                 clock=clock)
+    registry = parse_subscriptions(
+        lines, SubscriptionRegistry(shared, shared.cursors())
+    )
+    # Аренду в тесте продлевает сам тест (keep_leases(force=True)).
+    return cluster.ClusterPoller(registry, FakeBot(), shared,
+                                 renew_interval=3600)
+
+
+def renew(nodes, rounds=2):
+    """Продлевает аренду узлов по очереди, пока доли не выровняются."""
+    for _ in range(rounds):
+        for node in nodes:
+            node.keep_leases(force=True)
+
+
+def sent(nodes):
+    """Все отправленные узлами сообщения."""
+    return [message for node in nodes for message in node.bot.sent]
+
+
+class TestCluster:
+
+    def test_leases_are_balanced_and_claims_fenced(self, tmp_path):
+        clock = FakeClock()
+        path = str(tmp_path / 'cluster.db')
+        first = cluster.SharedState(path, node='a', partitions=8, ttl=TTL,
+                                    clock=clock)
+        assert first.renew() == frozenset(range(8))
+        second = cluster.SharedState(path, node='b', partitions=4, ttl=TTL,
+                                     clock=clock)
+        assert second.partitions == 8, (
+            'Проверьте, что число партиций берется из общего файла'
+        )
+        assert second.renew() == frozenset(), (
+            'Проверьте, что занятые партиции не отбираются'
+        )
+        owned = first.renew()
+        taken = second.renew()
+        assert len(owned) == len(taken) == 4 and not owned & taken, (
+            'Проверьте, что партиции делятся поровну между узлами'
+        )
+        partition = min(owned)
+        assert first.claim('note', partition)
+        assert not first.claim('note', partition), (
+            'Проверьте, что уведомление отправляется один раз'
+        )
+        assert not second.claim('other', partition), (
+            'Проверьте, что чужая партиция не дает отправлять уведомления'
+        )
+        clock.now += TTL
+        assert second.renew() == frozenset(range(8)), (
+            'Проверьте, что партиции узла с истекшей арендой переходят '
+            'к живым узлам'
+        )
+        assert not first.claim('late', partition), (
+            'Проверьте, что узел с истекшей арендой не отправляет '
+            'уведомления'
+        )
+        second.close()
+        assert first.renew() == frozenset(range(8)), (
+            'Проверьте, что остановленный узел отпускает партиции'
+        )
+        first.close()
+
+    def test_failover_never_double_sends(self, tmp_path, monkeypatch):
+        clock = FakeClock()
+        path = str(tmp_path / 'cluster.db')
+        lines = [f'token{number} {number}' for number in range(12)]
+        data = {f'token{number}': make_homeworks(1, prefix=f'token{number}_')
+                for number in range(12)}
+        nodes = [start_node(path, f'node{number}', clock, lines)
+                 for number in range(3)]
+        with FakePracticum(data) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            renew(nodes)
+            owned = [node.owned for node in nodes]
+            assert all(owned) and sum(map(len, owned)) == 8
+            assert frozenset().union(*owned) == frozenset(range(8)), (
+                'Проверьте, что партиции делятся между узлами без пересечений'
+            )
+            for node in nodes:
+                node.run_once()
+            assert sorted(chat for chat, _ in sent(nodes)) == sorted(
+                str(number) for number in range(12)
+            ), 'Проверьте, что каждый чат получает уведомление один раз'
+
+            for works in data.values():
+                works[0]['status'] = 'approved'
+                works[0]['date_updated'] = '2022-02-14T10:00:00Z'
+            zombie, alive = nodes[0], nodes[1:]
+            for _ in range(2):
+                clock.now += TTL // 2 + 1
+                renew(alive, rounds=1)
+            assert frozenset().union(
+                *(node.owned for node in alive)
+            ) == frozenset(range(8)), (
+                'Проверьте, что партиции упавшего узла переходят к живым'
+            )
+            before = len(zombie.bot.sent)
+            zombie.run_once()
+            assert len(zombie.bot.sent) == before, (
+                'Проверьте, что узел с истекшей арендой не отправляет '
+                'уведомления'
+            )
+            for node in alive:
+                node.run_once()
+            renew(nodes)
+            for node in nodes:
+                node.run_once()
+        verdict = homework.HOMEWORK_STATUSES['approved']
+        approved = [chat for chat, text in sent(nodes) if verdict in text]
+        assert sorted(approved) == sorted(str(number)
+                                          for number in range(12)), (
+            'Проверьте, что после смены владельца каждое изменение '
+            'уведомляется ровно один раз'
+        )
+        assert len(sent(nodes)) == 24
+        for node in nodes:
+            node.shared.close()
+
+    def test_busy_database_retries_notification(self, tmp_path, monkeypatch):
+        clock = FakeClock()
+        node = start_node(str(tmp_path / 'cluster.db'), 'node', clock,
+                          ['token 1'])
+        shared = node.shared
+        claim = shared.claim
+
+        def locked(note, partition):
+            raise sqlite3.OperationalError('database is locked')
+
+        with FakePracticum({None: make_homeworks(1)}) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            node.keep_leases(force=True)
+            monkeypatch.setattr(shared, 'claim', locked)
+            node.run_once()
+            assert node.bot.sent == [], (
+                'Проверьте, что без записи в общий файл уведомление '
+                'не отправляется'
+            )
+            monkeypatch.setattr(shared, 'claim', claim)
+            node.run_once()
+            node.run_once()
+        assert len(node.bot.sent) == 1, (
+            'Проверьте, что уведомление, которое не удалось записать, '
+            'отправляется при следующем опросе ровно один раз'
+        )
+        shared.close()
+
+    def test_processes_compete_for_leases(self, tmp_path):
+        path = str(tmp_path / 'cluster.db')
+        cluster.SharedState(path, node='init', partitions=8).close()
+        nodes = [
+            subprocess.Popen([sys.executable, '-c', COMPETING_NODE, path,
+                              f'node{number}'], cwd=ROOT,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            for number in range(3)
+        ]
+        results = []
+        for node in nodes:
+            output, errors = node.communicate(timeout=60)
+            assert node.returncode == 0, errors.decode()
+            results.append(json.loads(output))
+        assert sum(result['claimed'] for result in results) == 200, (
+            'Проверьте, что каждое уведомление записывается ровно одним '
+            'процессом'
+        )
+        assert all(result['seen'] for result in results), (
+            'Проверьте, что процессы делят партиции между собой'
+        )
+        assert set().union(*(result['seen'] for result in results)) == set(
+            range(8)
+        ), 'Проверьте, что все партиции разобраны процессами'
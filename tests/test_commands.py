@@ -0,0 +1,202 @@
+import time
+
+import pytest
+import requests
+import telegram
+
+import commands
+import homework
+from benchmarks.fake_servers import FakePracticum, FakeTelegram, make_homeworks
+from poller import Poller
+from subscriptions import parse_subscriptions
+
+
+class RecordingBot:
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((chat_id, text))
+
+
+class FakeUpdate:
+
+    def __init__(self, data):
+        self.data = data
+        self.update_id = data['update_id']
+
+    def to_dict(self):
+        return self.data
+
+
+class FlakyUpdatesBot(RecordingBot):
+    """Бот, у которого первый getUpdates падает с неожиданной ошибкой."""
+
+    def __init__(self, update):
+        super().__init__()
+        self.update = update
+        self.calls = 0
+
+    def get_updates(self, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise ValueError('битый ответ')
+        if self.calls == 2:
+            return [FakeUpdate(self.update)]
+        time.sleep(0.01)
+        return []
+
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+SECRET = {SECRET_HEADER: 's3cret'}
+
+
+def command(chat_id, text):
+    return {'update_id': 1,
+            'message': {'chat': {'id': chat_id}, 'text': text}}
+
+
+def polled_registry(monkeypatch, statuses):
+    """Реестр с одной подпиской после опросов с заданными статусами."""
+    registry = parse_subscriptions(['token 1'])
+    bot = RecordingBot()
+    data = {}
+    with FakePracticum(data) as server:
+        monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+        poller = Poller(registry, bot)
+        for status in statuses:
+            data[None] = make_homeworks(1, status=status)
+            poller.run_once()
+    return registry, bot, poller
+
+
+class TestCommands:
+
+    def test_status_history_and_pause(self, monkeypatch):
+        registry, bot, poller = polled_registry(monkeypatch,
+                                                ['reviewing', 'approved'])
+        handler = commands.CommandHandler(registry.board)
+        started = time.perf_counter()
+        chat_id, reply, _ = handler.handle(command(1, '/status'))
+        elapsed = time.perf_counter() - started
+        assert elapsed < 0.01, (
+            'Проверьте, что /status отвечает из памяти быстрее 10 мс'
+        )
+        assert chat_id == 1 and reply == (
+            'hw1.zip: ' + homework.HOMEWORK_STATUSES['approved']
+        ), 'Проверьте ответ на /status'
+        _, reply, _ = handler.handle(command(1, '/history@fake_bot'))
+        lines = reply.split('\n')
+        assert len(lines) == 2 and lines[0].endswith(
+            homework.HOMEWORK_STATUSES['approved']
+        ), 'Проверьте, что /history выводит изменения от новых к старым'
+        handler.handle(command(1, '/pause'))
+        sent = len(bot.sent)
+        with FakePracticum({None: make_homeworks(1, status='rejected')}) \
+                as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            poller.run_once()
+        assert len(bot.sent) == sent, (
+            'Проверьте, что после /pause уведомления не отправляются'
+        )
+        _, reply, _ = handler.handle(command(1, '/status'))
+        assert reply.endswith(homework.HOMEWORK_STATUSES['rejected']), (
+            'Проверьте, что на паузе статусы продолжают обновляться'
+        )
+        _, reply, _ = handler.handle(command(2, '/status'))
+        assert 'не подписан' in reply
+        assert handler.handle(command(1, 'привет')) is None
+
+    def test_long_polling(self, monkeypatch):
+        registry, _, _ = polled_registry(monkeypatch, ['approved'])
+        with FakeTelegram() as server:
+            bot = telegram.Bot(token='1234:abc',
+                               base_url=f'{server.base_url}/bot')
+            runner = commands.LongPoller(
+                commands.CommandHandler(registry.board), bot, timeout=1
+            )
+            runner.start()
+            server.push_update(1, '/status')
+            deadline = time.monotonic() + 10
+            while not server.sent and time.monotonic() < deadline:
+                time.sleep(0.01)
+            runner.stop()
+            runner.join(5)
+        assert server.sent == [
+            ('1', 'hw1.zip: ' + homework.HOMEWORK_STATUSES['approved'])
+        ], 'Проверьте, что команда из getUpdates получает ответ'
+        assert runner.offset == 2, (
+            'Проверьте, что обработанные обновления подтверждаются offset'
+        )
+
+    def test_long_polling_survives_unexpected_error(self, monkeypatch):
+        registry, _, _ = polled_registry(monkeypatch, ['approved'])
+        monkeypatch.setattr(commands, 'RETRY_DELAY', 0)
+        bot = FlakyUpdatesBot(command(1, '/status'))
+        runner = commands.LongPoller(commands.CommandHandler(registry.board),
+                                     bot, timeout=1)
+        runner.start()
+        deadline = time.monotonic() + 10
+        while not bot.sent and time.monotonic() < deadline:
+            time.sleep(0.01)
+        runner.stop()
+        runner.join(5)
+        assert bot.sent == [
+            (1, 'hw1.zip: ' + homework.HOMEWORK_STATUSES['approved'])
+        ], 'Проверьте, что после непредвиденной ошибки опрос команд продолжается'
+
+    def test_webhook(self, monkeypatch):
+        registry, _, _ = polled_registry(monkeypatch, ['reviewing'])
+        server = commands.WebhookServer(
+            commands.CommandHandler(registry.board), '127.0.0.1', 0, '/hook',
+            secret='s3cret'
+        ).start()
+        try:
+            host, port = server.server_address
+            url = f'http://{host}:{port}/hook'
+            reply = requests.post(url, json=command(1, '/status'),
+                                  headers=SECRET).json()
+            missing = requests.post(f'http://{host}:{port}/other', json={})
+        finally:
+            server.stop()
+        assert reply == {
+            'method': 'sendMessage', 'chat_id': 1,
+            'text': 'hw1.zip: ' + homework.HOMEWORK_STATUSES['reviewing'],
+        }, 'Проверьте, что вебхук отвечает методом sendMessage'
+        assert missing.status_code == 404
+
+    def test_webhook_rejects_forged_updates(self, monkeypatch):
+        registry, _, _ = polled_registry(monkeypatch, ['reviewing'])
+        server = commands.WebhookServer(
+            commands.CommandHandler(registry.board), '127.0.0.1', 0, '/hook',
+            secret='s3cret'
+        ).start()
+        try:
+            host, port = server.server_address
+            url = f'http://{host}:{port}/hook'
+            forged = [
+                requests.post(url, json=command(1, text), headers=headers)
+                for text, headers in (
+                    ('/status', {}),
+                    ('/history', {SECRET_HEADER: 'guess'}),
+                    ('/pause', {SECRET_HEADER: ''}),
+                )
+            ]
+        finally:
+            server.stop()
+        assert [response.status_code for response in forged] == [403] * 3, (
+            'Проверьте, что вебхук отклоняет запросы без верного секрета'
+        )
+        assert all('hw1.zip' not in response.text for response in forged), (
+            'Проверьте, что поддельный запрос не получает статусы чата'
+        )
+        assert not registry.board.chat(1).paused, (
+            'Проверьте, что поддельный /pause не ставит чат на паузу'
+        )
+
+    def test_webhook_requires_secret(self, monkeypatch):
+        monkeypatch.setattr(commands, 'WEBHOOK_SECRET', None)
+        with pytest.raises(ValueError):
+            commands.start(parse_subscriptions(['token 1']).board,
+                           RecordingBot(), mode='webhook')
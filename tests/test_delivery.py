@@ -0,0 +1,146 @@
+import requests
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from delivery import DeliveryQueue, TokenBucket, coalesce
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyBot:
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+        self.modes = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+        self.modes.append(kwargs.get('parse_mode'))
+
+
+class TestDelivery:
+
+    def test_coalesce_same_chat(self):
+        clock = FakeClock()
+        bot = FlakyBot()
+        queue = DeliveryQueue(bot, clock=clock)
+        queue.put(1, 'первое')
+        queue.put(2, 'другой чат')
+        queue.put(1, 'второе')
+        assert queue.stats()['depth'] == 3
+        while queue.step() == 0:
+            pass
+        assert bot.sent == [(1, 'первое\n\nвторое'), (2, 'другой чат')], (
+            'Проверьте, что сообщения одного чата склеиваются в одно'
+        )
+        assert queue.stats()['depth'] == 0
+
+    def test_any_chat_id_is_sent(self):
+        bot = FlakyBot()
+        queue = DeliveryQueue(bot, clock=FakeClock())
+        queue.put(None, 'чат не задан')
+        assert queue.step() == 0 and queue.step() is None, (
+            'Проверьте, что очередь не зацикливается на chat_id=None'
+        )
+        assert bot.sent == [(None, 'чат не задан')]
+
+    def test_coalesce_respects_length_limit(self):
+        texts = coalesce(['a' * 6, 'b' * 6, 'c' * 15], limit=14)
+        assert texts == ['a' * 6 + '\n\n' + 'b' * 6, 'c' * 14, 'c'], (
+            'Проверьте, что склеенный текст не превышает лимит Telegram'
+        )
+
+    def test_chat_rate_limit(self):
+        clock = FakeClock()
+        bot = FlakyBot()
+        queue = DeliveryQueue(bot, chat_rate=1, clock=clock)
+        queue.put(1, 'первое')
+        assert queue.step() == 0
+        queue.put(1, 'второе')
+        wait = queue.step()
+        assert wait == 1, (
+            'Проверьте, что в один чат уходит не больше сообщения в секунду'
+        )
+        clock.now = 1
+        assert queue.step() == 0
+        assert len(bot.sent) == 2
+
+    def test_global_rate_limit(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, now=clock())
+        assert bucket.take(0) and bucket.take(0)
+        assert not bucket.take(0)
+        assert bucket.wait_time(0) == 0.5
+
+    def test_retry_after_and_network_errors(self):
+        clock = FakeClock()
+        bot = FlakyBot([RetryAfter(5), NetworkError('Bad Gateway')])
+        queue = DeliveryQueue(bot, chat_rate=100, clock=clock)
+        queue.put(1, 'статус')
+        queue.step()
+        assert queue.step() == 5, (
+            'Проверьте, что при 429 очередь ждет retry_after'
+        )
+        clock.now = 5
+        queue.step()
+        assert queue.stats()['failed'] == 1
+        assert queue.step() > 0, (
+            'Проверьте, что после сетевой ошибки повтор откладывается'
+        )
+        clock.now = 10
+        queue.step()
+        assert bot.sent == [(1, 'статус')], (
+            'Проверьте, что сообщение доставляется после повторов'
+        )
+
+    def test_permanent_error_drops_message(self):
+        clock = FakeClock()
+        bot = FlakyBot([BadRequest('chat not found')])
+        queue = DeliveryQueue(bot, clock=clock)
+        queue.put(1, 'статус')
+        queue.step()
+        assert queue.stats()['dropped'] == 1
+        assert queue.stats()['depth'] == 0
+
+    def test_background_thread_drains_on_stop(self):
+        bot = FlakyBot()
+        queue = DeliveryQueue(bot, chat_rate=1000).start()
+        for number in range(5):
+            queue.put(number, 'статус')
+        assert queue.stop(timeout=5), (
+            'Проверьте, что при остановке очередь отправляет все сообщения'
+        )
+        assert len(bot.sent) == 5
+
+    def test_unexpected_error_is_retried(self):
+        bot = FlakyBot([requests.exceptions.ConnectionError('сброс')])
+        queue = DeliveryQueue(bot, chat_rate=1000).start()
+        queue.put(1, 'статус')
+        assert queue.stop(timeout=5), (
+            'Проверьте, что непредвиденная ошибка не останавливает поток '
+            'отправки'
+        )
+        assert bot.sent == [(1, 'статус')] and queue.stats()['failed'] == 1
+
+    def test_different_parse_modes_are_not_coalesced(self):
+        bot = FlakyBot()
+        queue = DeliveryQueue(bot, clock=FakeClock(), chat_rate=1000)
+        queue.put(1, '<b>статус</b>', 'HTML')
+        queue.put(1, '<b>еще</b>', 'HTML')
+        queue.put(1, 'ошибка')
+        while queue.step() == 0:
+            pass
+        assert bot.sent == [(1, '<b>статус</b>\n\n<b>еще</b>'),
+                            (1, 'ошибка')], (
+            'Проверьте, что сообщения с разной разметкой не склеиваются'
+        )
+        assert bot.modes == ['HTML', None]
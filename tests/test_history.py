@@ -0,0 +1,120 @@
+import pytest
+
+import homework
+import history
+import state
+from benchmarks.fake_servers import FakeBot, FakePracticum
+from poller import Poller
+from subscriptions import SubscriptionRegistry
+
+
+def review(name, lesson, started, finished, verdict='approved'):
+    """Работа в статусах reviewing и verdict с заданными датами."""
+    return [
+        {'id': name, 'homework_name': name, 'lesson_name': lesson,
+         'status': status, 'date_updated': f'2022-02-13T14:{minute:02d}:00Z'}
+        for status, minute in (('reviewing', started), (verdict, finished))
+    ]
+
+
+class TestHistory:
+
+    def test_range_scans_across_segments(self, tmp_path):
+        path = str(tmp_path / 'history')
+        store = history.HistoryStore(path, segment_rows=16)
+        for number in range(100):
+            store.append(f'hw{number % 7}', 'reviewing', 1000 + number,
+                         observed_at=2000 + number, cohort='c1')
+        store.close()
+
+        store = history.HistoryStore(path, segment_rows=16)
+        assert len(store) == 100 and len(store.segments) == 7, (
+            'Проверьте, что строки переживают перезапуск и делятся '
+            'на сегменты'
+        )
+        rows = list(store.scan(2030, 2040))
+        assert [row.observed_at for row in rows] == list(range(2030, 2040)), (
+            'Проверьте выборку по полуинтервалу observed_at'
+        )
+        rows = list(store.scan(2020, 2060, homework='hw3'))
+        assert [row.date_updated for row in rows] == [1024, 1031, 1038,
+                                                      1045, 1052, 1059], (
+            'Проверьте выборку по работе и времени через индекс работ'
+        )
+        assert list(store.scan(homework='hw99')) == []
+        store.append('hw0', 'approved', observed_at=1)
+        last = list(store.scan(2099))[-1]
+        assert (last.homework, last.observed_at) == ('hw0', 2099), (
+            'Проверьте, что время наблюдения не убывает'
+        )
+        store.close()
+
+    def test_review_time_per_cohort(self, tmp_path, monkeypatch):
+        store = history.HistoryStore(str(tmp_path / 'history'))
+        monkeypatch.setattr(homework, 'status_history', store)
+        monkeypatch.setattr(homework, 'homework_status_cache',
+                            state.ChangeIndex().view(''))
+        works = (review('hw1', 'sprint1', 0, 10)
+                 + review('hw2', 'sprint1', 1, 31, 'rejected')
+                 + review('hw3', 'sprint2', 2, 6))
+        for work in works:
+            homework.parse_status(work)
+            # Повтор того же статуса не попадает в историю.
+            homework.parse_status(work)
+        assert len(store) == 6, (
+            'Проверьте, что parse_status записывает только изменения'
+        )
+        assert store.review_times() == {
+            'sprint1': (2, 20 * 60.0), 'sprint2': (1, 4 * 60.0),
+        }, 'Проверьте среднее время проверки по когортам (lesson_name)'
+        store.close()
+
+    def test_rows_keyed_by_student_and_deduplicated(self, tmp_path,
+                                                    monkeypatch):
+        store = history.HistoryStore(str(tmp_path / 'history'))
+        monkeypatch.setattr(homework, 'status_history', store)
+        registry = SubscriptionRegistry()
+        for token, chat_id in (('alice', 1), ('alice', 2), ('bob', 3)):
+            registry.add(token, chat_id, timestamp=1)
+        data = {'alice': review('hw1', 'sprint1', 0, 10)[:1],
+                'bob': review('hw1', 'sprint1', 5, 35)[:1]}
+        with FakePracticum(data) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            poller = Poller(registry, FakeBot())
+            poller.run_once()
+            data['alice'] = review('hw1', 'sprint1', 0, 10)[1:]
+            data['bob'] = review('hw1', 'sprint1', 5, 35)[1:]
+            poller.run_once()
+        assert len(store) == 4, (
+            'Проверьте, что подписки с одним токеном не дублируют строки '
+            'истории'
+        )
+        assert {row.user for row in store.scan(homework='hw1')} == {
+            registry.get('alice', 1).user, registry.get('bob', 3).user
+        }, 'Проверьте, что строки истории различают студентов'
+        assert store.review_times() == {'sprint1': (2, 20 * 60.0)}, (
+            'Проверьте, что одноименные работы разных студентов '
+            'не смешиваются при подсчете времени проверки'
+        )
+        store.close()
+
+    def test_values_out_of_range_are_rejected(self, tmp_path, monkeypatch):
+        store = history.HistoryStore(str(tmp_path / 'history'))
+        monkeypatch.setitem(history.LIMITS, 'cohort', 0)
+        store.append('hw1', 'reviewing', 1, observed_at=1, cohort='c1')
+        with pytest.raises(ValueError, match='cohort'):
+            store.append('hw2', 'reviewing', 1, observed_at=1, cohort='c2')
+        with pytest.raises(ValueError, match='date'):
+            store.append('hw1', 'approved', 2 ** 32, observed_at=1,
+                         cohort='c1')
+        assert len(store) == 1, (
+            'Проверьте, что строка с неподходящим значением не пишется'
+        )
+        monkeypatch.setattr(homework, 'status_history', store)
+        cache = state.ChangeIndex().view('')
+        work = dict(review('hw3', 'c3', 0, 10)[0])
+        message, _ = homework.parse_homework(work, cache)
+        assert message, (
+            'Проверьте, что ошибка записи в историю не мешает уведомлению'
+        )
+        store.close()
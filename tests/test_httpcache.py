@@ -0,0 +1,147 @@
+import asyncio
+
+import httpx
+
+import aio
+import homework
+import httpcache
+from benchmarks.fake_servers import FakeBot, FakePracticum, make_homeworks
+from poller import Poller
+from subscriptions import SubscriptionRegistry
+
+
+class TestHttpCache:
+
+    def test_lru_eviction(self):
+        cache = httpcache.ResponseCache(maxsize=2, ttl=60)
+        cache.put('a', '"1"', None, b'a')
+        cache.put('b', '"2"', None, b'b')
+        cache.get('a')
+        cache.put('c', '"3"', None, b'c')
+        assert cache.get('b') is None, (
+            'Проверьте, что вытесняется давно не использованная запись'
+        )
+        assert cache.get('a').body == b'a', (
+            'Проверьте, что недавно прочитанная запись сохраняется'
+        )
+
+    def test_ttl_expiry(self):
+        cache = httpcache.ResponseCache(maxsize=2, ttl=0)
+        cache.put('a', '"1"', None, b'a')
+        assert cache.get('a') is None, (
+            'Проверьте, что устаревшие записи не возвращаются'
+        )
+
+    def test_not_modified_skips_parsing(self, monkeypatch):
+        data = {None: make_homeworks(50)}
+        with FakePracticum(data, validators=True) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            httpcache.configure()
+            try:
+                first = homework.get_api_answer_for('token', 1)
+                bytes_after_first = server.bytes_sent
+                second = homework.get_api_answer_for('token', 1)
+            finally:
+                httpcache.disable()
+        assert len(first['homeworks']) == 50, (
+            'Проверьте, что первый запрос возвращает полный ответ'
+        )
+        assert second is first and httpcache.version_of(second), (
+            'Проверьте, что при ответе 304 возвращается сохраненное тело '
+            'той же версии'
+        )
+        assert server.not_modified == 1, (
+            'Проверьте, что повторный запрос отправляется с If-None-Match'
+        )
+        assert server.bytes_sent == bytes_after_first, (
+            'Проверьте, что ответ 304 не содержит тела'
+        )
+
+    def stale_validators(self, monkeypatch, cache):
+        """Условные заголовки по записи, которую затем вытеснили."""
+        entries = list(cache._entries.values())
+        cache._entries.clear()
+        monkeypatch.setattr(
+            httpcache, 'conditional_headers',
+            lambda key, headers: {**headers,
+                                  **entries[0].conditional_headers()}
+        )
+
+    def test_not_modified_after_eviction_retries(self, monkeypatch):
+        data = {None: make_homeworks(50)}
+        with FakePracticum(data, validators=True) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            cache = httpcache.configure()
+            try:
+                homework.get_api_answer_for('token', 1)
+                self.stale_validators(monkeypatch, cache)
+                answer = homework.get_api_answer_for('token', 1)
+            finally:
+                httpcache.disable()
+        assert len(answer['homeworks']) == 50, (
+            'Проверьте, что на ответ 304 без сохраненного ответа запрос '
+            'повторяется без условных заголовков'
+        )
+        assert (server.requests, server.not_modified) == (3, 1)
+        assert len(cache) == 1, (
+            'Проверьте, что ответ повторного запроса сохраняется в кэш'
+        )
+
+    def test_async_not_modified_after_eviction_retries(self, monkeypatch):
+        async def fetch():
+            async with httpx.AsyncClient() as client:
+                return await aio.async_request_api(
+                    client, {'Authorization': 'OAuth token'}, 1
+                )
+
+        data = {None: make_homeworks(50)}
+        with FakePracticum(data, validators=True) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            cache = httpcache.configure()
+            try:
+                asyncio.run(fetch())
+                self.stale_validators(monkeypatch, cache)
+                answer = asyncio.run(fetch())
+            finally:
+                httpcache.disable()
+        assert len(answer['homeworks']) == 50, (
+            'Проверьте, что асинхронный опрос тоже повторяет запрос '
+            'на ответ 304 без сохраненного ответа'
+        )
+        assert (server.requests, server.not_modified) == (3, 1)
+
+    def test_disabled_cache_sends_plain_requests(self, monkeypatch):
+        with FakePracticum({}, validators=True) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            homework.get_api_answer_for('token', 1)
+            homework.get_api_answer_for('token', 1)
+        assert server.not_modified == 0, (
+            'Проверьте, что без кэша условные заголовки не отправляются'
+        )
+
+    def test_shared_token_subscriptions_each_get_first_status(self,
+                                                             monkeypatch):
+        registry = SubscriptionRegistry()
+        first = registry.add('token', 1, timestamp=1)
+        second = registry.add('token', 2, timestamp=1)
+        bot = FakeBot()
+        with FakePracticum({None: make_homeworks(1)},
+                           validators=True) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            httpcache.configure()
+            try:
+                poller = Poller(registry, bot)
+                # После первого опроса from_date подписок сдвигается,
+                # дальше они снова спрашивают API с одним ключом кэша.
+                for subscription in (first, second, first, second, first):
+                    poller.poll(subscription)
+            finally:
+                httpcache.disable()
+        assert server.not_modified == 3, (
+            'Проверьте, что подписки одного токена делят кэш ответов'
+        )
+        assert sorted(chat for chat, _ in bot.sent) == [1, 2], (
+            'Проверьте, что подписка, получившая 304 на ответ, разобранный '
+            'другой подпиской, тоже получает уведомление, а повторный 304 '
+            'не дает повторного уведомления'
+        )
@@ -0,0 +1,166 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import lifecycle
+import templates
+from benchmarks.fake_servers import FakePracticum, FakeTelegram, make_homeworks
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def probe(port, path):
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}',
+                                    timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+    except OSError:
+        return None
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+class TestLifecycle:
+
+    def test_wait_stop_and_deadline(self):
+        process = lifecycle.Lifecycle(shutdown_timeout=0.3, grace=0)
+        calls = []
+        process.at_shutdown(lambda remaining: calls.append(remaining) or False,
+                            deadline=True)
+        process.at_shutdown(lambda: calls.append('flush'))
+        threading.Timer(0.1, process.stop).start()
+        started = time.monotonic()
+        assert process.wait(60) is True, (
+            'Проверьте, что wait() прерывается запросом остановки'
+        )
+        assert time.monotonic() - started < 5
+        assert not process.ready and process.alive(), (
+            'Проверьте пробы: после остановки процесс не готов, но жив'
+        )
+        process.beat(0)
+        time.sleep(0.01)
+        assert not process.alive(), (
+            'Проверьте, что без отметки в срок процесс считается неживым'
+        )
+        assert process.shutdown() is False, (
+            'Проверьте, что shutdown() сообщает о недоделанных действиях'
+        )
+        assert 0 < calls[0] <= 0.3 and calls[1] == 'flush', (
+            'Проверьте, что действия идут по порядку и получают остаток '
+            'срока остановки'
+        )
+
+    def test_sigterm_drains_queue_and_flushes_state(self, tmp_path):
+        data = {None: make_homeworks(3, status='approved')}
+        port = free_port()
+        with FakePracticum(data) as practicum, \
+                FakeTelegram(latency=0.5) as telegram:
+            env = dict(
+                os.environ, PRACTICUM_TOKEN='token', TELEGRAM_TOKEN='1234:abc',
+                TELEGRAM_CHAT_ID='1', PRACTICUM_ENDPOINT=practicum.url,
+                TELEGRAM_API_URL=telegram.base_url, METRICS_PORT=str(port),
+                STATE_FILE=str(tmp_path / 'state'), SHUTDOWN_TIMEOUT='10',
+            )
+            bot = subprocess.Popen([sys.executable, 'homework.py'], cwd=ROOT,
+                                   env=env, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+            try:
+                assert wait_for(lambda: practicum.requests >= 1), (
+                    'Бот не запросил API'
+                )
+                ready = probe(port, '/readyz')
+                alive = probe(port, '/healthz')
+                # Уведомление еще в очереди или в полете.
+                sent_before = len(telegram.sent)
+                started = time.monotonic()
+                bot.send_signal(signal.SIGTERM)
+                output, _ = bot.communicate(timeout=15)
+            finally:
+                bot.kill()
+            elapsed = time.monotonic() - started
+        assert (ready, alive) == (200, 200), (
+            'Проверьте пробы /readyz и /healthz работающего бота'
+        )
+        assert bot.returncode == 0, output.decode()
+        assert elapsed < 10, (
+            'Проверьте, что SIGTERM прерывает ожидание RETRY_TIME'
+        )
+        texts = '\n'.join(text for _, text in telegram.sent)
+        assert sent_before < 2 and all(
+            f'hw{number}.zip' in texts for number in (1, 2, 3)
+        ), 'Проверьте, что очередь сообщений досылается при остановке'
+        with open(tmp_path / 'state.cursors', encoding='utf-8') as file:
+            assert 'main' in json.load(file), (
+                'Проверьте, что курсоры сбрасываются на диск при остановке'
+            )
+
+    def test_outage_opens_breaker_and_keeps_polling(self, tmp_path):
+        data = {None: make_homeworks(3, status='approved')}
+        outage = templates.render_notice(templates.DEFAULT_STYLE, 'outage')
+        with FakePracticum(data) as practicum, \
+                FakeTelegram(latency=0.5) as telegram:
+            env = dict(
+                os.environ, PRACTICUM_TOKEN='token', TELEGRAM_TOKEN='1234:abc',
+                TELEGRAM_CHAT_ID='1', PRACTICUM_ENDPOINT=practicum.url,
+                TELEGRAM_API_URL=telegram.base_url, RETRY_TIME='1',
+                BREAKER_FAILURES='2', STATE_FILE=str(tmp_path / 'state'),
+                SHUTDOWN_TIMEOUT='10',
+            )
+            bot = subprocess.Popen([sys.executable, 'homework.py'], cwd=ROOT,
+                                   env=env, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+            try:
+                assert wait_for(lambda: practicum.requests >= 1), (
+                    'Бот не запросил API'
+                )
+                # Эндпоинт недоступен несколько опросов подряд.
+                practicum.down = True
+                notified = wait_for(lambda: any(
+                    text == outage for _, text in telegram.sent
+                ))
+                time.sleep(2.5)
+                running = bot.poll() is None
+                bot.send_signal(signal.SIGTERM)
+                output, _ = bot.communicate(timeout=15)
+            finally:
+                bot.kill()
+        assert notified and running, (
+            'Проверьте, что недоступность эндпоинта не останавливает бота, '
+            'а выключатель размыкается и присылает уведомление\n'
+            + output.decode()
+        )
+        texts = [text for _, text in telegram.sent]
+        assert texts.count(outage) == 1, (
+            'Проверьте, что об отказе API приходит одно уведомление'
+        )
+        assert bot.returncode == 0, output.decode()
+        assert all(f'hw{number}.zip' in '\n'.join(texts)
+                   for number in (1, 2, 3)), (
+            'Проверьте, что очередь сообщений досылается при остановке'
+        )
+        with open(tmp_path / 'state.cursors', encoding='utf-8') as file:
+            assert 'main' in json.load(file), (
+                'Проверьте, что курсоры сбрасываются на диск при остановке'
+            )
@@ -0,0 +1,57 @@
+import io
+import json
+import logging
+
+import logs
+
+
+def read(logger, stream):
+    """Дописывает очередь логгера и возвращает вывод."""
+    logs.stop(logger)
+    return stream.getvalue()
+
+
+class TestLogs:
+
+    def test_level_and_lazy_arguments(self):
+        calls = []
+
+        class Argument:
+            def __str__(self):
+                calls.append(1)
+                return 'аргумент'
+
+        stream = io.StringIO()
+        logger = logs.setup(logging.getLogger('test_logs.level'),
+                            level='INFO', stream=stream)
+        logger.debug('Отладка: %s', Argument())
+        logger.info('Событие: %s', Argument())
+        output = read(logger, stream)
+        assert calls == [1], (
+            'Проверьте, что аргументы отброшенных записей не форматируются'
+        )
+        assert 'Отладка' not in output and 'Событие: аргумент' in output
+
+    def test_json_format(self):
+        stream = io.StringIO()
+        logger = logs.setup(logging.getLogger('test_logs.json'),
+                            fmt='json', stream=stream)
+        logger.warning('Статус "%s"', 'hw.zip')
+        record = json.loads(read(logger, stream))
+        assert record['message'] == 'Статус "hw.zip"', (
+            'Проверьте, что JSON-формат выводит одну запись на строку'
+        )
+        assert record['level'] == 'WARNING'
+
+    def test_debug_sampling(self):
+        stream = io.StringIO()
+        logger = logs.setup(logging.getLogger('test_logs.sampling'),
+                            level='DEBUG', sample_every=10, stream=stream)
+        for number in range(25):
+            logger.debug('Статус работы "%s" не изменился', number)
+        logger.info('Важное')
+        lines = read(logger, stream).splitlines()
+        assert len(lines) == 4, (
+            'Проверьте, что повторяющиеся DEBUG-записи прореживаются, '
+            'а остальные выводятся'
+        )
@@ -0,0 +1,83 @@
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import homework
+import metrics
+from benchmarks.fake_servers import FakeBot, FakePracticum, make_homeworks
+from poller import Poller
+from subscriptions import SubscriptionRegistry
+
+
+class TestMetrics:
+
+    def test_counter_sums_threads(self):
+        counter = metrics.Counter('test_events_total', 'События',
+                                  labelnames=('kind',))
+
+        def work():
+            for _ in range(1000):
+                counter.labels('a').inc()
+
+        workers = [threading.Thread(target=work) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert counter.labels('a').value == 4000, (
+            'Проверьте, что записи из разных потоков не теряются'
+        )
+        assert 'test_events_total{kind="a"} 4000' in metrics.render()
+
+    def test_histogram_buckets(self):
+        histogram = metrics.Histogram('test_latency_seconds', 'Задержка',
+                                      buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+        lines = histogram.render()
+        assert 'test_latency_seconds_bucket{le="0.1"} 2' in lines, (
+            'Проверьте, что граница корзины включается в корзину'
+        )
+        assert 'test_latency_seconds_bucket{le="+Inf"} 4' in lines, (
+            'Проверьте, что корзины накопительные'
+        )
+        assert 'test_latency_seconds_count 4' in lines
+
+    def test_poll_is_instrumented(self, monkeypatch):
+        registry = SubscriptionRegistry()
+        registry.add('token1', 1)
+        registry.add('token2', 2)
+        data = {'token1': make_homeworks(1)}
+        errors = metrics.ERRORS.labels('HomeworksEmptyError')
+        errors_before = errors.value
+        _, requests_before, _ = metrics.API_LATENCY.labels().snapshot()
+        with FakePracticum(data) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            Poller(registry, FakeBot()).run_once()
+        _, requests_after, _ = metrics.API_LATENCY.labels().snapshot()
+        assert requests_after - requests_before == 2, (
+            'Проверьте, что время каждого запроса к API попадает '
+            'в гистограмму'
+        )
+        assert errors.value - errors_before == 1, (
+            'Проверьте, что ошибки считаются по имени класса'
+        )
+
+    def test_metrics_endpoint(self):
+        metrics.NEXT_POLL.set(42)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), metrics.MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            host, port = server.server_address
+            with urllib.request.urlopen(
+                f'http://{host}:{port}/metrics'
+            ) as response:
+                body = response.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert 'homework_next_poll_seconds 42' in body, (
+            'Проверьте, что /metrics отдает метрики в формате Prometheus'
+        )
+        assert '# TYPE homework_errors_total counter' in body
@@ -0,0 +1,144 @@
+import pytest
+
+import alerts
+import homework
+import state
+from benchmarks.fake_servers import FakeBot, FakePracticum, make_homeworks
+from poller import Poller
+from subscriptions import SubscriptionRegistry, parse_subscriptions
+
+
+@pytest.fixture(autouse=True)
+def fresh_errors(monkeypatch):
+    monkeypatch.setattr(alerts, 'ERRORS', alerts.ErrorAggregator())
+
+
+class TestPoller:
+
+    def test_parse_subscriptions(self):
+        registry = parse_subscriptions([
+            '# комментарий',
+            'token1 100',
+            '',
+            'token1 200',
+            'token2 100',
+        ])
+        assert len(registry) == 3, (
+            'Проверьте, что реестр содержит по подписке на пару токен-чат'
+        )
+        assert registry.chats('token1') == ['100', '200'], (
+            'Проверьте, что на один токен можно подписать несколько чатов'
+        )
+
+    def test_poll_every_subscription(self, monkeypatch):
+        registry = SubscriptionRegistry()
+        registry.add('token1', 1)
+        registry.add('token2', 2)
+        data = {
+            'token1': make_homeworks(1, status='approved', prefix='a'),
+            'token2': make_homeworks(2, status='rejected', prefix='b'),
+        }
+        bot = FakeBot()
+        with FakePracticum(data) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            poller = Poller(registry, bot)
+            poller.run_once()
+            assert server.requests == 2, (
+                'Проверьте, что каждая подписка опрашивается один раз за проход'
+            )
+            assert sorted(chat for chat, _ in bot.sent) == [1, 2, 2], (
+                'Проверьте, что сообщения уходят в чат своей подписки'
+            )
+            poller.run_once()
+        assert len(bot.sent) == 3, (
+            'Проверьте, что неизменившийся статус не отправляется повторно'
+        )
+
+    def test_poll_error_reported_once(self, monkeypatch):
+        registry = SubscriptionRegistry()
+        registry.add('token1', 1)
+        bot = FakeBot()
+        with FakePracticum({}) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            poller = Poller(registry, bot)
+            poller.run_once()
+            poller.run_once()
+        assert len(bot.sent) == 1, (
+            'Проверьте, что одинаковая ошибка отправляется в чат один раз'
+        )
+
+    def test_from_date_watermark(self, monkeypatch, tmp_path):
+        path = str(tmp_path / 'state')
+        data = {'token1': make_homeworks(2, status='approved')}
+        data['token1'][1]['date_updated'] = '2022-03-01T00:00:00Z'
+        bot = FakeBot()
+        with FakePracticum(data) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            for _ in range(2):
+                store = state.LogStatusStore(path)
+                cursors = state.CursorStore(f'{path}.cursors')
+                registry = SubscriptionRegistry(store, cursors)
+                subscription = registry.add('token1', 1, timestamp=1)
+                Poller(registry, bot).poll(subscription)
+                store.close()
+                cursors.close()
+            from_date = server.last_params['from_date']
+        assert from_date == [str(homework.homework_date(data['token1'][1]))], (
+            'Проверьте, что from_date равен самой поздней date_updated '
+            'и сохраняется между перезапусками'
+        )
+        assert len(bot.sent) == 2, (
+            'Проверьте, что повторно запрошенные работы не дают '
+            'повторных уведомлений'
+        )
+
+    def test_parse_statuses_skips_known_chunks(self):
+        works = make_homeworks(100)
+        cache = state.ChangeIndex().view('batch')
+        batch = homework.parse_statuses(works, cache)
+        assert (len(batch.changes), batch.errors) == (100, []), (
+            'Проверьте, что новые работы попадают в changes'
+        )
+        assert batch.latest == homework.homework_date(works[0])
+        works[50] = dict(works[50], status='approved')
+        batch = homework.parse_statuses(works, cache)
+        assert [item['id'] for item, _ in batch.changes] == [51], (
+            'Проверьте, что пакет возвращает только изменившиеся работы'
+        )
+        assert len(batch.unchanged) == 99
+        cache.record(51, 'reviewing', homework.homework_date(works[50]))
+        batch = homework.parse_statuses(works, cache)
+        assert [item['id'] for item, _ in batch.changes] == [51], (
+            'Проверьте, что запись в кэш сбрасывает отпечатки ответа'
+        )
+
+    def test_parse_statuses_compares_chunk_contents(self, monkeypatch):
+        works = make_homeworks(20)
+        cache = state.ChangeIndex().view('batch')
+        monkeypatch.setattr(homework, 'hash', lambda value: 0,
+                            raising=False)
+        homework.parse_statuses(works, cache)
+        works[3] = dict(works[3], status='approved')
+        batch = homework.parse_statuses(works, cache)
+        assert [item['id'] for item, _ in batch.changes] == [4], (
+            'Проверьте, что части ответа сравниваются по содержимому, '
+            'а не по хэшу'
+        )
+
+    def test_malformed_homework_does_not_abort_poll(self, monkeypatch):
+        registry = SubscriptionRegistry()
+        subscription = registry.add('token1', 1, timestamp=1)
+        works = make_homeworks(3, status='approved')
+        works[1]['status'] = 'lost'
+        bot = FakeBot()
+        with FakePracticum({'token1': works}) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            Poller(registry, bot).poll(subscription)
+        texts = [text for _, text in bot.sent]
+        assert len(texts) == 3 and 'lost' in texts[-1], (
+            'Проверьте, что ошибка в одной работе не мешает уведомлениям '
+            'об остальных'
+        )
+        assert subscription.timestamp == 1, (
+            'Проверьте, что from_date не сдвигается, пока в ответе ошибка'
+        )
@@ -0,0 +1,99 @@
+import gzip
+import json
+from http import HTTPStatus
+
+import pytest
+import requests
+
+import exceptions as ex
+import homework
+import metrics
+import recording
+import streaming
+from benchmarks.fake_servers import (FakePracticum, ReplayPracticum,
+                                     make_homeworks)
+
+
+def record_session(path, monkeypatch):
+    """Записывает два успешных ответа и один ответ 500."""
+    monkeypatch.setattr(homework, 'api_recorder', recording.Recorder(path))
+    with FakePracticum({None: make_homeworks(2)}) as server:
+        monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+        homework.get_api_answer_for('secret-token', 1)
+        homework.get_api_answer_for('secret-token', 1)
+        server.failing = HTTPStatus.INTERNAL_SERVER_ERROR
+        with pytest.raises(ex.EndpointAccessError):
+            homework.get_api_answer_for('secret-token', 3)
+    homework.api_recorder.close()
+
+
+class TestRecording:
+
+    def test_record_redacts_token_and_round_trips(self, tmp_path,
+                                                  monkeypatch):
+        path = str(tmp_path / 'api.jsonl.gz')
+        record_session(path, monkeypatch)
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            lines = [json.loads(line) for line in file]
+        assert 'secret-token' not in json.dumps(lines), (
+            'Проверьте, что токен не попадает в запись'
+        )
+        assert sum('body' in line for line in lines) == 2, (
+            'Проверьте, что одинаковые тела ответов хранятся один раз'
+        )
+        exchanges = recording.load(path)
+        assert [exchange.status for exchange in exchanges] == [200, 200, 500]
+        assert len({exchange.session for exchange in exchanges}) == 1
+        assert json.loads(exchanges[0].body)['homeworks'] == make_homeworks(2)
+
+    def test_replay_serves_recording_with_faults(self, tmp_path,
+                                                 monkeypatch):
+        path = str(tmp_path / 'api.jsonl.gz')
+        record_session(path, monkeypatch)
+        with ReplayPracticum(recording.load(path), hang=0.5) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            answers = [homework.get_api_answer_for('another-token', 0)
+                       for _ in range(2)]
+            assert answers[0]['homeworks'] == make_homeworks(2), (
+                'Проверьте, что сервер отдает записанные ответы любому токену'
+            )
+            with pytest.raises(ex.EndpointAccessError):
+                homework.get_api_answer_for('another-token', 0)
+            server.malformed = 1
+            with pytest.raises(json.JSONDecodeError):
+                homework.get_api_answer_for('another-token', 0)
+            server.malformed, server.timeouts = 0, 1
+            with pytest.raises(requests.exceptions.Timeout):
+                requests.get(server.url, timeout=0.1,
+                             headers=homework.auth_headers('another-token'))
+            server.timeouts, server.rate = 0, 1
+            codes = [requests.get(server.url).status_code for _ in range(3)]
+        assert codes[-1] == HTTPStatus.TOO_MANY_REQUESTS, (
+            'Проверьте ограничение частоты ответов'
+        )
+        assert server.outcomes['malformed'] == 1, (
+            'Проверьте учет внесенных сбоев'
+        )
+
+    def test_streaming_records_and_observes_latency(self, tmp_path,
+                                                    monkeypatch):
+        path = str(tmp_path / 'api.jsonl.gz')
+        monkeypatch.setattr(homework, 'api_recorder',
+                            recording.Recorder(path))
+        _, requests_before, _ = metrics.API_LATENCY.labels().snapshot()
+        with FakePracticum({None: make_homeworks(3)}) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            stream = streaming.stream_api_answer_for('secret-token', 1,
+                                                     chunk_size=64)
+            works = list(streaming.check_stream(stream))
+        homework.api_recorder.close()
+        _, requests_after, _ = metrics.API_LATENCY.labels().snapshot()
+        assert requests_after == requests_before + 1, (
+            'Проверьте, что потоковый запрос учитывается в метриках'
+        )
+        exchanges = recording.load(path)
+        assert len(exchanges) == 1 and json.loads(
+            exchanges[0].body
+        )['homeworks'] == works == make_homeworks(3), (
+            'Проверьте, что потоковый ответ записывается целиком'
+        )
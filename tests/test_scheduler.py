@@ -0,0 +1,75 @@
+import scheduler
+from subscriptions import Subscription
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestScheduler:
+
+    def test_update_mode(self):
+        subscription = Subscription('token', 1)
+        scheduler.update_mode(subscription, {'reviewing', 'approved'})
+        assert subscription.mode == scheduler.ACTIVE, (
+            'Проверьте, что работа на проверке включает частый опрос'
+        )
+        scheduler.update_mode(subscription, {'approved'})
+        assert subscription.mode == scheduler.IDLE, (
+            'Проверьте, что принятые работы переводят подписку в ожидание'
+        )
+        scheduler.update_mode(subscription, {'rejected'})
+        assert subscription.mode == scheduler.NORMAL
+
+    def test_intervals(self):
+        subscription = Subscription('token', 1)
+        subscription.mode = scheduler.ACTIVE
+        active = scheduler.next_interval(subscription, rand=lambda: 0.5)
+        subscription.mode = scheduler.IDLE
+        idle = scheduler.next_interval(subscription, rand=lambda: 0.5)
+        assert active < scheduler.NORMAL_INTERVAL < idle, (
+            'Проверьте, что интервал зависит от режима подписки'
+        )
+        backoffs = []
+        for failures in range(1, 12):
+            subscription.failures = failures
+            backoffs.append(
+                scheduler.next_interval(subscription, rand=lambda: 1.0)
+            )
+        assert backoffs[1] == 2 * backoffs[0], (
+            'Проверьте, что после ошибок интервал растет экспоненциально'
+        )
+        assert max(backoffs) == scheduler.MAX_BACKOFF, (
+            'Проверьте, что интервал ограничен MAX_BACKOFF'
+        )
+        low = scheduler.next_interval(subscription, rand=lambda: 0.0)
+        assert low == scheduler.MAX_BACKOFF / 2, (
+            'Проверьте, что к интервалу добавляется случайный разброс'
+        )
+
+    def test_heap_order(self):
+        clock = FakeClock()
+        polled = []
+        subscriptions = [Subscription(f'token{n}', n) for n in range(3)]
+        timer = scheduler.Scheduler(polled.append,
+                                    interval=lambda subscription: 100,
+                                    clock=clock)
+        timer.schedule(subscriptions[0], 30)
+        timer.schedule(subscriptions[1], 10)
+        timer.schedule(subscriptions[2], 20)
+        timer.unschedule(subscriptions[2])
+        assert timer.next_deadline() == 10
+        clock.now = 35
+        assert timer.run_due() == 2
+        assert [subscription.chat_id for subscription in polled] == [1, 0], (
+            'Проверьте, что подписки опрашиваются в порядке сроков'
+        )
+        assert timer.next_deadline() == 135, (
+            'Проверьте, что после опроса подписка переставляется в расписание'
+        )
+        assert len(timer) == 2
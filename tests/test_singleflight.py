@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+import aio
+import homework
+from benchmarks.fake_servers import (FakeBot, FakePracticum, FakeTelegram,
+                                     make_homeworks)
+from poller import Poller
+from subscriptions import SubscriptionRegistry
+
+
+class TestSingleflight:
+
+    def test_threads_share_one_request(self, monkeypatch):
+        results = {}
+
+        def fetch(name, from_date):
+            results[name] = homework.get_api_answer_for('token', from_date)
+
+        with FakePracticum({None: make_homeworks(2)}, latency=0.5) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            threads = [threading.Thread(target=fetch, args=(number, from_date))
+                       for number, from_date in enumerate((100, 100, 110, 90))]
+            threads[0].start()
+            # Остальные вызовы приходят, пока первый запрос в полете.
+            time.sleep(0.2)
+            for thread in threads[1:]:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert server.requests == 2, (
+            'Проверьте, что одновременные запросы с одним токеном '
+            'объединяются, а запрос с более ранним from_date - нет'
+        )
+        assert results[0] is results[1] is results[2], (
+            'Проверьте, что объединенные вызовы получают один разобранный '
+            'ответ'
+        )
+        assert results[3] is not results[0]
+
+    def test_async_fan_out(self, monkeypatch):
+        registry = SubscriptionRegistry()
+        for chat_id in range(3):
+            registry.add('token', chat_id, timestamp=100)
+        data = {None: make_homeworks(1, status='approved')}
+
+        async def poll_all(telegram):
+            async with httpx.AsyncClient() as client:
+                bot = aio.AsyncBot('1234:abc', client,
+                                   base_url=telegram.base_url)
+                await aio.AsyncPoller(registry, bot, client).run_once()
+
+        with FakePracticum(data, latency=0.1) as server, \
+                FakeTelegram() as telegram:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            asyncio.run(poll_all(telegram))
+        assert server.requests == 1, (
+            'Проверьте, что подписки с одним токеном делают один запрос'
+        )
+        assert sorted(chat for chat, _ in telegram.sent) == [0, 1, 2], (
+            'Проверьте, что ответ рассылается всем подпискам токена'
+        )
+
+    def test_sync_poller_shares_answer_per_tick(self, monkeypatch):
+        registry = SubscriptionRegistry()
+        for chat_id in (1, 2):
+            registry.add('token', chat_id, timestamp=100)
+        registry.add('other', 3, timestamp=100)
+        data = {None: make_homeworks(1, status='approved')}
+        clock = [1000.0]
+        with FakePracticum(data) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            poller = Poller(registry, FakeBot(), retry_time=60)
+            poller.scheduler.clock = lambda: clock[0]
+            poller.run_once()
+            assert server.requests == 2, (
+                'Проверьте, что в синхронном режиме подписки с одним '
+                'токеном делают один запрос за проход'
+            )
+            poller.schedule_all()
+            for _ in range(3):
+                poller.start_tick()
+                poller.scheduler.run_due()
+                clock[0] = poller.scheduler.next_deadline()
+        assert server.requests == 5, (
+            'Проверьте, что планировщик опрашивает подписки с одним '
+            'токеном в одном тике одним запросом'
+        )
+        assert sorted(chat for chat, _ in poller.bot.sent) == [1, 2, 3]
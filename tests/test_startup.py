@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+import startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Бюджет с запасом для медленных машин CI; до отложенных импортов
+# импорт homework занимал около 220 мс.
+BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', 150))
+HEAVY = ('requests', 'telegram', 'asyncio', 'httpx', 'http.server')
+
+CHECK_LAZY = '''
+import sys
+import homework
+import transport
+bot = transport.LazyBot('1234:abc')
+before = [name for name in {heavy!r} if name in sys.modules]
+bot.token
+print(before, 'telegram' in sys.modules)
+'''
+
+
+def run_python(*args):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, check=True,
+                          capture_output=True, text=True)
+
+
+class TestStartup:
+
+    def test_heavy_modules_are_deferred(self):
+        output = run_python('-c', CHECK_LAZY.format(heavy=HEAVY)).stdout
+        assert output.split() == ['[]', 'True'], (
+            'Проверьте, что импорт homework и создание LazyBot не '
+            'импортируют requests, telegram, asyncio, httpx и http.server, '
+            'а бот создается при первом обращении'
+        )
+
+    def test_import_budget(self):
+        # Лучший из нескольких замеров: первый прогревает кэш ФС.
+        total = min(startup.profile('homework')[0] for _ in range(3))
+        assert total / 1000 < BUDGET_MS, (
+            f'Импорт homework занял {total / 1000:.0f} мс, бюджет - '
+            f'{BUDGET_MS:.0f} мс (STARTUP_BUDGET_MS)'
+        )
+
+    def test_profile_startup_flag(self):
+        output = run_python('homework.py', '--profile-startup').stdout
+        lines = output.splitlines()
+        assert lines[0].startswith('Импорт homework: '), (
+            'Проверьте, что --profile-startup печатает итог импорта'
+        )
+        names = [line.split()[0] for line in lines[1:]]
+        assert 'breaker' in names and 'requests' not in names, (
+            'Проверьте, что отчет перечисляет прямые зависимости модуля'
+        )
@@ -0,0 +1,175 @@
+import homework
+import state
+from subscriptions import SubscriptionRegistry
+
+
+class TestState:
+
+    def test_log_store_survives_restart(self, tmp_path):
+        path = str(tmp_path / 'state')
+        store = state.LogStatusStore(path, fsync_every=10)
+        store['hw1'] = 'reviewing'
+        store['hw2'] = 'approved'
+        store['hw1'] = 'rejected'
+        store.close()
+
+        store = state.LogStatusStore(path)
+        assert store.get('hw1') == 'rejected', (
+            'Проверьте, что журнал проигрывается при запуске'
+        )
+        assert store.get('hw2') == 'approved'
+        assert store.get('hw3') is None
+        assert len(store) == 2
+        store.close()
+
+    def test_compaction(self, tmp_path):
+        path = str(tmp_path / 'state')
+        store = state.LogStatusStore(path, compact_threshold=50)
+        for number in range(120):
+            store[f'hw{number}'] = 'approved'
+        store['hw0'] = 'rejected'
+        store.close()
+
+        store = state.LogStatusStore(path)
+        assert len(store) == 120, (
+            'Проверьте, что компакция сохраняет все ключи'
+        )
+        assert store.get('hw0') == 'rejected'
+        assert store.get('hw119') == 'approved'
+        store.compact()
+        assert store.get('hw0') == 'rejected', (
+            'Проверьте, что после компакции значения читаются из снимка'
+        )
+        store.close()
+
+    def test_torn_record_is_dropped(self, tmp_path):
+        path = str(tmp_path / 'state')
+        store = state.LogStatusStore(path)
+        store['hw1'] = 'approved'
+        store.close()
+        with open(f'{path}.log', 'ab') as file:
+            file.write(b'\x01\x02\x03')
+
+        store = state.LogStatusStore(path)
+        store['hw2'] = 'reviewing'
+        store.close()
+        store = state.LogStatusStore(path)
+        assert (store.get('hw1'), store.get('hw2')) == ('approved',
+                                                        'reviewing'), (
+            'Проверьте, что оборванная запись журнала отбрасывается'
+        )
+        store.close()
+
+    def test_no_duplicate_notification_after_restart(self, tmp_path):
+        path = str(tmp_path / 'state')
+        item = {'homework_name': 'hw.zip', 'status': 'approved'}
+
+        store = state.LogStatusStore(path)
+        registry = SubscriptionRegistry(store)
+        subscription = registry.add('token', 1)
+        assert homework.parse_status_for(item, subscription.status_cache)
+        store.close()
+
+        store = state.LogStatusStore(path)
+        registry = SubscriptionRegistry(store)
+        subscription = registry.add('token', 1)
+        other = registry.add('token', 2)
+        assert homework.parse_status_for(
+            item, subscription.status_cache
+        ) is None, (
+            'Проверьте, что после перезапуска статус не отправляется повторно'
+        )
+        assert homework.parse_status_for(item, other.status_cache), (
+            'Проверьте, что статусы разных подписок хранятся раздельно'
+        )
+        store.close()
+
+    def test_cursor_store_persists(self, tmp_path):
+        path = str(tmp_path / 'cursors')
+        cursors = state.CursorStore(path, flush_interval=60)
+        cursors['sub'] = 100
+        cursors.close()
+        cursors = state.CursorStore(path)
+        assert cursors.get('sub') == 100, (
+            'Проверьте, что водяные знаки from_date сохраняются на диск'
+        )
+
+    def test_change_index_keyed_by_id(self):
+        registry = SubscriptionRegistry()
+        cache = registry.add('token', 1).status_cache
+        item = {'id': 1, 'homework_name': 'hw.zip', 'status': 'reviewing',
+                'date_updated': '2022-02-13T14:40:57Z'}
+        assert homework.parse_status_for(item, cache)
+        renamed = dict(item, homework_name='hw_final.zip')
+        assert homework.parse_status_for(renamed, cache) is None, (
+            'Проверьте, что переименованная работа не считается новой'
+        )
+        namesake = dict(item, id=2)
+        assert homework.parse_status_for(namesake, cache), (
+            'Проверьте, что разные работы с одним именем не смешиваются'
+        )
+        assert homework.parse_status_for(
+            {'id': 1, 'status': 'reviewing',
+             'date_updated': '2022-02-13T14:40:57Z'}, cache
+        ) is None, (
+            'Проверьте, что при неизменных статусе и date_updated '
+            'остальные поля работы не проверяются'
+        )
+        updated = dict(item, status='approved',
+                       date_updated='2022-02-14T10:00:00Z')
+        assert homework.parse_status_for(updated, cache)
+
+    def test_change_index_grows(self):
+        index = state.ChangeIndex()
+        views = [index.view(f'chat{number}') for number in range(10)]
+        for number in range(5000):
+            views[number % 10].record(number, 'approved', number + 1)
+        assert len(index) == 5000
+        assert all(
+            views[number % 10].unchanged(number, 'approved', number + 1)
+            for number in range(5000)
+        ), 'Проверьте, что ключи не теряются при росте таблицы'
+        assert views[0].get(1) is None, (
+            'Проверьте, что ключи разных подписок не смешиваются'
+        )
+        assert index.nbytes < 5000 * 24 / state.INDEX_MAX_LOAD * 1.3
+
+    def test_change_index_hash_collision(self, monkeypatch):
+        view = state.ChangeIndex().view('chat')
+        monkeypatch.setattr(state, 'INDEX_HASH_MASK', 0)
+        view.record(1, 'approved', 100)
+        assert not view.unchanged(2, 'approved', 100), (
+            'Проверьте, что при совпадении хэша слота работы '
+            'различаются по проверочному хэшу'
+        )
+        assert view.get(2) is None
+        view.record(2, 'rejected', 200)
+        assert view.get(1) == 'approved'
+        assert view.get(2) == 'rejected'
+
+    def test_change_index_large_dates(self):
+        view = state.ChangeIndex().view('chat')
+        date = 2 ** 40
+        view.record(1, 'approved', date)
+        assert view.unchanged(1, 'approved', date), (
+            'Проверьте, что date_updated за пределами 32 бит сохраняется'
+        )
+
+    def test_legacy_name_keys(self, tmp_path):
+        path = str(tmp_path / 'state')
+        store = state.LogStatusStore(path)
+        prefix = SubscriptionRegistry(store).add('token', 1).namespace
+        store[f'{prefix}:hw.zip'] = 'approved'
+        store.close()
+
+        store = state.LogStatusStore(path)
+        subscription = SubscriptionRegistry(store).add('token', 1)
+        item = {'id': 7, 'homework_name': 'hw.zip', 'status': 'approved'}
+        assert homework.parse_status_for(
+            item, subscription.status_cache
+        ) is None, (
+            'Проверьте, что статусы, сохраненные по имени работы, '
+            'не отправляются повторно'
+        )
+        assert store.get(f'{prefix}:7') is None
+        store.close()
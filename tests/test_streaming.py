@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+import exceptions as ex
+import homework
+import streaming
+from benchmarks.fake_servers import FakeBot, FakePracticum, make_homeworks
+from poller import Poller
+from subscriptions import SubscriptionRegistry
+
+
+def chunked(data, size):
+    """Режет байты на куски заданного размера."""
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+class TestStreaming:
+
+    def test_chunk_boundaries(self):
+        homeworks = make_homeworks(3)
+        homeworks[0]['reviewer_comment'] = 'Отлично — принято'
+        homeworks[1]['id'] = 1234567890
+        body = json.dumps({'current_date': 1581604970,
+                           'homeworks': homeworks},
+                          ensure_ascii=False).encode()
+        for size in (1, 2, 3, 7, len(body)):
+            stream = streaming.HomeworkStream(chunked(body, size))
+            assert list(stream) == homeworks, (
+                'Проверьте, что работы разбираются при любой нарезке '
+                f'ответа на куски (размер {size})'
+            )
+            assert stream.fields == {'current_date': 1581604970}
+
+    def test_stream_errors(self):
+        stream = streaming.HomeworkStream([b'{"current_date": 1}'])
+        with pytest.raises(ex.KeyError):
+            list(streaming.check_stream(stream))
+        stream = streaming.HomeworkStream([b'{"homeworks": {}}'])
+        with pytest.raises(ex.HomeworksTypeError):
+            list(streaming.check_stream(stream))
+        stream = streaming.HomeworkStream([b'{"homeworks": []}'])
+        with pytest.raises(ex.HomeworksEmptyError):
+            list(streaming.check_stream(stream))
+        stream = streaming.HomeworkStream([b'{"homeworks": [{"a": 1}'])
+        with pytest.raises(json.JSONDecodeError):
+            list(stream)
+
+    def test_close_after_parse(self):
+        closed = []
+        stream = streaming.HomeworkStream([b'{"homeworks": [1, 2]}'],
+                                          close=lambda: closed.append(1))
+        next(iter(stream))
+        stream.close()
+        assert closed == [1], (
+            'Проверьте, что соединение освобождается после разбора'
+        )
+
+    def test_streaming_poller(self, monkeypatch):
+        registry = SubscriptionRegistry()
+        registry.add('token1', 1, timestamp=1)
+        data = {'token1': make_homeworks(5, status='reviewing')}
+        bot = FakeBot()
+        with FakePracticum(data) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            poller = Poller(registry, bot, streaming=True)
+            poller.run_once()
+            poller.run_once()
+        assert len(bot.sent) == 5, (
+            'Проверьте, что потоковый режим отправляет каждое изменение '
+            'один раз'
+        )
+        subscription = registry.get('token1', 1)
+        assert subscription.timestamp == homework.homework_date(
+            data['token1'][0]
+        ), 'Проверьте, что потоковый режим сдвигает from_date'
@@ -0,0 +1,76 @@
+import homework
+import templates
+from benchmarks.fake_servers import FakePracticum, make_homeworks
+from poller import Poller
+from subscriptions import parse_subscriptions
+
+
+class RecordingBot:
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((chat_id, text, parse_mode))
+
+
+class TestTemplates:
+
+    def test_default_text_is_unchanged(self):
+        message = templates.render_change(templates.make_style('ru', 'text'),
+                                          'hw.zip', 'approved', 'Отлично')
+        assert message == ('Изменился статус проверки работы "hw.zip". '
+                           + homework.HOMEWORK_STATUSES['approved']), (
+            'Проверьте, что по умолчанию сообщение не меняется'
+        )
+
+    def test_locale_format_and_comment(self):
+        style = templates.make_style('en', 'html', comments=True)
+        message = templates.render_change(style, 'a<b>.zip', 'rejected',
+                                          'Fix 1 < 2')
+        assert message.startswith(
+            'Review status of "<b>a&lt;b&gt;.zip</b>" has changed.'
+        ), 'Проверьте, что значения полей экранируются для HTML'
+        assert message.endswith('<i>Fix 1 &lt; 2</i>'), (
+            'Проверьте, что комментарий ревьюера добавляется курсивом'
+        )
+        style = templates.make_style('ru', 'markdown')
+        message = templates.render_change(style, 'hw_1.zip', 'approved',
+                                          'скрыт')
+        assert message.startswith(
+            r'Изменился статус проверки работы "*hw\_1\.zip*"\. '
+        ), 'Проверьте экранирование MarkdownV2'
+        assert 'скрыт' not in message, (
+            'Проверьте, что комментарий выключен по умолчанию'
+        )
+
+    def test_fan_out_renders_once(self, monkeypatch):
+        registry = parse_subscriptions([
+            'token 1 format=html',
+            'token 2 format=html',
+            'token 3 format=html',
+            'token 4 locale=en',
+        ])
+        data = {'token': make_homeworks(1, status='approved')}
+        bot = RecordingBot()
+        templates.render_change.cache_clear()
+        with FakePracticum(data) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            Poller(registry, bot).run_once()
+        info = templates.render_change.cache_info()
+        assert info.misses == 2 and info.hits == 2, (
+            'Проверьте, что одно изменение форматируется один раз '
+            'для всех чатов с одинаковыми настройками'
+        )
+        modes = {chat_id: parse_mode for chat_id, _, parse_mode in bot.sent}
+        assert modes == {'1': 'HTML', '2': 'HTML', '3': 'HTML', '4': None}, (
+            'Проверьте, что parse_mode чата передается в Bot API'
+        )
+
+    def test_bad_subscription_option(self):
+        for line in ('token 1 locale=xx', 'token 1 colour=red'):
+            try:
+                parse_subscriptions([line])
+            except ValueError:
+                continue
+            assert False, f'Проверьте, что строка "{line}" отклоняется'
@@ -0,0 +1,86 @@
+import socket
+import time
+
+import pytest
+import requests
+import telegram
+
+import breaker
+import exceptions as ex
+import homework
+import streaming
+import transport
+from benchmarks.fake_servers import FakePracticum, FakeTelegram, make_homeworks
+
+
+class TestTransport:
+
+    def test_session_reuses_connections(self, monkeypatch):
+        with FakePracticum({None: make_homeworks(1)}) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            transport.configure(pool_maxsize=2)
+            try:
+                for _ in range(3):
+                    homework.get_api_answer_for('token', 1)
+                stats = transport.connection_stats()
+            finally:
+                transport.close()
+        assert stats == {'opened': 1, 'reused': 2}, (
+            'Проверьте, что запросы к API идут через одно '
+            'keep-alive соединение'
+        )
+
+    def test_telegram_uses_pool(self):
+        with FakeTelegram() as server:
+            transport.configure()
+            try:
+                bot = telegram.Bot(token='1234:abc',
+                                   base_url=f'{server.base_url}/bot',
+                                   request=transport.telegram_request())
+                homework.send_message_to(bot, 1, 'первое')
+                homework.send_message_to(bot, 1, 'второе')
+                stats = transport.connection_stats()
+            finally:
+                transport.close()
+        assert len(server.sent) == 2, (
+            'Проверьте, что сообщения отправляются через пул Telegram'
+        )
+        assert stats['reused'] >= 1, (
+            'Проверьте, что соединение с Telegram переиспользуется'
+        )
+
+    def test_without_session_uses_requests_get(self, monkeypatch):
+        calls = []
+
+        def mock_get(url, **kwargs):
+            calls.append(url)
+            raise requests.exceptions.ConnectionError('нет сети')
+
+        monkeypatch.setattr(requests, 'get', mock_get)
+        try:
+            transport.http_get('http://example.invalid/')
+        except requests.exceptions.ConnectionError:
+            pass
+        assert calls == ['http://example.invalid/'], (
+            'Проверьте, что без настроенной сессии используется requests.get'
+        )
+
+    def test_hung_connection_times_out(self, monkeypatch):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        host, port = listener.getsockname()
+        monkeypatch.setattr(homework, 'ENDPOINT', f'http://{host}:{port}/')
+        monkeypatch.setattr(transport, 'REQUEST_TIMEOUT', 0.2)
+        try:
+            for request in (homework.get_api_answer_for,
+                            streaming.stream_api_answer_for):
+                started = time.monotonic()
+                with pytest.raises(ex.SystemExit):
+                    request('token', 0)
+                assert time.monotonic() - started < 5, (
+                    'Проверьте, что запрос к API ограничен REQUEST_TIMEOUT'
+                )
+        finally:
+            listener.close()
+            breaker.reset()
@@ -0,0 +1,68 @@
+import time
+
+import homework
+from benchmarks.fake_servers import FakeBot, FakePracticum, make_homeworks
+from subscriptions import SubscriptionRegistry
+from workers import Coordinator, HashRing
+
+
+def wait_for(condition, coordinator, timeout=30):
+    """Обрабатывает результаты воркеров, пока условие не выполнится."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'Воркеры не ответили вовремя'
+        coordinator.step(timeout=0.1)
+
+
+class TestWorkers:
+
+    def test_hash_ring_moves_few_keys(self):
+        keys = [f'key{number}' for number in range(2000)]
+        ring = HashRing(range(4))
+        before = {key: ring.node_for(key) for key in keys}
+        assert len(set(before.values())) == 4
+        ring.remove(3)
+        after = {key: ring.node_for(key) for key in keys}
+        moved = [key for key in keys if before[key] != after[key]]
+        assert all(before[key] == 3 for key in moved), (
+            'Проверьте, что при удалении узла переезжают только его ключи'
+        )
+        assert 3 not in after.values()
+
+    def test_rebalance_on_worker_death(self, monkeypatch):
+        registry = SubscriptionRegistry()
+        data = {}
+        for number in range(8):
+            token = f'token{number}'
+            registry.add(token, number, timestamp=1)
+            data[token] = make_homeworks(1, prefix=token)
+        bot = FakeBot()
+        with FakePracticum(data) as server:
+            monkeypatch.setattr(homework, 'ENDPOINT', server.url)
+            coordinator = Coordinator(registry, bot, workers=2,
+                                      interval=0.2).start()
+            try:
+                wait_for(lambda: len(bot.sent) == 8, coordinator)
+                victim = coordinator.workers[0]
+                orphans = [key for key, owner in coordinator.owners.items()
+                           if owner == victim.id]
+                victim.process.kill()
+                victim.process.join()
+                coordinator.check_workers()
+                assert victim.id not in coordinator.owners.values(), (
+                    'Проверьте, что подписки умершего воркера '
+                    'перераспределяются'
+                )
+                assert len(coordinator.workers) == 2, (
+                    'Проверьте, что вместо умершего воркера запускается новый'
+                )
+                results = coordinator.results
+                wait_for(lambda: coordinator.results > results + 2 * len(
+                    registry), coordinator)
+            finally:
+                coordinator.stop()
+        assert orphans
+        assert len(bot.sent) == 8, (
+            'Проверьте, что после перераспределения статусы не '
+            'отправляются повторно'
+        )
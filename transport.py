@@ -0,0 +1,142 @@
+"""
+Общий HTTP-транспорт бота.
+
+Постоянная сессия requests с пулом соединений для запросов к API
+ЯндексПрактикум и настройки пула для клиента Telegram. Пока сессия
+не настроена, запросы идут через requests.get, как раньше.
+
+requests и telegram импортируются при первом использовании, а клиент
+Telegram (LazyBot) создается при первой отправке: это сокращает
+запуск бота.
+"""
+
+import os
+import threading
+
+# Сколько хостов держим в пуле и сколько соединений на каждый хост.
+POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 4))
+POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 10))
+# HTTP/2 поддерживает только асинхронный клиент httpx (нужен пакет h2).
+HTTP2 = os.getenv('HTTP2', '1') == '1'
+# Таймаут запросов к API Практикума (секунды), общий для синхронного
+# и асинхронного клиентов: зависшее соединение не держит цикл опроса.
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', 30))
+
+_session = None
+_pool_managers = []
+
+
+def configure(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+    """Создает общую сессию с пулом keep-alive соединений."""
+    global _session
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    close()
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    _session = session
+    track(adapter.poolmanager)
+    return session
+
+
+def get_session():
+    """Возвращает общую сессию или None, если она не настроена."""
+    return _session
+
+
+def http_get(url, **kwargs):
+    """GET-запрос через общую сессию, если она настроена.
+
+    Если таймаут не передан, используется REQUEST_TIMEOUT.
+    """
+    kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    if _session is None:
+        import requests
+        return requests.get(url, **kwargs)
+    return _session.get(url, **kwargs)
+
+
+def close():
+    """Закрывает общую сессию и забывает счетчики соединений."""
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
+    _pool_managers.clear()
+
+
+def telegram_request(pool_size=POOL_MAXSIZE):
+    """Возвращает Request для telegram.Bot с пулом соединений."""
+    from telegram.utils.request import Request
+
+    request = Request(con_pool_size=pool_size)
+    track(request._con_pool)
+    return request
+
+
+class LazyBot:
+    """telegram.Bot, который создается при первом обращении.
+
+    Импорт telegram и создание клиента с пулом соединений
+    не задерживают запуск: они происходят при первой отправке
+    (обычно в потоке очереди отправки).
+    """
+
+    def __init__(self, token, **kwargs):
+        """Конструктор класса: аргументы передаются в telegram.Bot."""
+        self._token = token
+        self._kwargs = kwargs
+        self._bot = None
+        self._lock = threading.Lock()
+
+    @property
+    def bot(self):
+        """Настоящий клиент (создается при первом обращении)."""
+        if self._bot is None:
+            with self._lock:
+                if self._bot is None:
+                    from telegram import Bot
+
+                    kwargs = dict(self._kwargs)
+                    kwargs.setdefault('request', telegram_request())
+                    self._bot = Bot(token=self._token, **kwargs)
+        return self._bot
+
+    def __getattr__(self, name):
+        """Остальные атрибуты - у настоящего клиента."""
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.bot, name)
+
+
+def track(pool_manager):
+    """Учитывает пул urllib3 в счетчиках соединений."""
+    _pool_managers.append(pool_manager)
+
+
+def connection_stats():
+    """Возвращает число открытых и переиспользованных соединений."""
+    opened = requests_made = 0
+    for pool_manager in _pool_managers:
+        for key in list(pool_manager.pools.keys()):
+            pool = pool_manager.pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            requests_made += pool.num_requests
+    return {'opened': opened, 'reused': max(requests_made - opened, 0)}
+
+
+def http2_available():
+    """Проверяет, можно ли включить HTTP/2 в httpx."""
+    if not HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,458 @@
+"""
+Опрос подписок в нескольких процессах.
+
+Подписки распределяются по процессам-воркерам консистентным
+хэшированием: каждый воркер опрашивает API для своей доли подписок
+и разбирает ответы (CPU-работа не упирается в GIL одного процесса).
+Координатор в главном процессе владеет общим состоянием: хранилищем
+статусов, водяными знаками from_date и отправкой в Telegram.
+Воркер сообщает координатору об изменениях статусов, координатор
+сверяет их с хранилищем и рассылает только новые. Если воркер
+умирает, его подписки переходят к остальным, а вместо него
+запускается новый воркер.
+
+Выключатели эндпоинта (breaker.py) у каждого воркера свои: воркер
+сообщает координатору о переходах, и координатор считает эндпоинт
+недоступным, пока разомкнут выключатель хотя бы одного воркера.
+
+Запуск: python poller.py subscriptions.txt --workers 4
+"""
+
+import bisect
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from multiprocessing.connection import wait
+
+import breaker
+import history
+import homework
+import httpcache
+import lifecycle
+import state
+import streaming
+import transport
+from homework import logger
+from poller import POLL_ERRORS, Poller, report_error
+from subscriptions import SubscriptionRegistry
+
+REPLICAS = int(os.getenv('HASH_RING_REPLICAS', 64))
+HEALTH_INTERVAL = 1.0
+
+
+class HashRing:
+    """Кольцо консистентного хэширования с виртуальными узлами.
+
+    При добавлении или удалении узла переезжает только доля ключей
+    этого узла.
+    """
+
+    def __init__(self, nodes=(), replicas=REPLICAS):
+        """Конструктор класса."""
+        self.replicas = replicas
+        self._hashes = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        """Добавляет узел."""
+        for replica in range(self.replicas):
+            point = state.key_hash(f'{node}#{replica}')
+            self._nodes[point] = node
+            bisect.insort(self._hashes, point)
+
+    def remove(self, node):
+        """Удаляет узел."""
+        for replica in range(self.replicas):
+            point = state.key_hash(f'{node}#{replica}')
+            if self._nodes.pop(point, None) is not None:
+                self._hashes.remove(point)
+
+    def node_for(self, key):
+        """Узел, которому принадлежит ключ (строка)."""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, state.key_hash(key))
+        return self._nodes[self._hashes[index % len(self._hashes)]]
+
+    def __len__(self):
+        """Количество узлов."""
+        return len(set(self._nodes.values()))
+
+
+class ChangeRecorder(state.IndexView):
+    """Кэш статусов воркера, запоминающий изменения для координатора."""
+
+    __slots__ = ('changes',)
+
+    def __init__(self, index, prefix):
+        """Конструктор класса."""
+        super().__init__(index, prefix)
+        self.changes = []
+
+    def record(self, key, status, date=0, previous=None):
+        """Сохраняет статус и запоминает его изменение."""
+        super().record(key, status, date, previous)
+        if status != previous:
+            self.changes.append((key, status))
+
+
+class BoardRecorder(state.ChatBoard):
+    """Доска чата воркера, запоминающая обновления для координатора."""
+
+    __slots__ = ('updates',)
+
+    def __init__(self):
+        """Конструктор класса."""
+        super().__init__()
+        self.updates = []
+
+    def update(self, name, status, date, changed=True):
+        """Сохраняет статус и запоминает обновление."""
+        super().update(name, status, date, changed)
+        self.updates.append((name, status, date, changed))
+
+
+class WorkerPoller(Poller):
+    """Опрос в процессе-воркере: результаты уходят координатору."""
+
+    def __init__(self, worker_id, results, interval=None):
+        """Конструктор класса.
+
+        results: конец канала, по которому результаты уходят
+        координатору.
+
+        interval: фиксированный интервал опроса (для бенчмарков);
+        по умолчанию - адаптивный (scheduler.py).
+        """
+        super().__init__(SubscriptionRegistry(), bot=None,
+                         streaming=streaming.STREAMING)
+        self.worker_id = worker_id
+        self.results = results
+        if interval is not None:
+            self.scheduler.interval = lambda subscription: interval
+        breaker.add_listener(self.breaker_changed)
+        # Историю статусов пишет координатор.
+        homework.status_history = history.HistoryBuffer()
+
+    def breaker_changed(self, circuit, old, new):
+        """Сообщает координатору о переходе выключателя."""
+        self.results.send(('breaker', self.worker_id, circuit.endpoint,
+                           old, new))
+
+    def assign(self, token, chat_id, timestamp, style):
+        """Берет подписку в работу."""
+        subscription = self.registry.add(token, chat_id, timestamp, style)
+        subscription.status_cache = ChangeRecorder(self.registry.store,
+                                                   subscription.namespace)
+        subscription.board = BoardRecorder()
+        self.scheduler.schedule(subscription)
+
+    def unassign(self, token, chat_id):
+        """Отдает подписку другому воркеру."""
+        subscription = self.registry.get(token, chat_id)
+        if subscription is not None:
+            self.scheduler.unschedule(subscription)
+            self.registry.remove(token, chat_id)
+
+    def poll(self, subscription):
+        """Опрашивает API и отправляет координатору изменения и ошибки.
+
+        Каждое сообщение об изменении статуса соответствует одной
+        записи в кэш и одной строке истории в том же порядке; сообщения
+        об ошибках идут после них. Обновления доски чата (для команд
+        бота) координатор переносит на свою доску.
+        """
+        changes = subscription.status_cache.changes
+        changes.clear()
+        updates = subscription.board.updates
+        updates.clear()
+        homework.status_history.clear()
+        try:
+            messages = self.fetch(subscription)
+        except POLL_ERRORS as error:
+            messages = report_error(subscription, error)
+        rows = homework.status_history.drain()
+        notes = [(key, status, message, row)
+                 for (key, status), message, row
+                 in zip(changes, messages, rows)]
+        self.results.send((self.worker_id, subscription.token,
+                           subscription.chat_id, subscription.timestamp,
+                           notes, messages[len(notes):], updates))
+
+    def handle(self, command):
+        """Выполняет команду координатора; False - пора остановиться."""
+        name, *args = command
+        if name == 'assign':
+            self.assign(*args)
+        elif name == 'unassign':
+            self.unassign(*args)
+        return name != 'stop'
+
+    def serve(self, inbox):
+        """Опрашивает подписки и принимает команды до команды stop."""
+        while True:
+            self.start_tick()
+            self.scheduler.run_due()
+            deadline = self.scheduler.next_deadline()
+            timeout = (HEALTH_INTERVAL if deadline is None else min(
+                max(deadline - self.scheduler.clock(), 0), HEALTH_INTERVAL
+            ))
+            try:
+                command = inbox.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if not self.handle(command):
+                return
+
+
+def worker_main(worker_id, inbox, results, endpoint, interval=None):
+    """Точка входа процесса-воркера.
+
+    Сигналы остановки, разосланные всей группе процессов, воркер
+    игнорирует: его останавливает координатор командой stop.
+    """
+    for signum in lifecycle.SIGNALS:
+        signal.signal(signum, signal.SIG_IGN)
+    homework.ENDPOINT = endpoint
+    transport.configure()
+    httpcache.configure()
+    try:
+        WorkerPoller(worker_id, results, interval).serve(inbox)
+    finally:
+        results.close()
+        transport.close()
+
+
+class Worker:
+    """Процесс-воркер, его очередь команд и канал результатов.
+
+    У каждого воркера свои очередь и канал: если воркер убит посреди
+    записи, испорчен только его канал, а не общий для всех.
+    """
+
+    def __init__(self, context, worker_id, interval=None):
+        """Конструктор класса."""
+        self.id = worker_id
+        self.inbox = context.Queue()
+        # Не ждать при выходе доставки команд умершему воркеру.
+        self.inbox.cancel_join_thread()
+        self.results, results = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=worker_main, name=f'worker-{worker_id}', daemon=True,
+            args=(worker_id, self.inbox, results, homework.ENDPOINT,
+                  interval)
+        )
+        self.process.start()
+        results.close()
+
+    def send(self, *command):
+        """Отправляет команду воркеру."""
+        self.inbox.put(command)
+
+    def close(self):
+        """Освобождает канал и завершает процесс, если он еще жив."""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.results.close()
+        self.inbox.close()
+
+
+class Coordinator:
+    """Распределяет подписки по воркерам и рассылает их результаты."""
+
+    def __init__(self, registry, bot, workers, queue=None, interval=None,
+                 start_method='spawn'):
+        """Конструктор класса.
+
+        registry: реестр подписок с хранилищами статусов и курсоров.
+        queue: очередь отправки (delivery.py); без нее сообщения
+        отправляются сразу.
+        interval: фиксированный интервал опроса воркеров.
+        """
+        self.registry = registry
+        self.bot = bot
+        self.queue = queue
+        self.size = workers
+        self.interval = interval
+        self.context = multiprocessing.get_context(start_method)
+        self.ring = HashRing()
+        self.workers = {}
+        self.owners = {}
+        self.results = 0
+        self.outages = {}
+        self._next_id = 0
+        self._checked = 0
+        self.stopped = threading.Event()
+
+    def start(self):
+        """Запускает воркеры и раздает им подписки."""
+        for _ in range(self.size):
+            self.spawn()
+        self.rebalance()
+        return self
+
+    def spawn(self):
+        """Запускает новый воркер и добавляет его в кольцо."""
+        worker = Worker(self.context, self._next_id, self.interval)
+        self._next_id += 1
+        self.workers[worker.id] = worker
+        self.ring.add(worker.id)
+        logger.info('Запущен воркер %s (pid %s)', worker.id,
+                    worker.process.pid)
+        return worker
+
+    def rebalance(self):
+        """Отдает каждую подписку воркеру, которому она принадлежит."""
+        moved = 0
+        for subscription in self.registry:
+            owner = self.ring.node_for(subscription.namespace)
+            current = self.owners.get(subscription.key)
+            if owner is None or owner == current:
+                continue
+            if current in self.workers:
+                self.workers[current].send('unassign', *subscription.key)
+            self.workers[owner].send('assign', subscription.token,
+                                     subscription.chat_id,
+                                     subscription.timestamp,
+                                     subscription.style)
+            self.owners[subscription.key] = owner
+            moved += 1
+        return moved
+
+    def check_workers(self):
+        """Заменяет умершие воркеры."""
+        dead = [worker for worker in self.workers.values()
+                if not worker.process.is_alive()]
+        self.replace(dead)
+        return len(dead)
+
+    def replace(self, dead):
+        """Перераспределяет подписки умерших воркеров и запускает новые.
+
+        Сначала подписки переходят к оставшимся воркерам, чтобы опрос
+        не прерывался, затем часть из них - к новым воркерам.
+        """
+        if not dead:
+            return
+        for worker in dead:
+            logger.error('Воркер %s завершился с кодом %s',
+                         worker.id, worker.process.exitcode)
+            del self.workers[worker.id]
+            self.ring.remove(worker.id)
+            worker.close()
+            for endpoint, opened in list(self.outages.items()):
+                self.update_outage(endpoint, opened - {worker.id})
+        logger.info('Перераспределено подписок: %s', self.rebalance())
+        for _ in dead:
+            self.spawn()
+        logger.info('Перераспределено подписок: %s', self.rebalance())
+
+    def handle_breaker(self, worker_id, endpoint, old, new):
+        """Учитывает переход выключателя воркера."""
+        opened = self.outages.get(endpoint, set())
+        if new == breaker.CLOSED:
+            opened = opened - {worker_id}
+        elif new == breaker.OPEN:
+            opened = opened | {worker_id}
+        self.update_outage(endpoint, opened)
+
+    def update_outage(self, endpoint, opened):
+        """Обновляет состояние выключателя эндпоинта в координаторе.
+
+        Эндпоинт недоступен, пока разомкнут выключатель хотя бы одного
+        воркера; переход видят подписчики выключателя (OutageNotifier).
+        """
+        self.outages[endpoint] = opened
+        breaker.for_endpoint(endpoint).mirror(
+            breaker.OPEN if opened else breaker.CLOSED
+        )
+
+    def handle(self, result):
+        """Рассылает новые статусы из результата опроса воркера."""
+        if result[0] == 'breaker':
+            return self.handle_breaker(*result[1:])
+        _, token, chat_id, timestamp, notes, errors, updates = result
+        self.results += 1
+        subscription = self.registry.get(token, chat_id)
+        if subscription is None:
+            return
+        for update in updates:
+            subscription.board.update(*update)
+        messages = []
+        for key, status, message, row in notes:
+            # После перераспределения новый воркер заново сообщает
+            # уже известные статусы: их отсекает общее хранилище.
+            if subscription.status_cache.get(key) != status:
+                subscription.status_cache[key] = status
+                messages.append(message)
+                if homework.status_history is not None:
+                    homework.status_history.append(*row)
+        messages.extend(errors)
+        if not subscription.board.paused:
+            for message in messages:
+                self.deliver(subscription, message)
+        if timestamp > subscription.timestamp:
+            subscription.timestamp = timestamp
+            self.registry.save_cursor(subscription)
+
+    def deliver(self, subscription, message):
+        """Отправляет сообщение через очередь или напрямую."""
+        chat_id = subscription.chat_id
+        parse_mode = subscription.style.parse_mode
+        if self.queue is not None:
+            self.queue.put(chat_id, message, parse_mode)
+        else:
+            homework.send_message_to(self.bot, chat_id, message, parse_mode)
+
+    def receive(self, timeout):
+        """Обрабатывает готовые результаты воркеров.
+
+        Возвращает воркеры, закрывшие канал (завершившиеся).
+        """
+        channels = {worker.results: worker
+                    for worker in self.workers.values()}
+        closed = []
+        for channel in wait(list(channels), timeout):
+            try:
+                result = channel.recv()
+            except (EOFError, OSError):
+                closed.append(channels[channel])
+                continue
+            self.handle(result)
+        return closed
+
+    def step(self, timeout=HEALTH_INTERVAL):
+        """Обрабатывает результаты и раз в секунду проверяет воркеры."""
+        now = time.monotonic()
+        if now - self._checked >= HEALTH_INTERVAL:
+            self._checked = now
+            self.check_workers()
+        self.replace(self.receive(timeout))
+
+    def run_forever(self):
+        """Обрабатывает результаты воркеров до события stopped."""
+        while not self.stopped.is_set():
+            lifecycle.PROCESS.beat(HEALTH_INTERVAL)
+            self.step()
+
+    def stop(self, timeout=5):
+        """Останавливает воркеры, дообрабатывая их последние результаты."""
+        for worker in self.workers.values():
+            worker.send('stop')
+        deadline = time.monotonic() + timeout
+        running = dict(self.workers)
+        while running and time.monotonic() < deadline:
+            for worker in self.receive(0.1):
+                running.pop(worker.id, None)
+                del self.workers[worker.id]
+                worker.close()
+        for worker in running.values():
+            worker.close()
+        self.workers.clear()
+        return not running